@@ -0,0 +1,215 @@
+"""
+Acumuladores Combinables
+Estadísticas de una sola pasada para perfilar datos por bloques. Cada
+acumulador se actualiza con un bloque y se combina con otro del mismo tipo,
+así los archivos se perfilan en paralelo y se unen al final con memoria
+acotada (no depende de la cantidad de filas).
+"""
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+ALFA_BOCETO = 1e-4  # error relativo máximo de los cuantiles del boceto
+
+
+class Momentos:
+    """Conteo, media y varianza (Welford/Chan), mínimo, máximo y nulos"""
+
+    def __init__(self):
+        self.n = 0
+        self.nulos = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+
+    def actualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        validos = valores[~np.isnan(valores)]
+        self.nulos += len(valores) - len(validos)
+        if len(validos):
+            bloque = Momentos()
+            bloque.n = len(validos)
+            bloque.media = float(validos.mean())
+            bloque.m2 = float(((validos - bloque.media) ** 2).sum())
+            bloque.minimo = float(validos.min())
+            bloque.maximo = float(validos.max())
+            self.combinar(bloque)
+        return self
+
+    def combinar(self, otro):
+        if otro.n:
+            n = self.n + otro.n
+            delta = otro.media - self.media
+            self.media += delta * otro.n / n
+            self.m2 += otro.m2 + delta ** 2 * self.n * otro.n / n
+            self.n = n
+            self.minimo = min(self.minimo, otro.minimo)
+            self.maximo = max(self.maximo, otro.maximo)
+        self.nulos += otro.nulos
+        return self
+
+    @property
+    def std(self):
+        """Desviación estándar muestral (ddof=1, igual que pandas)"""
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+
+class Histograma:
+    """Histograma de intervalos fijos; los valores fuera de rango se cuentan aparte"""
+
+    def __init__(self, inicio, fin, n_intervalos):
+        self.inicio = inicio
+        self.fin = fin
+        self.conteos = np.zeros(n_intervalos, dtype=np.int64)
+        self.bajo_rango = 0
+        self.sobre_rango = 0
+
+    @property
+    def bordes(self):
+        return np.linspace(self.inicio, self.fin, len(self.conteos) + 1)
+
+    def actualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        conteos, _ = np.histogram(valores, bins=len(self.conteos), range=(self.inicio, self.fin))
+        self.conteos += conteos
+        self.bajo_rango += int((valores < self.inicio).sum())
+        self.sobre_rango += int((valores > self.fin).sum())
+        return self
+
+    def combinar(self, otro):
+        if (otro.inicio, otro.fin, len(otro.conteos)) != (self.inicio, self.fin, len(self.conteos)):
+            raise ValueError("Solo se pueden combinar histogramas con los mismos intervalos")
+        self.conteos += otro.conteos
+        self.bajo_rango += otro.bajo_rango
+        self.sobre_rango += otro.sobre_rango
+        return self
+
+
+class BocetoCuantiles:
+    """
+    Boceto de cuantiles con error relativo acotado (estilo DDSketch): cada valor
+    cae en un intervalo logarítmico de ancho relativo ALFA_BOCETO. Es combinable
+    y su tamaño depende del rango de los datos, no de la cantidad de filas.
+    Cada intervalo se representa por la media de sus valores, que es exacta
+    cuando todos son iguales (notas con un decimal, años, marcas 0/1).
+    """
+
+    def __init__(self, alfa=ALFA_BOCETO):
+        self.alfa = alfa
+        self.gamma = (1 + alfa) / (1 - alfa)
+        self._log_gamma = np.log(self.gamma)
+        self.positivos = Counter()
+        self.negativos = Counter()
+        self.suma_positivos = Counter()
+        self.suma_negativos = Counter()
+        self.ceros = 0
+        self.n = 0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+
+    def _sumar(self, contador, sumas, valores):
+        claves, inverso, conteos = np.unique(np.ceil(np.log(valores) / self._log_gamma).astype(np.int64),
+                                             return_inverse=True, return_counts=True)
+        contador.update(dict(zip(claves.tolist(), conteos.tolist())))
+        sumas.update(dict(zip(claves.tolist(), np.bincount(inverso, weights=valores).tolist())))
+
+    def actualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        if not len(valores):
+            return self
+        self._sumar(self.positivos, self.suma_positivos, valores[valores > 0])
+        self._sumar(self.negativos, self.suma_negativos, -valores[valores < 0])
+        self.ceros += int((valores == 0).sum())
+        self.n += len(valores)
+        self.minimo = min(self.minimo, float(valores.min()))
+        self.maximo = max(self.maximo, float(valores.max()))
+        return self
+
+    def combinar(self, otro):
+        if otro.alfa != self.alfa:
+            raise ValueError("Solo se pueden combinar bocetos con el mismo alfa")
+        self.positivos.update(otro.positivos)
+        self.negativos.update(otro.negativos)
+        self.suma_positivos.update(otro.suma_positivos)
+        self.suma_negativos.update(otro.suma_negativos)
+        self.ceros += otro.ceros
+        self.n += otro.n
+        self.minimo = min(self.minimo, otro.minimo)
+        self.maximo = max(self.maximo, otro.maximo)
+        return self
+
+    def valores(self):
+        """Valores representativos ordenados y cuántas filas representa cada uno"""
+        negativos = sorted(self.negativos, reverse=True)
+        positivos = sorted(self.positivos)
+        representantes = np.array([-self.suma_negativos[k] / self.negativos[k] for k in negativos]
+                                  + ([0.0] if self.ceros else [])
+                                  + [self.suma_positivos[k] / self.positivos[k] for k in positivos])
+        conteos = np.array([self.negativos[k] for k in negativos] + ([self.ceros] if self.ceros else [])
+                           + [self.positivos[k] for k in positivos], dtype=np.int64)
+        return np.clip(representantes, self.minimo, self.maximo), conteos
+
+    def cuantil(self, q):
+        """Cuantil aproximado con interpolación lineal entre rangos (como pandas)"""
+        if not self.n:
+            return np.nan
+        representantes, conteos = self.valores()
+        acumulado = np.cumsum(conteos)
+        rango = q * (self.n - 1)
+        inferior, superior = np.searchsorted(acumulado, [np.floor(rango), np.ceil(rango)], side='right')
+        fraccion = rango - np.floor(rango)
+        return float(representantes[inferior] * (1 - fraccion) + representantes[superior] * fraccion)
+
+
+class Frecuencias:
+    """Conteo exacto de valores (para columnas de pocas categorías)"""
+
+    def __init__(self):
+        self.conteos = Counter()
+
+    def actualizar(self, valores):
+        self.conteos.update(pd.Series(valores).value_counts(dropna=False).to_dict())
+        return self
+
+    def combinar(self, otro):
+        self.conteos.update(otro.conteos)
+        return self
+
+    def serie(self, ordenar_por_indice=False):
+        serie = pd.Series(dict(self.conteos), dtype=np.int64)
+        return serie.sort_index() if ordenar_por_indice else serie.sort_values(ascending=False, kind='stable')
+
+
+class PorGrupo:
+    """Un acumulador independiente por cada valor de la columna de grupo"""
+
+    def __init__(self, fabrica):
+        self.fabrica = fabrica
+        self.grupos = {}
+
+    def actualizar(self, claves, valores):
+        for clave, grupo in pd.Series(np.asarray(valores)).groupby(np.asarray(claves), sort=False):
+            clave = clave.item() if isinstance(clave, np.generic) else clave
+            if clave not in self.grupos:
+                self.grupos[clave] = self.fabrica()
+            self.grupos[clave].actualizar(grupo.to_numpy())
+        return self
+
+    def combinar(self, otro):
+        for clave, acumulador in otro.grupos.items():
+            if clave in self.grupos:
+                self.grupos[clave].combinar(acumulador)
+            else:
+                self.grupos[clave] = acumulador
+        return self
+
+    def __getitem__(self, clave):
+        return self.grupos[clave]
+
+    def claves(self):
+        return sorted(self.grupos)
@@ -8,112 +8,256 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from acumuladores import Momentos, Histograma, BocetoCuantiles, Frecuencias, PorGrupo
+from graficos_cache import renderizar_graficos
 
 # Configuración
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
-def cargar_datos():
-    """Carga el dataset CSV"""
-    print("Cargando datos...")
+# Lectura por bloques: memoria acotada sin importar el tamaño de los archivos.
+# Para perfilar varios años/archivos, agregarlos a la lista: se procesan en paralelo.
+ARCHIVOS_DATOS = ['../20230313_Notas_y_Egresados_Enseñanza_Media_2024_PUBL.csv']
+TAMANO_BLOQUE = 200_000
+N_PROCESOS_PERFIL = os.cpu_count() or 1
+RUTA_DATOS_EDA = '../03_preparacion_datos/datos_eda.csv'
+RANGO_PROMEDIOS = (1.0, 7.0)  # escala de notas chilena, intervalos fijos del histograma
+BORDES_RIESGO = [0, 3.0, 3.9, 4.0, 7.0]
+ETIQUETAS_RIESGO = ['Alto (<3.0)', 'Alto (3.0-3.9)', 'Bajo (4.0-4.9)', 'Bajo (>=5.0)']
+
+# Gráficos: se dibujan desde agregados y se omiten si su huella no cambió
+DIRECTORIO_GRAFICOS = '../02_comprension_datos/graficos'
+
+class PerfilEDA:
+    """
+    Todo lo que necesita el EDA, acumulado en una sola pasada por bloques.
+    Dos perfiles (p. ej. de archivos distintos) se unen con combinar().
+    """
+    
+    def __init__(self):
+        self.filas = 0
+        self.columnas = []
+        self.tipos = {}
+        self.cabeza = None
+        self.memoria_bytes = 0
+        self.no_nulos = Frecuencias()
+        self.momentos = {}
+        self.bocetos = {}
+        self.histograma_promedios = Histograma(*RANGO_PROMEDIOS, 50)
+        self.bajo_umbral = 0
+        self.sobre_umbral = 0
+        self.egreso = Frecuencias()
+        self.promedio_por_egreso = PorGrupo(Momentos)
+        self.boceto_por_egreso = PorGrupo(BocetoCuantiles)
+        self.anos = Frecuencias()
+        self.promedio_por_ano = PorGrupo(Momentos)
+        self.riesgo = Frecuencias()
+    
+    def actualizar(self, bloque):
+        if self.cabeza is None:
+            self.columnas = list(bloque.columns)
+            self.tipos = bloque.dtypes.astype(str).to_dict()
+            self.cabeza = bloque.head()
+        self.filas += len(bloque)
+        self.memoria_bytes += int(bloque.memory_usage(deep=True).sum())
+        self.no_nulos.conteos.update(bloque.notna().sum().to_dict())
+        
+        for columna in bloque.select_dtypes(include='number').columns:
+            valores = bloque[columna].to_numpy(dtype=np.float64, na_value=np.nan)
+            self.momentos.setdefault(columna, Momentos()).actualizar(valores)
+            self.bocetos.setdefault(columna, BocetoCuantiles()).actualizar(valores)
+        
+        promedios = bloque['PROM_NOTAS_ALU']
+        self.histograma_promedios.actualizar(promedios)
+        self.bajo_umbral += int((promedios < 4.0).sum())
+        self.sobre_umbral += int((promedios >= 4.0).sum())
+        self.egreso.actualizar(bloque['MARCA_EGRESO'])
+        self.promedio_por_egreso.actualizar(bloque['MARCA_EGRESO'], promedios)
+        self.boceto_por_egreso.actualizar(bloque['MARCA_EGRESO'], promedios)
+        if 'AGNO' in bloque.columns:
+            self.anos.actualizar(bloque['AGNO'])
+            self.promedio_por_ano.actualizar(bloque['AGNO'], promedios)
+        self.riesgo.actualizar(pd.cut(promedios, bins=BORDES_RIESGO, labels=ETIQUETAS_RIESGO,
+                                      include_lowest=True).dropna().astype(str))
+        return self
+    
+    def combinar(self, otro):
+        if self.cabeza is None:
+            self.columnas, self.tipos, self.cabeza = otro.columnas, otro.tipos, otro.cabeza
+        self.filas += otro.filas
+        self.memoria_bytes += otro.memoria_bytes
+        for columna, momentos in otro.momentos.items():
+            self.momentos.setdefault(columna, Momentos()).combinar(momentos)
+            self.bocetos.setdefault(columna, BocetoCuantiles()).combinar(otro.bocetos[columna])
+        self.bajo_umbral += otro.bajo_umbral
+        self.sobre_umbral += otro.sobre_umbral
+        for nombre in ('no_nulos', 'histograma_promedios', 'egreso', 'promedio_por_egreso',
+                       'boceto_por_egreso', 'anos', 'promedio_por_ano', 'riesgo'):
+            getattr(self, nombre).combinar(getattr(otro, nombre))
+        return self
+    
+    def describir(self, columnas=None):
+        """Equivalente a DataFrame.describe() (cuartiles aproximados por el boceto)"""
+        columnas = columnas or list(self.momentos)
+        return pd.DataFrame({
+            columna: {
+                'count': self.momentos[columna].n,
+                'mean': self.momentos[columna].media,
+                'std': self.momentos[columna].std,
+                'min': self.momentos[columna].minimo,
+                '25%': self.bocetos[columna].cuantil(0.25),
+                '50%': self.bocetos[columna].cuantil(0.50),
+                '75%': self.bocetos[columna].cuantil(0.75),
+                'max': self.momentos[columna].maximo,
+            } for columna in columnas
+        }).reindex(['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+def normalizar_bloque(bloque):
+    """Convierte PROM_NOTAS_ALU a numérico si viene como texto"""
+    if bloque['PROM_NOTAS_ALU'].dtype == 'object':
+        bloque['PROM_NOTAS_ALU'] = bloque['PROM_NOTAS_ALU'].str.replace(',', '.').astype(float)
+    return bloque
+
+def perfilar_archivo(ruta, ruta_salida=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Recorre un archivo una sola vez: actualiza el perfil con cada bloque y,
+    si se indica ruta_salida, escribe los bloques normalizados a medida que pasan.
+    """
+    perfil = PerfilEDA()
     # El CSV usa punto y coma como separador y coma como decimal
-    df = pd.read_csv(
-        '../20230313_Notas_y_Egresados_Enseñanza_Media_2024_PUBL.csv',
-        sep=';',
-        decimal=',',
-        encoding='utf-8'
-    )
-    print(f"Datos cargados: {len(df)} registros")
-    return df
+    lector = pd.read_csv(ruta, sep=';', decimal=',', encoding='utf-8', chunksize=tamano_bloque)
+    for i, bloque in enumerate(lector):
+        bloque = normalizar_bloque(bloque)
+        perfil.actualizar(bloque)
+        if ruta_salida:
+            bloque.to_csv(ruta_salida, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    return perfil
 
-def exploracion_inicial(df):
+def cargar_datos(rutas=ARCHIVOS_DATOS, ruta_salida=RUTA_DATOS_EDA, n_procesos=N_PROCESOS_PERFIL):
+    """
+    Perfila los archivos en una sola pasada. Con varios archivos, cada uno se
+    procesa en su propio worker y los perfiles parciales se combinan al final.
+    """
+    print("Perfilando datos por bloques...")
+    n_procesos = min(n_procesos, len(rutas))
+    if n_procesos <= 1:
+        partes = [f"{ruta_salida}.parte{i}" for i in range(len(rutas))] if len(rutas) > 1 else [ruta_salida]
+        perfiles = [perfilar_archivo(ruta, parte) for ruta, parte in zip(rutas, partes)]
+    else:
+        partes = [f"{ruta_salida}.parte{i}" for i in range(len(rutas))]
+        with ProcessPoolExecutor(max_workers=n_procesos) as ejecutor:
+            perfiles = list(ejecutor.map(perfilar_archivo, rutas, partes))
+    
+    # Unir las partes en el orden de los archivos (solo el primer encabezado)
+    if partes != [ruta_salida]:
+        with open(ruta_salida, 'wb') as salida:
+            for i, parte in enumerate(partes):
+                with open(parte, 'rb') as entrada:
+                    if i > 0:
+                        entrada.readline()
+                    shutil.copyfileobj(entrada, salida)
+                os.remove(parte)
+    
+    perfil = perfiles[0]
+    for otro in perfiles[1:]:
+        perfil.combinar(otro)
+    print(f"Datos perfilados: {perfil.filas} registros de {len(rutas)} archivo(s)")
+    return perfil
+
+def exploracion_inicial(perfil):
     """Exploración inicial del dataset"""
     print("\n" + "="*50)
     print("EXPLORACIÓN INICIAL")
     print("="*50)
     
-    print(f"\nDimensiones: {df.shape}")
-    print(f"\nColumnas: {list(df.columns)}")
+    print(f"\nDimensiones: {(perfil.filas, len(perfil.columnas))}")
+    print(f"\nColumnas: {perfil.columnas}")
     print(f"\nTipos de datos:")
-    print(df.dtypes)
+    print(pd.Series(perfil.tipos))
     print(f"\nPrimeras filas:")
-    print(df.head())
+    print(perfil.cabeza)
     print(f"\nInformación general:")
-    print(df.info())
+    print(pd.DataFrame({
+        'no_nulos': pd.Series(dict(perfil.no_nulos.conteos)).reindex(perfil.columnas),
+        'tipo': pd.Series(perfil.tipos),
+    }))
+    print(f"memoria (si se cargara completo): {perfil.memoria_bytes / 2**20:.1f} MB")
     print(f"\nEstadísticas descriptivas:")
-    print(df.describe())
+    print(perfil.describir())
     
-    return df
+    return perfil
 
-def analizar_promedios(df):
+def analizar_promedios(perfil):
     """Análisis específico de la variable PROM_NOTAS_ALU"""
     print("\n" + "="*50)
     print("ANÁLISIS DE PROMEDIOS (PROM_NOTAS_ALU)")
     print("="*50)
     
-    # Convertir a numérico si es necesario
-    if df['PROM_NOTAS_ALU'].dtype == 'object':
-        df['PROM_NOTAS_ALU'] = df['PROM_NOTAS_ALU'].str.replace(',', '.').astype(float)
-    
+    momentos = perfil.momentos['PROM_NOTAS_ALU']
     print(f"\nEstadísticas de promedios:")
-    print(df['PROM_NOTAS_ALU'].describe())
-    print(f"\nValores nulos: {df['PROM_NOTAS_ALU'].isnull().sum()}")
-    print(f"\nRango: {df['PROM_NOTAS_ALU'].min()} - {df['PROM_NOTAS_ALU'].max()}")
+    print(perfil.describir(['PROM_NOTAS_ALU'])['PROM_NOTAS_ALU'])
+    print(f"\nValores nulos: {momentos.nulos}")
+    print(f"\nRango: {momentos.minimo} - {momentos.maximo}")
     
     # Distribución
     print(f"\nDistribución de promedios:")
-    print(f"< 4.0 (Riesgo repitencia): {(df['PROM_NOTAS_ALU'] < 4.0).sum()} ({(df['PROM_NOTAS_ALU'] < 4.0).sum()/len(df)*100:.2f}%)")
-    print(f">= 4.0 (Aprobado): {(df['PROM_NOTAS_ALU'] >= 4.0).sum()} ({(df['PROM_NOTAS_ALU'] >= 4.0).sum()/len(df)*100:.2f}%)")
+    print(f"< 4.0 (Riesgo repitencia): {perfil.bajo_umbral} ({perfil.bajo_umbral/perfil.filas*100:.2f}%)")
+    print(f">= 4.0 (Aprobado): {perfil.sobre_umbral} ({perfil.sobre_umbral/perfil.filas*100:.2f}%)")
     
-    return df
+    return perfil
 
-def analizar_egreso(df):
+def _tabla_grupos(por_grupo, nombre):
+    """Media, desviación y conteo por grupo (como groupby().agg(['mean', 'std', 'count']))"""
+    claves = por_grupo.claves()
+    return pd.DataFrame({
+        'mean': [por_grupo[c].media for c in claves],
+        'std': [por_grupo[c].std for c in claves],
+        'count': [por_grupo[c].n for c in claves],
+    }, index=pd.Index(claves, name=nombre))
+
+def analizar_egreso(perfil):
     """Análisis de la variable MARCA_EGRESO"""
     print("\n" + "="*50)
     print("ANÁLISIS DE EGRESO (MARCA_EGRESO)")
     print("="*50)
     
+    conteos = perfil.egreso.serie().rename_axis('MARCA_EGRESO')
     print(f"\nDistribución:")
-    print(df['MARCA_EGRESO'].value_counts())
+    print(conteos)
     print(f"\nPorcentajes:")
-    print(df['MARCA_EGRESO'].value_counts(normalize=True) * 100)
+    print(conteos / conteos.sum() * 100)
     
     # Relación entre promedio y egreso
     print(f"\nRelación Promedio vs Egreso:")
-    relacion = df.groupby('MARCA_EGRESO')['PROM_NOTAS_ALU'].agg(['mean', 'std', 'count'])
-    print(relacion)
+    print(_tabla_grupos(perfil.promedio_por_egreso, 'MARCA_EGRESO'))
     
-    return df
+    return perfil
 
-def analizar_por_ano(df):
+def analizar_por_ano(perfil):
     """Análisis por año"""
     print("\n" + "="*50)
     print("ANÁLISIS POR AÑO")
     print("="*50)
     
-    if 'AGNO' in df.columns:
-        print(f"\nAños disponibles: {sorted(df['AGNO'].unique())}")
+    if 'AGNO' in perfil.columnas:
+        anos = perfil.anos.serie(ordenar_por_indice=True).rename_axis('AGNO')
+        print(f"\nAños disponibles: {list(anos.index)}")
         print(f"\nDistribución por año:")
-        print(df['AGNO'].value_counts().sort_index())
+        print(anos)
         
         print(f"\nPromedio por año:")
-        promedio_ano = df.groupby('AGNO')['PROM_NOTAS_ALU'].agg(['mean', 'std', 'count'])
-        print(promedio_ano)
+        print(_tabla_grupos(perfil.promedio_por_ano, 'AGNO'))
     
-    return df
+    return perfil
 
-def crear_visualizaciones(df):
-    """Crea visualizaciones del EDA"""
-    print("\n" + "="*50)
-    print("CREANDO VISUALIZACIONES")
-    print("="*50)
-    
-    # Crear directorio si no existe
-    os.makedirs('../02_comprension_datos/graficos', exist_ok=True)
-    
-    # 1. Distribución de promedios
+def _grafico_distribucion_promedios(agregados):
+    """Histograma de promedios desde los conteos por intervalo"""
+    bordes = np.asarray(agregados['bordes'])
     plt.figure(figsize=(12, 6))
-    plt.hist(df['PROM_NOTAS_ALU'], bins=50, edgecolor='black', alpha=0.7)
+    plt.hist(bordes[:-1], bins=bordes, weights=agregados['conteos'], edgecolor='black', alpha=0.7)
     plt.axvline(x=4.0, color='r', linestyle='--', linewidth=2, label='Umbral de aprobación (4.0)')
     plt.xlabel('Promedio de Notas')
     plt.ylabel('Frecuencia')
@@ -121,88 +265,122 @@ def crear_visualizaciones(df):
     plt.legend()
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
-    plt.savefig('../02_comprension_datos/graficos/distribucion_promedios.png', dpi=300)
-    plt.close()
-    print("OK Gráfico de distribución guardado")
-    
-    # 2. Boxplot de promedios por egreso
+
+def _grafico_boxplot_egreso(agregados):
+    """Boxplot por egreso desde cuartiles, bigotes y valores atípicos únicos"""
     plt.figure(figsize=(10, 6))
-    df.boxplot(column='PROM_NOTAS_ALU', by='MARCA_EGRESO', ax=plt.gca())
+    plt.gca().bxp(agregados['cajas'])
     plt.axhline(y=4.0, color='r', linestyle='--', linewidth=2, label='Umbral de aprobación')
-    plt.suptitle('')
     plt.title('Distribución de Promedios por Estado de Egreso')
     plt.xlabel('Egreso (1=Sí, 0=No)')
     plt.ylabel('Promedio de Notas')
     plt.legend()
     plt.tight_layout()
-    plt.savefig('../02_comprension_datos/graficos/boxplot_egreso.png', dpi=300)
-    plt.close()
-    print("OK Boxplot por egreso guardado")
-    
-    # 3. Distribución por año (si existe)
-    if 'AGNO' in df.columns:
-        plt.figure(figsize=(14, 6))
-        promedio_ano = df.groupby('AGNO')['PROM_NOTAS_ALU'].mean()
-        plt.plot(promedio_ano.index, promedio_ano.values, marker='o', linewidth=2, markersize=8)
-        plt.axhline(y=4.0, color='r', linestyle='--', linewidth=2, label='Umbral de aprobación')
-        plt.xlabel('Año')
-        plt.ylabel('Promedio Medio')
-        plt.title('Evolución del Promedio Medio por Año')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig('../02_comprension_datos/graficos/evolucion_ano.png', dpi=300)
-        plt.close()
-        print("OK Gráfico de evolución por año guardado")
-    
-    # 4. Distribución de riesgo (basado en promedio)
+
+def _grafico_evolucion_ano(agregados):
+    """Promedio medio por año"""
+    plt.figure(figsize=(14, 6))
+    plt.plot(agregados['anos'], agregados['promedios'], marker='o', linewidth=2, markersize=8)
+    plt.axhline(y=4.0, color='r', linestyle='--', linewidth=2, label='Umbral de aprobación')
+    plt.xlabel('Año')
+    plt.ylabel('Promedio Medio')
+    plt.title('Evolución del Promedio Medio por Año')
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+
+def _grafico_distribucion_riesgo(agregados):
+    """Cantidad de estudiantes por categoría de riesgo"""
     plt.figure(figsize=(10, 6))
-    df['RIESGO'] = pd.cut(df['PROM_NOTAS_ALU'], 
-                         bins=[0, 3.0, 3.9, 4.0, 7.0],
-                         labels=['Alto (<3.0)', 'Alto (3.0-3.9)', 'Bajo (4.0-4.9)', 'Bajo (>=5.0)'],
-                         include_lowest=True)
-    riesgo_counts = df['RIESGO'].value_counts()
-    plt.bar(riesgo_counts.index, riesgo_counts.values, color=['red', 'orange', 'lightgreen', 'green'], alpha=0.7)
+    plt.bar(agregados['categorias'], agregados['conteos'], color=['red', 'orange', 'lightgreen', 'green'], alpha=0.7)
     plt.xlabel('Categoría de Riesgo')
     plt.ylabel('Cantidad de Estudiantes')
     plt.title('Distribución de Riesgo de Repitencia')
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
-    plt.savefig('../02_comprension_datos/graficos/distribucion_riesgo.png', dpi=300)
-    plt.close()
-    print("OK Gráfico de distribución de riesgo guardado")
+
+RENDERIZADORES = {
+    'distribucion_promedios': _grafico_distribucion_promedios,
+    'boxplot_egreso': _grafico_boxplot_egreso,
+    'evolucion_ano': _grafico_evolucion_ano,
+    'distribucion_riesgo': _grafico_distribucion_riesgo,
+}
+
+def estadisticas_caja(boceto, etiqueta, whis=1.5):
+    """Estadísticos de boxplot (como cbook.boxplot_stats) a partir del boceto de cuantiles"""
+    q1, mediana, q3 = (boceto.cuantil(q) for q in (0.25, 0.50, 0.75))
+    iqr = q3 - q1
+    valores, _ = boceto.valores()
+    dentro = valores[(valores >= q1 - whis * iqr) & (valores <= q3 + whis * iqr)]
+    return {
+        'label': str(etiqueta),
+        'q1': q1, 'med': mediana, 'q3': q3,
+        'whislo': float(dentro.min()), 'whishi': float(dentro.max()),
+        # Cada valor atípico distinto se dibuja una sola vez
+        'fliers': valores[(valores < q1 - whis * iqr) | (valores > q3 + whis * iqr)],
+    }
+
+def agregados_visualizaciones(perfil):
+    """Extrae del perfil lo mínimo que necesita cada gráfico"""
+    histograma = perfil.histograma_promedios
+    tareas = [('distribucion_promedios', {'conteos': histograma.conteos, 'bordes': histograma.bordes})]
+    
+    cajas = [estadisticas_caja(perfil.boceto_por_egreso[egreso], egreso)
+             for egreso in perfil.boceto_por_egreso.claves()]
+    tareas.append(('boxplot_egreso', {'cajas': cajas}))
+    
+    if 'AGNO' in perfil.columnas:
+        promedio_ano = _tabla_grupos(perfil.promedio_por_ano, 'AGNO')['mean']
+        tareas.append(('evolucion_ano', {'anos': promedio_ano.index.to_numpy(),
+                                         'promedios': promedio_ano.to_numpy()}))
+    
+    riesgo_counts = perfil.riesgo.serie()
+    tareas.append(('distribucion_riesgo', {'categorias': list(riesgo_counts.index),
+                                           'conteos': riesgo_counts.to_numpy()}))
+    return tareas
+
+def crear_visualizaciones(perfil):
+    """Crea visualizaciones del EDA"""
+    print("\n" + "="*50)
+    print("CREANDO VISUALIZACIONES")
+    print("="*50)
     
-    # Eliminar columna temporal
-    df = df.drop('RIESGO', axis=1)
+    # Crear directorio si no existe
+    os.makedirs(DIRECTORIO_GRAFICOS, exist_ok=True)
+    renderizar_graficos(agregados_visualizaciones(perfil), RENDERIZADORES, DIRECTORIO_GRAFICOS)
     
-    return df
+    return perfil
 
-def generar_reporte(df):
+def generar_reporte(perfil):
     """Genera un reporte resumen del EDA"""
+    promedios = perfil.momentos['PROM_NOTAS_ALU']
+    egreso = perfil.egreso.conteos
+    n = perfil.filas
     reporte = []
     reporte.append("="*70)
     reporte.append("REPORTE DE ANÁLISIS EXPLORATORIO DE DATOS")
     reporte.append("="*70)
     reporte.append(f"\nFecha: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    reporte.append(f"\nTotal de registros: {len(df):,}")
-    reporte.append(f"Total de columnas: {len(df.columns)}")
-    reporte.append(f"\nValores nulos en PROM_NOTAS_ALU: {df['PROM_NOTAS_ALU'].isnull().sum()}")
-    reporte.append(f"\nRango de promedios: {df['PROM_NOTAS_ALU'].min():.2f} - {df['PROM_NOTAS_ALU'].max():.2f}")
-    reporte.append(f"Promedio general: {df['PROM_NOTAS_ALU'].mean():.2f}")
-    reporte.append(f"Mediana: {df['PROM_NOTAS_ALU'].median():.2f}")
-    reporte.append(f"Desviación estándar: {df['PROM_NOTAS_ALU'].std():.2f}")
+    reporte.append(f"\nTotal de registros: {n:,}")
+    reporte.append(f"Total de columnas: {len(perfil.columnas)}")
+    reporte.append(f"\nValores nulos en PROM_NOTAS_ALU: {promedios.nulos}")
+    reporte.append(f"\nRango de promedios: {promedios.minimo:.2f} - {promedios.maximo:.2f}")
+    reporte.append(f"Promedio general: {promedios.media:.2f}")
+    reporte.append(f"Mediana: {perfil.bocetos['PROM_NOTAS_ALU'].cuantil(0.5):.2f}")
+    reporte.append(f"Desviación estándar: {promedios.std:.2f}")
     
     reporte.append(f"\nDistribución por umbral de aprobación:")
-    reporte.append(f"  - Promedio < 4.0: {(df['PROM_NOTAS_ALU'] < 4.0).sum():,} ({(df['PROM_NOTAS_ALU'] < 4.0).sum()/len(df)*100:.2f}%)")
-    reporte.append(f"  - Promedio >= 4.0: {(df['PROM_NOTAS_ALU'] >= 4.0).sum():,} ({(df['PROM_NOTAS_ALU'] >= 4.0).sum()/len(df)*100:.2f}%)")
+    reporte.append(f"  - Promedio < 4.0: {perfil.bajo_umbral:,} ({perfil.bajo_umbral/n*100:.2f}%)")
+    reporte.append(f"  - Promedio >= 4.0: {perfil.sobre_umbral:,} ({perfil.sobre_umbral/n*100:.2f}%)")
     
     reporte.append(f"\nDistribución por egreso:")
-    reporte.append(f"  - Egresados (1): {(df['MARCA_EGRESO'] == 1).sum():,} ({(df['MARCA_EGRESO'] == 1).sum()/len(df)*100:.2f}%)")
-    reporte.append(f"  - No egresados (0): {(df['MARCA_EGRESO'] == 0).sum():,} ({(df['MARCA_EGRESO'] == 0).sum()/len(df)*100:.2f}%)")
+    reporte.append(f"  - Egresados (1): {egreso[1]:,} ({egreso[1]/n*100:.2f}%)")
+    reporte.append(f"  - No egresados (0): {egreso[0]:,} ({egreso[0]/n*100:.2f}%)")
     
-    if 'AGNO' in df.columns:
-        reporte.append(f"\nAños en el dataset: {df['AGNO'].min()} - {df['AGNO'].max()}")
-        reporte.append(f"Años únicos: {len(df['AGNO'].unique())}")
+    if 'AGNO' in perfil.columnas:
+        anos = perfil.anos.serie(ordenar_por_indice=True)
+        reporte.append(f"\nAños en el dataset: {anos.index.min()} - {anos.index.max()}")
+        reporte.append(f"Años únicos: {len(anos)}")
     
     reporte.append("\n" + "="*70)
     reporte.append("CONCLUSIONES")
@@ -228,31 +406,27 @@ def main():
     print("Fase 2 de CRISP-DM: Comprensión de los Datos")
     print("="*70)
     
-    # Cargar datos
-    df = cargar_datos()
+    # Una sola pasada por bloques: perfila y guarda los datos para la siguiente fase
+    perfil = cargar_datos()
+    print("OK Datos guardados para siguiente fase (datos_eda.csv)")
     
     # Exploración inicial
-    df = exploracion_inicial(df)
+    exploracion_inicial(perfil)
     
     # Análisis de promedios
-    df = analizar_promedios(df)
+    analizar_promedios(perfil)
     
     # Análisis de egreso
-    df = analizar_egreso(df)
+    analizar_egreso(perfil)
     
     # Análisis por año
-    df = analizar_por_ano(df)
+    analizar_por_ano(perfil)
     
     # Crear visualizaciones
-    df = crear_visualizaciones(df)
+    crear_visualizaciones(perfil)
     
     # Generar reporte
-    generar_reporte(df)
-    
-    # Guardar datos procesados para siguiente fase
-    df.to_csv('../03_preparacion_datos/datos_eda.csv', index=False)
-    print("\nOK Datos guardados para siguiente fase (datos_eda.csv)")
+    generar_reporte(perfil)
 
 if __name__ == "__main__":
     main()
-
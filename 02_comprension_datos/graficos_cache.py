@@ -0,0 +1,80 @@
+"""
+Gráficos con Caché
+Renderizado compartido por el EDA y la evaluación. Cada gráfico se dibuja
+desde sus agregados en un proceso propio y el PNG guarda en sus metadatos
+una huella de esos agregados: si la huella no cambió, no se vuelve a dibujar.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
+
+DPI_GRAFICOS = 300
+VERSION_GRAFICOS = 1  # incrementar al cambiar el diseño de un gráfico para regenerarlo
+N_PROCESOS_GRAFICOS = os.cpu_count() or 1
+
+
+def _a_json(valor):
+    """Convierte tipos de numpy para serializar los agregados"""
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"Tipo no serializable: {type(valor)}")
+
+
+def huella_agregados(nombre, agregados):
+    """Huella de los datos de entrada de un gráfico (y de la versión de su diseño)"""
+    contenido = json.dumps({'grafico': nombre, 'version': VERSION_GRAFICOS, 'dpi': DPI_GRAFICOS,
+                            'agregados': agregados}, sort_keys=True, default=_a_json)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+def grafico_vigente(ruta, huella):
+    """True si el PNG existente fue generado con la misma huella (guardada en sus metadatos)"""
+    if not os.path.exists(ruta):
+        return False
+    try:
+        with Image.open(ruta) as imagen:
+            return imagen.text.get('Huella') == huella
+    except (OSError, SyntaxError):
+        return False
+
+
+def _renderizar(renderizador, nombre, ruta, agregados, huella):
+    """Worker: dibuja un gráfico y lo guarda con su huella"""
+    renderizador(agregados)
+    plt.savefig(ruta, dpi=DPI_GRAFICOS, metadata={'Huella': huella})
+    plt.close()
+    return nombre
+
+
+def renderizar_graficos(tareas, renderizadores, directorio, n_procesos=N_PROCESOS_GRAFICOS):
+    """
+    Dibuja en procesos paralelos los gráficos cuya huella cambió.
+    tareas: lista de (nombre, agregados); renderizadores: nombre -> función de
+    nivel de módulo que dibuja la figura. Retorna los nombres regenerados.
+    """
+    pendientes = []
+    for nombre, agregados in tareas:
+        ruta = os.path.join(directorio, f'{nombre}.png')
+        huella = huella_agregados(nombre, agregados)
+        if grafico_vigente(ruta, huella):
+            print(f"OK Gráfico {nombre} sin cambios (se reutiliza)")
+        else:
+            pendientes.append((renderizadores[nombre], nombre, ruta, agregados, huella))
+
+    n_procesos = min(n_procesos, len(pendientes))
+    if n_procesos > 1:
+        with ProcessPoolExecutor(max_workers=n_procesos) as ejecutor:
+            generados = list(ejecutor.map(_renderizar, *zip(*pendientes)))
+    else:
+        generados = [_renderizar(*pendiente) for pendiente in pendientes]
+    for nombre in generados:
+        print(f"OK Gráfico {nombre} guardado")
+    return generados
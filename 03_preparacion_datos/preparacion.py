@@ -5,8 +5,191 @@ Fase 3 de CRISP-DM: Preparación de los Datos
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+import argparse
+import json
 import os
+import sys
+import time
+import uuid
+import io
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+
+# El muestreo de RSS se comparte con el perfilador del entrenamiento
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '04_modelado'))
+from perfilador import MuestreadorRSS
+
+# Esquema de las features del modelo, en orden, con su dtype compacto.
+# cantidad_notas (0-3) y tendencia (-1/0/1) caben en int8; el resto en float32,
+# que es además la precisión con que los árboles de sklearn comparan los umbrales.
+ESQUEMA_FEATURES = {
+    'nota_1': 'float32',
+    'nota_2': 'float32',
+    'nota_3': 'float32',
+    'cantidad_notas': 'int8',
+    'tendencia': 'int8',
+    'variabilidad': 'float32',
+    'nota_min': 'float32',
+    'nota_max': 'float32',
+}
+ESQUEMA_OBJETIVO = {'riesgo': 'category'}
+RUTA_ESQUEMA = '../03_preparacion_datos/esquema_features.json'
+
+# Perfil de referencia para el monitor de deriva de la API: intervalos fijos
+# para las variables continuas y conteos para las discretas
+BORDES_NOTAS = [1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0, 5.5, 6.0, 6.5, 7.0]
+BORDES_DERIVA = {
+    'nota_1': BORDES_NOTAS,
+    'nota_2': BORDES_NOTAS,
+    'nota_3': BORDES_NOTAS,
+    'nota_min': BORDES_NOTAS,
+    'nota_max': BORDES_NOTAS,
+    'variabilidad': [0.0, 0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 2.5, 3.0],
+}
+CATEGORIAS_DERIVA = ['cantidad_notas', 'tendencia']
+RUTA_PERFIL_REFERENCIA = '../03_preparacion_datos/perfil_referencia.json'
+
+# Riesgo por intervalos del promedio: < 3.5 alto, [3.5, 4.0) medio, >= 4.0 bajo
+UMBRALES_RIESGO = [3.5, 4.0]
+ETIQUETAS_RIESGO = np.array(['alto', 'medio', 'bajo'], dtype=object)
+RANGO_NOTAS = (1.0, 7.0)
+
+# División estable: cada (MRUN, escenario) va a prueba según un hash de su
+# identidad, no del orden de las filas, así que agregar datos no mueve las filas existentes
+PROPORCION_PRUEBA = 0.2
+SEMILLA_PARTICION = 42
+RUTA_DATOS_PROCESADOS = '../03_preparacion_datos/datos_procesados.csv'
+RUTA_PARTICION = '../03_preparacion_datos/particion.json'
+RUTA_INDICES = {'train': '../03_preparacion_datos/indices_train.npy',
+                'test': '../03_preparacion_datos/indices_test.npy'}
+RUTAS_CONJUNTOS = {
+    'train': ('../03_preparacion_datos/X_train.csv', '../03_preparacion_datos/y_train.csv'),
+    'test': ('../03_preparacion_datos/X_test.csv', '../03_preparacion_datos/y_test.csv'),
+}
+
+# Escenarios simulados: por estudiante, 1 fila con su promedio y MULTIPLICADOR_ESCENARIOS
+# secuencias de 2 notas y de 3 notas. Se generan por bloques de estudiantes en
+# paralelo, cada bloque con su semilla derivada de SEMILLA_SIMULACION
+MULTIPLICADOR_ESCENARIOS = 1
+SEMILLA_SIMULACION = 42
+TAMANO_BLOQUE_SIMULACION = 100_000  # estudiantes por bloque
+N_PROCESOS_SIMULACION = os.cpu_count() or 1
+
+# Tiempo y memoria pico (RSS) de cada etapa de la corrida
+RUTA_PERFIL_ETAPAS = '../03_preparacion_datos/perfil_preparacion.json'
+RUTA_PERFIL_ETAPAS_ANTERIOR = '../03_preparacion_datos/perfil_preparacion_anterior.json'
+
+def aplicar_esquema(df):
+    """
+    Valida las columnas contra el esquema y arma X con sus dtypes compactos.
+    Cada columna se convierte una vez y las notas no disponibles (NaN) se
+    rellenan con 0 en ese mismo arreglo, sin copiar el DataFrame en float64.
+    """
+    faltantes = [c for c in ESQUEMA_FEATURES if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan features del esquema: {faltantes}")
+    columnas = {}
+    for columna, dtype in ESQUEMA_FEATURES.items():
+        valores = df[columna].to_numpy(dtype=np.float32, copy=True)
+        valores[np.isnan(valores)] = 0
+        columnas[columna] = valores.astype(dtype, copy=False)
+    return pd.DataFrame(columnas, index=df.index, copy=False)
+
+def guardar_esquema(ruta=RUTA_ESQUEMA):
+    """Exporta el esquema para que las fases siguientes y la API lo apliquen"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({'features': ESQUEMA_FEATURES, 'objetivo': ESQUEMA_OBJETIVO}, f, indent=2)
+    print(f"OK Esquema de features guardado en {ruta}")
+
+def guardar_perfil_referencia(X, y, ruta=RUTA_PERFIL_REFERENCIA, acumular=False):
+    """
+    Exporta las distribuciones de entrenamiento contra las que la API compara lo
+    que recibe. Las notas ausentes (rellenadas con 0) no cuentan en su histograma,
+    y los valores fuera de rango caen en el primer o último intervalo.
+    Con acumular=True, X e y son filas nuevas y sus conteos se suman al perfil existente.
+    """
+    histogramas = {}
+    for columna, bordes in BORDES_DERIVA.items():
+        valores = X[columna].to_numpy(dtype=np.float64)
+        if columna.startswith('nota_') and columna[-1].isdigit():
+            valores = valores[X['cantidad_notas'].to_numpy() >= int(columna[-1])]
+        indices = np.clip(np.searchsorted(bordes, valores, side='right') - 1, 0, len(bordes) - 2)
+        histogramas[columna] = {
+            'bordes': bordes,
+            'conteos': np.bincount(indices, minlength=len(bordes) - 1).tolist(),
+        }
+    
+    categorias = {columna: {str(k): int(v) for k, v in X[columna].value_counts().sort_index().items()}
+                  for columna in CATEGORIAS_DERIVA}
+    categorias['riesgo'] = {str(k): int(v) for k, v in y.value_counts().sort_index().items()}
+    n = len(X)
+    
+    if acumular and os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as f:
+            previo = json.load(f)
+        n += previo['n']
+        for columna, histograma in histogramas.items():
+            histograma['conteos'] = [a + b for a, b in zip(previo['histogramas'][columna]['conteos'],
+                                                           histograma['conteos'])]
+        for columna, conteos in previo['categorias'].items():
+            for valor, conteo in conteos.items():
+                categorias[columna][valor] = categorias[columna].get(valor, 0) + conteo
+            categorias[columna] = dict(sorted(categorias[columna].items()))
+    
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({'n': n, 'histogramas': histogramas, 'categorias': categorias}, f, indent=2)
+    print(f"OK Perfil de referencia para monitoreo de deriva guardado en {ruta}")
+
+@contextmanager
+def medir_etapa(registros, nombre):
+    """
+    Agrega a registros el tiempo de pared y el RSS pico del bloque (con sus
+    procesos hijos, que simulan bloques en paralelo), y cuánto subió sobre el
+    RSS al empezar. El RSS lo lee el hilo MuestreadorRSS del perfilador; a
+    diferencia de tracemalloc, no hace más lentas las etapas con bucles de Python.
+    """
+    muestreador = MuestreadorRSS(incluir_hijos=True)
+    muestreador.start()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        pared = time.perf_counter() - inicio
+        pico = muestreador.detener()
+        registros.append({'etapa': nombre, 'pared_s': round(pared, 4),
+                          'rss_pico_mb': round(pico / 2**20, 1),
+                          'rss_delta_mb': round((pico - muestreador.inicial) / 2**20, 1)})
+
+def guardar_perfil_etapas(registros, n_registros, ruta=RUTA_PERFIL_ETAPAS, ruta_anterior=RUTA_PERFIL_ETAPAS_ANTERIOR):
+    """Imprime el perfil de la corrida junto al anterior y lo guarda (el previo queda como 'anterior')"""
+    anteriores = {}
+    if os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as f:
+            anteriores = {r['etapa']: r for r in json.load(f)['etapas']}
+        os.replace(ruta, ruta_anterior)
+    
+    print("\n" + "="*50)
+    print(f"PERFIL POR ETAPA ({n_registros:,} registros)")
+    print("="*50)
+    print(f"{'Etapa':<26} {'Pared (s)':>10} {'+RSS (MB)':>10} {'Ant. (s)':>9} {'Ant. (MB)':>10}")
+    for r in registros:
+        previo = anteriores.get(r['etapa'])
+        anterior = f"{previo['pared_s']:>9.2f} {previo['rss_delta_mb']:>10.1f}" if previo else f"{'-':>9} {'-':>10}"
+        print(f"{r['etapa']:<26} {r['pared_s']:>10.2f} {r['rss_delta_mb']:>10.1f} {anterior}")
+    
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({'fecha': time.strftime('%Y-%m-%d %H:%M:%S'), 'registros': n_registros,
+                   'etapas': registros}, f, indent=2, ensure_ascii=False)
+    print(f"OK Perfil por etapa guardado en {ruta}")
+
+def leer_csv_original(ruta):
+    """Lee un CSV con el formato de Mineduc (punto y coma, coma decimal)"""
+    df = pd.read_csv(ruta, sep=';', decimal=',', encoding='utf-8')
+    # Convertir promedio a numérico
+    if df['PROM_NOTAS_ALU'].dtype == 'object':
+        df['PROM_NOTAS_ALU'] = df['PROM_NOTAS_ALU'].str.replace(',', '.').astype(float)
+    return df
 
 def cargar_datos():
     """Carga los datos del EDA"""
@@ -15,15 +198,7 @@ def cargar_datos():
         df = pd.read_csv('../02_comprension_datos/datos_eda.csv')
     except:
         # Si no existe, cargar directamente del CSV original
-        df = pd.read_csv(
-            '../20230313_Notas_y_Egresados_Enseñanza_Media_2024_PUBL.csv',
-            sep=';',
-            decimal=',',
-            encoding='utf-8'
-        )
-        # Convertir promedio a numérico
-        if df['PROM_NOTAS_ALU'].dtype == 'object':
-            df['PROM_NOTAS_ALU'] = df['PROM_NOTAS_ALU'].str.replace(',', '.').astype(float)
+        df = leer_csv_original('../20230313_Notas_y_Egresados_Enseñanza_Media_2024_PUBL.csv')
     
     print(f"Datos cargados: {len(df)} registros")
     return df
@@ -36,16 +211,38 @@ def limpiar_datos(df):
     
     print(f"Registros iniciales: {len(df)}")
     
-    # Eliminar valores nulos en PROM_NOTAS_ALU
-    df = df.dropna(subset=['PROM_NOTAS_ALU'])
-    print(f"Después de eliminar nulos en PROM_NOTAS_ALU: {len(df)}")
+    # Una sola máscara: las comparaciones con NaN son falsas, así que descarta
+    # nulos y valores fuera del rango válido (1.0 - 7.0) sin copias intermedias
+    promedios = df['PROM_NOTAS_ALU'].to_numpy(dtype=np.float64)
+    nulos = int(np.isnan(promedios).sum())
+    validos = (promedios >= RANGO_NOTAS[0]) & (promedios <= RANGO_NOTAS[1])
+    print(f"Después de eliminar nulos en PROM_NOTAS_ALU: {len(df) - nulos}")
     
-    # Filtrar valores fuera del rango válido (1.0 - 7.0)
-    df = df[(df['PROM_NOTAS_ALU'] >= 1.0) & (df['PROM_NOTAS_ALU'] <= 7.0)]
-    print(f"Después de filtrar rango válido (1.0-7.0): {len(df)}")
+    n_validos = int(validos.sum())
+    if n_validos < len(df):
+        df = df[validos]
+    print(f"Después de filtrar rango válido (1.0-7.0): {n_validos}")
     
     return df
 
+def clasificar_riesgo(promedio):
+    """
+    Riesgo de repitencia según el promedio
+    Alto riesgo: < 3.5
+    Medio riesgo: 3.5 - 3.9
+    Bajo riesgo: >= 4.0
+    """
+    if promedio < 3.5:
+        return 'alto'
+    elif promedio < 4.0:
+        return 'medio'
+    else:
+        return 'bajo'
+
+def etiquetar_riesgo(promedios):
+    """clasificar_riesgo vectorizado: un arreglo de etiquetas por intervalos"""
+    return ETIQUETAS_RIESGO[np.digitize(promedios, UMBRALES_RIESGO)]
+
 def crear_variable_objetivo(df):
     """Crea la variable objetivo de riesgo de repitencia"""
     print("\n" + "="*50)
@@ -53,19 +250,7 @@ def crear_variable_objetivo(df):
     print("="*50)
     
     # Crear variable objetivo basada en el promedio
-    # Alto riesgo: < 3.5
-    # Medio riesgo: 3.5 - 3.9
-    # Bajo riesgo: >= 4.0
-    
-    def clasificar_riesgo(promedio):
-        if promedio < 3.5:
-            return 'alto'
-        elif promedio < 4.0:
-            return 'medio'
-        else:
-            return 'bajo'
-    
-    df['RIESGO'] = df['PROM_NOTAS_ALU'].apply(clasificar_riesgo)
+    df['RIESGO'] = etiquetar_riesgo(df['PROM_NOTAS_ALU'].to_numpy())
     
     print("Distribución de riesgo:")
     print(df['RIESGO'].value_counts())
@@ -74,10 +259,106 @@ def crear_variable_objetivo(df):
     
     return df
 
-def crear_features_simuladas(df):
+def simular_bloque(promedios, riesgos, ids, semilla, multiplicador=MULTIPLICADOR_ESCENARIOS):
+    """
+    Escenarios de notas parciales de un bloque de estudiantes, vectorizado.
+    Por estudiante: el escenario 1 (una nota, el promedio mismo) y, por cada
+    unidad del multiplicador, una secuencia de 2 notas (escenario 2 + 2j) y una
+    de 3 notas (escenario 3 + 2j) que promedian al promedio final.
+    Las filas quedan agrupadas por estudiante, en orden de escenario.
+    """
+    rng = np.random.default_rng(semilla)
+    promedios = np.asarray(promedios, dtype=np.float64)
+    n = len(promedios)
+    columnas = 1 + 2 * multiplicador
+    notas = np.full((n, columnas, 3), np.nan)
+    promedio = np.empty((n, columnas))
+    riesgo = np.empty((n, columnas), dtype=object)
+    escenario = np.broadcast_to(np.arange(1, columnas + 1), (n, columnas))
+    
+    # Escenario 1: 1 nota (es el promedio mismo)
+    notas[:, 0, 0] = promedio[:, 0] = promedios
+    riesgo[:, 0] = riesgos
+    
+    bajo = np.maximum(1.0, promedios - 1.5)
+    alto = np.minimum(7.0, promedios + 1.5)
+    for j in range(multiplicador):
+        # 2 notas que promedian al promedio final
+        dos = 1 + 2 * j
+        notas[:, dos, 0] = rng.uniform(bajo, alto)
+        notas[:, dos, 1] = np.clip(2 * promedios - notas[:, dos, 0], 1.0, 7.0)
+        promedio[:, dos] = notas[:, dos, :2].mean(axis=1)
+        
+        # 3 notas que promedian al promedio final
+        tres = dos + 1
+        notas[:, tres, 0] = rng.uniform(bajo, alto)
+        notas[:, tres, 1] = rng.uniform(bajo, alto)
+        notas[:, tres, 2] = np.clip(3 * promedios - notas[:, tres, 0] - notas[:, tres, 1], 1.0, 7.0)
+        promedio[:, tres] = notas[:, tres].mean(axis=1)
+        
+        # Tras recortar al rango, el promedio real puede cambiar de riesgo
+        riesgo[:, dos] = etiquetar_riesgo(promedio[:, dos])
+        riesgo[:, tres] = etiquetar_riesgo(promedio[:, tres])
+    
+    notas = notas.reshape(n * columnas, 3)
+    return pd.DataFrame({
+        'nota_1': notas[:, 0],
+        'nota_2': notas[:, 1],
+        'nota_3': notas[:, 2],
+        'promedio': promedio.ravel(),
+        'riesgo': riesgo.ravel(),
+        'MRUN': np.repeat(np.asarray(ids), columnas),
+        'escenario': escenario.ravel(),
+    })
+
+def _simular_bloque(argumentos):
+    """Worker: simula un bloque y, si se pide, le agrega las features derivadas"""
+    promedios, riesgos, ids, semilla, multiplicador, derivar = argumentos
+    df = simular_bloque(promedios, riesgos, ids, semilla, multiplicador)
+    if derivar:
+        with redirect_stdout(io.StringIO()):
+            df = crear_features_derivadas(df)
+    return df
+
+def iterar_escenarios(df, multiplicador=MULTIPLICADOR_ESCENARIOS, derivar=False,
+                      n_procesos=N_PROCESOS_SIMULACION, tamano_bloque=TAMANO_BLOQUE_SIMULACION,
+                      semilla=SEMILLA_SIMULACION, lote=0):
+    """
+    Genera los escenarios simulados por bloques de tamano_bloque estudiantes, en
+    orden. Cada bloque usa su propia semilla derivada (SeedSequence.spawn), así
+    que el resultado es el mismo con cualquier cantidad de procesos. Como mucho
+    hay 2 bloques por proceso en curso.
+    lote es el índice del lote en la partición (0 = corrida completa): cada lote
+    agregado deriva sus semillas de otra rama y no repite los sorteos del primero.
+    """
+    n_bloques = -(-len(df) // tamano_bloque)
+    secuencia = np.random.SeedSequence(semilla, spawn_key=(lote,)) if lote else np.random.SeedSequence(semilla)
+    semillas = secuencia.spawn(n_bloques)
+    promedios = df['PROM_NOTAS_ALU'].to_numpy()
+    riesgos = df['RIESGO'].to_numpy()
+    ids = df['MRUN'].to_numpy() if 'MRUN' in df.columns else df.index.to_numpy()
+    tareas = ((promedios[i:i + tamano_bloque], riesgos[i:i + tamano_bloque], ids[i:i + tamano_bloque],
+               semillas[k], multiplicador, derivar)
+              for k, i in enumerate(range(0, len(df), tamano_bloque)))
+    
+    if n_procesos <= 1 or n_bloques <= 1:
+        for argumentos in tareas:
+            yield _simular_bloque(argumentos)
+        return
+    with ProcessPoolExecutor(max_workers=n_procesos) as ejecutor:
+        pendientes = deque()
+        for argumentos in tareas:
+            pendientes.append(ejecutor.submit(_simular_bloque, argumentos))
+            if len(pendientes) >= 2 * n_procesos:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+def crear_features_simuladas(df, multiplicador=MULTIPLICADOR_ESCENARIOS, n_procesos=N_PROCESOS_SIMULACION):
     """
     Crea features simuladas para entrenar el modelo
     Simula el escenario donde tenemos hasta 3 notas parciales
+    Todos los bloques en memoria; main() los procesa y escribe uno a uno
     """
     print("\n" + "="*50)
     print("CREACIÓN DE FEATURES SIMULADAS")
@@ -85,56 +366,8 @@ def crear_features_simuladas(df):
     
     # Para cada estudiante, simulamos que tenemos 1, 2 o 3 notas parciales
     # que al promediarse dan el PROM_NOTAS_ALU
-    
-    np.random.seed(42)
-    
-    datos_simulados = []
-    
-    for idx, row in df.iterrows():
-        promedio_final = row['PROM_NOTAS_ALU']
-        
-        # Simular diferentes escenarios de notas parciales
-        # Escenario 1: 1 nota (es el promedio mismo)
-        datos_simulados.append({
-            'nota_1': promedio_final,
-            'nota_2': np.nan,
-            'nota_3': np.nan,
-            'promedio': promedio_final,
-            'riesgo': row['RIESGO']
-        })
-        
-        # Escenario 2: 2 notas que promedian al promedio final
-        # Generar dos notas que promedien al promedio final
-        nota1 = np.random.uniform(max(1.0, promedio_final - 1.5), min(7.0, promedio_final + 1.5))
-        nota2 = 2 * promedio_final - nota1
-        nota2 = np.clip(nota2, 1.0, 7.0)
-        # Recalcular promedio real
-        promedio_real = (nota1 + nota2) / 2
-        
-        datos_simulados.append({
-            'nota_1': nota1,
-            'nota_2': nota2,
-            'nota_3': np.nan,
-            'promedio': promedio_real,
-            'riesgo': clasificar_riesgo(promedio_real)
-        })
-        
-        # Escenario 3: 3 notas que promedian al promedio final
-        nota1 = np.random.uniform(max(1.0, promedio_final - 1.5), min(7.0, promedio_final + 1.5))
-        nota2 = np.random.uniform(max(1.0, promedio_final - 1.5), min(7.0, promedio_final + 1.5))
-        nota3 = 3 * promedio_final - nota1 - nota2
-        nota3 = np.clip(nota3, 1.0, 7.0)
-        promedio_real = (nota1 + nota2 + nota3) / 3
-        
-        datos_simulados.append({
-            'nota_1': nota1,
-            'nota_2': nota2,
-            'nota_3': nota3,
-            'promedio': promedio_real,
-            'riesgo': clasificar_riesgo(promedio_real)
-        })
-    
-    df_features = pd.DataFrame(datos_simulados)
+    bloques = list(iterar_escenarios(df, multiplicador, n_procesos=n_procesos))
+    df_features = pd.concat(bloques, ignore_index=True) if bloques else simular_bloque([], [], [], 0, multiplicador)
     
     print(f"Features creadas: {len(df_features)} registros")
     print(f"\nDistribución de cantidad de notas:")
@@ -203,37 +436,54 @@ def preparar_datos_modelo(df):
     
     # Seleccionar features (SIN promedio_calculado ni distancia_umbral para evitar data leakage)
     # El modelo debe aprender de las notas individuales, no del promedio calculado
-    features = ['nota_1', 'nota_2', 'nota_3', 
-                'cantidad_notas', 'tendencia', 'variabilidad', 
-                'nota_min', 'nota_max']
-    
-    X = df[features].copy()
-    
-    # Rellenar NaN con 0 para las notas no disponibles
-    X = X.fillna(0)
+    X = aplicar_esquema(df)
+    memoria_original = len(df) * 8 * len(ESQUEMA_FEATURES)
     
     # Variable objetivo
     y = df['riesgo']
     
     print(f"Features: {X.shape}")
+    print(f"Memoria features: {memoria_original/2**20:.1f} MB en float64 -> {X.memory_usage(deep=True).sum()/2**20:.1f} MB")
+    print(f"Dtypes: {dict(X.dtypes.astype(str))}")
     print(f"Target: {y.shape}")
     print(f"\nDistribución de clases:")
     print(y.value_counts())
     
     return X, y
 
-def dividir_datos(X, y):
-    """Divide los datos en entrenamiento y prueba"""
+def splitmix64(x):
+    """Mezclador splitmix64 vectorizado sobre uint64 (el desborde es parte del algoritmo)"""
+    z = np.asarray(x, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def asignar_prueba(df, proporcion=PROPORCION_PRUEBA, semilla=SEMILLA_PARTICION):
+    """
+    Máscara de las filas que van a prueba, determinada solo por (MRUN, escenario):
+    la misma fila cae siempre en el mismo conjunto, en cualquier corrida y orden
+    """
+    ids = df['MRUN'].to_numpy()
+    if not np.issubdtype(ids.dtype, np.integer):
+        # MRUN no numérico: hash estable de pandas como entrada del mezclador
+        ids = pd.util.hash_array(ids.astype(str))
+    semilla_ids = splitmix64(ids.astype(np.uint64) ^ np.uint64(semilla))
+    h = splitmix64(semilla_ids ^ df['escenario'].to_numpy().astype(np.uint64))
+    # Los 53 bits altos como uniforme en [0, 1)
+    return (h >> np.uint64(11)).astype(np.float64) * 2.0**-53 < proporcion
+
+def dividir_datos(X, y, es_prueba):
+    """Divide los datos en entrenamiento y prueba según la máscara de asignar_prueba"""
     print("\n" + "="*50)
     print("DIVISIÓN DE DATOS")
     print("="*50)
     
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
+    X_train, X_test = X[~es_prueba], X[es_prueba]
+    y_train, y_test = y[~es_prueba], y[es_prueba]
     
     print(f"Conjunto de entrenamiento: {X_train.shape}")
-    print(f"Conjunto de prueba: {X_test.shape}")
+    print(f"Conjunto de prueba: {X_test.shape} ({es_prueba.mean():.1%}, por hash de MRUN y escenario)")
     print(f"\nDistribución en entrenamiento:")
     print(y_train.value_counts())
     print(f"\nDistribución en prueba:")
@@ -241,60 +491,195 @@ def dividir_datos(X, y):
     
     return X_train, X_test, y_train, y_test
 
-def main():
+def indices_particion(es_prueba, desplazamiento=0):
+    """Posiciones (en datos_procesados.csv) de cada conjunto, en el dtype entero más chico que alcanza"""
+    dtype = np.uint32 if desplazamiento + len(es_prueba) < 2**32 else np.uint64
+    return {'train': (np.flatnonzero(~es_prueba) + desplazamiento).astype(dtype),
+            'test': (np.flatnonzero(es_prueba) + desplazamiento).astype(dtype)}
+
+def iniciar_particion(multiplicador=MULTIPLICADOR_ESCENARIOS, agregar=False):
+    """
+    Marca la partición como 'en_curso' antes de escribir el primer bloque. Una
+    corrida completa estrena además una 'base' nueva: si se corta a la mitad,
+    la evaluación no confunde los CSV reescritos con lotes agregados a la
+    partición anterior. guardar_particion quita la marca al terminar.
+    """
+    if agregar:
+        manifiesto = cargar_particion()
+    else:
+        manifiesto = {'base': uuid.uuid4().hex[:16], 'proporcion_prueba': PROPORCION_PRUEBA,
+                      'semilla': SEMILLA_PARTICION, 'multiplicador': multiplicador, 'filas': 0, 'lotes': []}
+    manifiesto['en_curso'] = True
+    escribir_particion(manifiesto)
+    return manifiesto
+
+def guardar_particion(es_prueba, lote=None):
+    """
+    Guarda los índices de cada conjunto y completa el manifiesto abierto por
+    iniciar_particion. Sin lote, son los índices de una partición nueva; con
+    lote, se agregan a continuación de los existentes y se registra el lote.
+    """
+    manifiesto = cargar_particion()
+    anteriores = None if lote is None else {conjunto: np.load(ruta) for conjunto, ruta in RUTA_INDICES.items()}
+    
+    nuevos = indices_particion(es_prueba, manifiesto['filas'])
+    for conjunto, ruta in RUTA_INDICES.items():
+        indices = nuevos[conjunto] if anteriores is None else np.concatenate([anteriores[conjunto], nuevos[conjunto]])
+        np.save(ruta, indices)
+    
+    manifiesto['filas'] += len(es_prueba)
+    manifiesto['lotes'].append({'fecha': time.strftime('%Y-%m-%d %H:%M:%S'), 'origen': lote or 'completo',
+                                'train': len(nuevos['train']), 'test': len(nuevos['test'])})
+    manifiesto['train'] = sum(l['train'] for l in manifiesto['lotes'])
+    manifiesto['test'] = sum(l['test'] for l in manifiesto['lotes'])
+    manifiesto.pop('en_curso', None)
+    escribir_particion(manifiesto)
+    print(f"OK Partición guardada: {manifiesto['train']:,} train / {manifiesto['test']:,} test "
+          f"en {len(manifiesto['lotes'])} lote(s)")
+    return manifiesto
+
+def escribir_particion(manifiesto, ruta=RUTA_PARTICION):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def cargar_particion(ruta=RUTA_PARTICION):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+def procesar_por_bloques(df, agregar=False, multiplicador=MULTIPLICADOR_ESCENARIOS, lote=0):
+    """
+    Simula y deriva las features por bloques de estudiantes en paralelo y
+    escribe cada bloque apenas llega, en orden: datos procesados, conjuntos de
+    entrenamiento/prueba (por hash) y conteos del perfil de referencia. La
+    memoria depende del tamaño del bloque, no del multiplicador.
+    lote es el índice del lote en la partición, para sus semillas de simulación.
+    Retorna la máscara de prueba de todas las filas escritas.
+    """
+    print("\n" + "="*50)
+    print(f"FEATURES POR BLOQUES (multiplicador {multiplicador}, {N_PROCESOS_SIMULACION} proceso(s))")
+    print("="*50)
+    
+    n_bloques = -(-len(df) // TAMANO_BLOQUE_SIMULACION)
+    mascaras = []
+    distribucion = {'train': pd.Series(dtype=np.int64), 'test': pd.Series(dtype=np.int64)}
+    for i, df_features in enumerate(iterar_escenarios(df, multiplicador, derivar=True, lote=lote)):
+        # Cada paso por bloque imprime lo mismo que en memoria: se resume al final
+        with redirect_stdout(io.StringIO()):
+            X, y = preparar_datos_modelo(df_features)
+            es_prueba = asignar_prueba(df_features)
+            X_train, X_test, y_train, y_test = dividir_datos(X, y, es_prueba)
+            siguiente = agregar or i > 0
+            guardar_conjuntos(df_features, {'train': (X_train, y_train), 'test': (X_test, y_test)},
+                              agregar=siguiente)
+            guardar_perfil_referencia(X_train, y_train, acumular=siguiente)
+        mascaras.append(es_prueba)
+        distribucion['train'] = distribucion['train'].add(y_train.value_counts(), fill_value=0)
+        distribucion['test'] = distribucion['test'].add(y_test.value_counts(), fill_value=0)
+        print(f"  Bloque {i + 1}/{n_bloques}: {len(df_features):,} filas, {int(es_prueba.sum()):,} a prueba")
+    
+    es_prueba = np.concatenate(mascaras) if mascaras else np.zeros(0, dtype=bool)
+    print(f"\nFilas escritas: {len(es_prueba):,} ({int((~es_prueba).sum()):,} entrenamiento, "
+          f"{int(es_prueba.sum()):,} prueba)")
+    for conjunto, conteos in distribucion.items():
+        print(f"Distribución en {conjunto}: {conteos.astype(np.int64).to_dict()}")
+    print("OK Datos procesados, conjuntos y perfil de referencia guardados")
+    return es_prueba
+
+def guardar_conjuntos(df_features, conjuntos, agregar=False):
+    """Escribe datos_procesados y los CSV de cada conjunto; al agregar, a continuación de los existentes"""
+    modo = 'a' if agregar else 'w'
+    df_features.to_csv(RUTA_DATOS_PROCESADOS, mode=modo, header=not agregar, index=False)
+    print("\nOK Datos procesados guardados")
+    
+    for conjunto, (X, y) in conjuntos.items():
+        ruta_X, ruta_y = RUTAS_CONJUNTOS[conjunto]
+        X.to_csv(ruta_X, mode=modo, header=not agregar, index=False)
+        y.to_csv(ruta_y, mode=modo, header=not agregar, index=False)
+    print("OK Conjuntos de entrenamiento y prueba guardados")
+
+def agregar_datos(ruta):
+    """
+    Procesa solo los registros de un archivo nuevo (p. ej. otro año) y los
+    agrega a train o test según su hash, sin mover las filas existentes.
+    Actualiza los índices, el manifiesto y el perfil de referencia.
+    """
+    print("="*70)
+    print("PREPARACIÓN DE DATOS: AGREGAR REGISTROS")
+    print("="*70)
+    
+    if not os.path.exists(RUTA_PARTICION):
+        raise SystemExit("ERROR Sin partición previa: ejecuta primero la preparación completa")
+    if cargar_particion().get('en_curso'):
+        raise SystemExit("ERROR La corrida anterior no terminó: ejecuta de nuevo la preparación completa")
+    
+    df = leer_csv_original(ruta)
+    print(f"Registros nuevos: {len(df)}")
+    
+    # Los registros nuevos se simulan con el mismo multiplicador que la partición,
+    # y con semillas propias de su número de lote
+    particion = cargar_particion()
+    multiplicador = particion.get('multiplicador', MULTIPLICADOR_ESCENARIOS)
+    df = crear_variable_objetivo(limpiar_datos(df))
+    iniciar_particion(agregar=True)
+    es_prueba = procesar_por_bloques(df, agregar=True, multiplicador=multiplicador,
+                                     lote=len(particion['lotes']))
+    guardar_particion(es_prueba, lote=os.path.basename(ruta))
+    print("\n" + "="*70)
+    print("REGISTROS AGREGADOS")
+    print("="*70)
+
+def main(multiplicador=MULTIPLICADOR_ESCENARIOS):
     """Función principal"""
     print("="*70)
     print("PREPARACIÓN DE DATOS")
     print("Fase 3 de CRISP-DM: Preparación de los Datos")
     print("="*70)
     
+    etapas = []
+    
     # Cargar datos
-    df = cargar_datos()
+    with medir_etapa(etapas, 'cargar_datos'):
+        df = cargar_datos()
+    n_registros = len(df)
     
     # Limpiar datos
-    df = limpiar_datos(df)
+    with medir_etapa(etapas, 'limpiar_datos'):
+        df = limpiar_datos(df)
     
     # Crear variable objetivo
-    df = crear_variable_objetivo(df)
-    
-    # Crear features simuladas
-    df_features = crear_features_simuladas(df)
-    
-    # Crear features derivadas
-    df_features = crear_features_derivadas(df_features)
-    
-    # Preparar datos para modelo
-    X, y = preparar_datos_modelo(df_features)
-    
-    # Dividir datos
-    X_train, X_test, y_train, y_test = dividir_datos(X, y)
+    with medir_etapa(etapas, 'crear_variable_objetivo'):
+        df = crear_variable_objetivo(df)
     
-    # Guardar datos procesados
+    # Guardar esquema de features
     os.makedirs('../03_preparacion_datos', exist_ok=True)
+    guardar_esquema()
     
-    # Guardar datos completos
-    df_features.to_csv('../03_preparacion_datos/datos_procesados.csv', index=False)
-    print("\nOK Datos procesados guardados")
+    # Partición nueva, marcada en curso hasta que se escriban todos los bloques
+    iniciar_particion(multiplicador)
     
-    # Guardar conjuntos de entrenamiento y prueba
-    X_train.to_csv('../03_preparacion_datos/X_train.csv', index=False)
-    X_test.to_csv('../03_preparacion_datos/X_test.csv', index=False)
-    y_train.to_csv('../03_preparacion_datos/y_train.csv', index=False)
-    y_test.to_csv('../03_preparacion_datos/y_test.csv', index=False)
+    # Features simuladas y derivadas, modelo, división por hash de (MRUN, escenario)
+    # y escritura, bloque a bloque
+    with medir_etapa(etapas, 'features_por_bloques'):
+        es_prueba = procesar_por_bloques(df, multiplicador=multiplicador)
     
-    print("OK Conjuntos de entrenamiento y prueba guardados")
+    # Índices de cada conjunto y manifiesto de la partición
+    guardar_particion(es_prueba)
+    
+    guardar_perfil_etapas(etapas, n_registros)
     print("\n" + "="*70)
     print("PREPARACIÓN COMPLETADA")
     print("="*70)
 
 if __name__ == "__main__":
-    def clasificar_riesgo(promedio):
-        if promedio < 3.5:
-            return 'alto'
-        elif promedio < 4.0:
-            return 'medio'
-        else:
-            return 'bajo'
-    
-    main()
-
+    parser = argparse.ArgumentParser(description='Fase 3: preparación de los datos')
+    parser.add_argument('--agregar', metavar='CSV',
+                        help='Agrega los registros de un CSV nuevo sin rehacer la partición existente')
+    parser.add_argument('--multiplicador', type=int, default=MULTIPLICADOR_ESCENARIOS,
+                        help='Secuencias simuladas de 2 y de 3 notas por estudiante')
+    args = parser.parse_args()
+    if args.agregar:
+        agregar_datos(args.agregar)
+    else:
+        main(args.multiplicador)
@@ -6,23 +6,88 @@ Fase 4 de CRISP-DM: Modelado
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.ensemble._forest import ForestClassifier
+from sklearn.dummy import DummyClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import GridSearchCV, cross_val_score
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from joblib import Parallel, delayed
 import joblib
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import time
+
+from perfilador import (
+    Perfilador, medir_proceso, comparar_reportes, imprimir_comparacion, RUTA_REPORTE_ANTERIOR
+)
 
 SAMPLE_FRAC = 0.35  # reduce dataset size for faster experimentation
 MAX_TRAIN_SAMPLES = 200_000
 CV_FOLDS = 3
+COLAPSAR_DUPLICADOS = True   # entrenar sobre filas únicas ponderadas por su frecuencia
+VERIFICAR_COLAPSO = True     # comparar métricas y tiempos con y sin colapso
+MUESTRA_VERIFICACION = 50_000
+TOLERANCIA_VERIFICACION = 0.005
+RUTA_ESQUEMA = '../03_preparacion_datos/esquema_features.json'
+
+# Presupuestos de servicio para la selección del modelo
+PRESUPUESTO_LATENCIA_FILA_MS = 25.0    # predict_proba de una fila (mediana)
+PRESUPUESTO_LATENCIA_LOTE_MS = 250.0   # predict_proba de 1.000 filas (mediana)
+PRESUPUESTO_TAMANO_MB = 200.0          # tamaño del .pkl serializado
+TOLERANCIA_ACCURACY = 0.002            # accuracy CV que se cede a cambio de un modelo más rápido
+REPETICIONES_LATENCIA = 30
+
+# Grilla de hiperparámetros por familia de modelo
+GRILLAS = {
+    'RandomForest': {
+        'n_estimators': [100, 200],
+        'max_depth': [None, 20],
+        'min_samples_split': [2, 5],
+        'min_samples_leaf': [1, 2]
+    },
+    'GradientBoosting': {
+        'n_estimators': [100, 200],
+        'max_depth': [3, 5],
+        'learning_rate': [0.05, 0.1]
+    },
+    'LogisticRegression': {
+        'C': [0.1, 1.0, 10.0]
+    }
+}
+
+
+def cargar_esquema():
+    """Carga el esquema de features exportado por la fase de preparación"""
+    with open(RUTA_ESQUEMA, encoding='utf-8') as f:
+        return json.load(f)
 
+def leer_features(ruta, esquema):
+    """Lee un CSV de features con los dtypes del esquema, validando columnas y orden"""
+    X = pd.read_csv(ruta, dtype=esquema['features'])
+    if list(X.columns) != list(esquema['features']):
+        raise ValueError(f"{ruta}: columnas {list(X.columns)} no coinciden con el esquema")
+    return X
+
+def matriz_features(X):
+    """
+    DataFrame float32 respaldado por un único arreglo contiguo.
+    sklearn lo recibe sin copiar ni convertir en cada fit/predict.
+    """
+    matriz = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+    return pd.DataFrame(matriz, columns=X.columns, index=X.index, copy=False)
 
 def cargar_datos():
     """Carga los datos preparados"""
     print("Cargando datos preparados...")
-    X_train = pd.read_csv('../03_preparacion_datos/X_train.csv')
-    X_test = pd.read_csv('../03_preparacion_datos/X_test.csv')
-    y_train = pd.read_csv('../03_preparacion_datos/y_train.csv').squeeze()
-    y_test = pd.read_csv('../03_preparacion_datos/y_test.csv').squeeze()
+    esquema = cargar_esquema()
+    X_train = leer_features('../03_preparacion_datos/X_train.csv', esquema)
+    X_test = leer_features('../03_preparacion_datos/X_test.csv', esquema)
+    y_train = pd.read_csv('../03_preparacion_datos/y_train.csv', dtype=esquema['objetivo']).squeeze()
+    y_test = pd.read_csv('../03_preparacion_datos/y_test.csv', dtype=esquema['objetivo']).squeeze()
     
     if SAMPLE_FRAC < 1.0 or len(X_train) > MAX_TRAIN_SAMPLES:
         frac = SAMPLE_FRAC if len(X_train) * SAMPLE_FRAC <= MAX_TRAIN_SAMPLES else MAX_TRAIN_SAMPLES / len(X_train)
@@ -33,31 +98,125 @@ def cargar_datos():
     else:
         print(f"Entrenamiento: {X_train.shape}")
     print(f"Prueba: {X_test.shape}")
+    print(f"Memoria features: {(X_train.memory_usage().sum() + X_test.memory_usage().sum())/2**20:.1f} MB")
     
     return X_train, X_test, y_train, y_test
 
-def entrenar_modelos(X_train, y_train):
-    """Entrena múltiples modelos y selecciona el mejor"""
+def colapsar_duplicados(X, y):
+    """
+    Colapsa filas idénticas (features + clase) en filas únicas.
+    Retorna X e y únicos y el conteo de cada fila como sample_weight.
+    """
     print("\n" + "="*50)
-    print("ENTRENAMIENTO DE MODELOS")
+    print("COLAPSO DE DUPLICADOS")
     print("="*50)
     
-    modelos = {
+    datos = X.assign(_clase=np.asarray(y))
+    conteos = datos.groupby(list(datos.columns), sort=False, dropna=False).size()
+    unicos = conteos.index.to_frame(index=False)
+    y_unicos = unicos.pop('_clase')
+    pesos = conteos.to_numpy(dtype=np.float64)
+    
+    print(f"Filas originales: {len(X):,}")
+    print(f"Filas únicas:     {len(unicos):,} ({len(unicos)/len(X)*100:.1f}%)")
+    
+    return unicos, y_unicos, pesos
+
+def _ajustar(estimador, X, y, sample_weight=None):
+    """Ajusta el estimador pasando sample_weight solo si corresponde"""
+    if sample_weight is None:
+        return estimador.fit(X, y)
+    return estimador.fit(X, y, sample_weight=sample_weight)
+
+def _folds_ponderados(y, pesos):
+    """
+    Folds estratificados para filas ponderadas por conteo.
+    Las copias de cada fila se reparten en round-robin dentro de su clase, igual
+    que si se expandieran, de modo que una fila frecuente aporta a todos los folds.
+    Retorna una lista de (train, test, w_train, w_test).
+    """
+    y = np.asarray(y)
+    conteos = pesos.astype(np.int64)
+    # Posición de la primera copia de cada fila dentro de su clase
+    inicio = np.zeros(len(y), dtype=np.int64)
+    for clase in np.unique(y):
+        mascara = y == clase
+        acumulado = np.cumsum(conteos[mascara])
+        inicio[mascara] = acumulado - conteos[mascara]
+    
+    folds = []
+    for k in range(CV_FOLDS):
+        # Copias j en [0, conteo) con (inicio + j) % CV_FOLDS == k
+        en_fold = conteos // CV_FOLDS + (((k - inicio) % CV_FOLDS) < conteos % CV_FOLDS)
+        fuera = conteos - en_fold
+        train, test = np.flatnonzero(fuera), np.flatnonzero(en_fold)
+        folds.append((train, test, fuera[train].astype(np.float64), en_fold[test].astype(np.float64)))
+    return folds
+
+def _evaluar_fold(modelo, X, y, train, test, w_train=None, w_test=None):
+    """Ajusta y puntúa un fold, midiendo su costo en el proceso que lo ejecuta"""
+    with medir_proceso() as medicion:
+        estimador = _ajustar(clone(modelo), X.iloc[train], y.iloc[train], w_train)
+        y_pred = estimador.predict(X.iloc[test])
+        score = accuracy_score(y.iloc[test], y_pred, sample_weight=w_test)
+    return score, medicion
+
+def validacion_cruzada(modelos, X, y, perfil, prefijo, sample_weight=None):
+    """
+    Validación cruzada estratificada (equivalente a cross_val_score con scoring='accuracy')
+    para uno o varios modelos, registrando cada fold en el perfil.
+    Con sample_weight los ajustes y la accuracy de cada fold son ponderados.
+    Retorna un arreglo de scores (n_modelos, CV_FOLDS).
+    """
+    if sample_weight is None:
+        folds = [(train, test, None, None)
+                 for train, test in StratifiedKFold(n_splits=CV_FOLDS).split(X, y)]
+    else:
+        folds = _folds_ponderados(y, sample_weight)
+    resultados = Parallel(n_jobs=-1)(
+        delayed(_evaluar_fold)(modelo, X, y, train, test, w_train, w_test)
+        for modelo in modelos
+        for train, test, w_train, w_test in folds
+    )
+    
+    scores = np.empty((len(modelos), CV_FOLDS))
+    for k, (score, medicion) in enumerate(resultados):
+        i, fold = divmod(k, CV_FOLDS)
+        scores[i, fold] = score
+        nombre = prefijo[i] if isinstance(prefijo, list) else prefijo
+        perfil.agregar('fold', f'{nombre}/fold_{fold + 1}', medicion, accuracy=round(score, 6))
+    return scores
+
+def modelos_base():
+    """Modelos candidatos con su configuración por defecto"""
+    return {
         'RandomForest': RandomForestClassifier(random_state=42, n_jobs=-1),
         'GradientBoosting': GradientBoostingClassifier(random_state=42),
         'LogisticRegression': LogisticRegression(random_state=42, max_iter=500, multi_class='multinomial')
     }
+
+def entrenar_modelos(X_train, y_train, perfil=None, sample_weight=None):
+    """Entrena múltiples modelos y selecciona el mejor"""
+    perfil = perfil if perfil is not None else Perfilador()
+    print("\n" + "="*50)
+    print("ENTRENAMIENTO DE MODELOS")
+    print("="*50)
+    
+    modelos = modelos_base()
     
     resultados = {}
     
     for nombre, modelo in modelos.items():
         print(f"\nEntrenando {nombre}...")
         
-        # Validación cruzada
-        scores = cross_val_score(modelo, X_train, y_train, cv=CV_FOLDS, scoring='accuracy', n_jobs=-1)
-        
-        # Entrenar en todo el conjunto
-        modelo.fit(X_train, y_train)
+        with perfil.medir('modelo', nombre) as registro:
+            # Validación cruzada
+            scores = validacion_cruzada([modelo], X_train, y_train, perfil, nombre, sample_weight)[0]
+            
+            # Entrenar en todo el conjunto
+            with perfil.medir('ajuste', f'{nombre}/ajuste_completo'):
+                _ajustar(modelo, X_train, y_train, sample_weight)
+            registro['cv_mean'] = round(scores.mean(), 6)
         
         resultados[nombre] = {
             'modelo': modelo,
@@ -70,34 +229,169 @@ def entrenar_modelos(X_train, y_train):
     
     return resultados
 
-def optimizar_hiperparametros(X_train, y_train):
-    """Optimiza hiperparámetros del mejor modelo"""
+def medir_costo_servicio(modelo, X_muestra):
+    """
+    Mide lo que cuesta servir el modelo: latencia de predict_proba para una fila
+    y para 1.000 filas (mediana y p95), tamaño serializado y tiempo de carga.
+    """
+    fila = X_muestra.iloc[:1]
+    lote = X_muestra.iloc[:1000]
+    modelo.predict_proba(lote)  # calentar
+    
+    def _latencias(X, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            modelo.predict_proba(X)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return np.array(tiempos)
+    
+    t_fila = _latencias(fila, REPETICIONES_LATENCIA)
+    t_lote = _latencias(lote, max(5, REPETICIONES_LATENCIA // 5))
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'modelo.pkl')
+        joblib.dump(modelo, ruta)
+        tamano = os.path.getsize(ruta)
+        inicio = time.perf_counter()
+        joblib.load(ruta)
+        carga = time.perf_counter() - inicio
+    
+    return {
+        'latencia_fila_ms': float(np.median(t_fila)),
+        'latencia_fila_p95_ms': float(np.percentile(t_fila, 95)),
+        'latencia_lote_ms': float(np.median(t_lote)),
+        'latencia_lote_p95_ms': float(np.percentile(t_lote, 95)),
+        'tamano_mb': tamano / 2**20,
+        'carga_s': carga,
+    }
+
+def dentro_de_presupuesto(costo):
+    """Indica si el costo de servicio respeta los presupuestos configurados"""
+    return (costo['latencia_fila_ms'] <= PRESUPUESTO_LATENCIA_FILA_MS
+            and costo['latencia_lote_ms'] <= PRESUPUESTO_LATENCIA_LOTE_MS
+            and costo['tamano_mb'] <= PRESUPUESTO_TAMANO_MB)
+
+def seleccionar_modelo(resultados):
+    """
+    Selecciona entre candidatos con 'cv_mean' y 'costo' (ver medir_costo_servicio).
+    Descarta los que exceden los presupuestos, toma el frente de Pareto
+    accuracy/latencia y, dentro de TOLERANCIA_ACCURACY del más preciso del
+    frente, elige el de menor latencia por fila.
+    """
+    print(f"\n{'Modelo':<22} {'CV':>8} {'Fila (ms)':>10} {'1k (ms)':>10} "
+          f"{'Tamaño (MB)':>12} {'Carga (s)':>10}  Presupuesto")
+    for nombre, r in resultados.items():
+        c = r['costo']
+        print(f"{nombre:<22} {r['cv_mean']:>8.4f} {c['latencia_fila_ms']:>10.2f} "
+              f"{c['latencia_lote_ms']:>10.2f} {c['tamano_mb']:>12.2f} {c['carga_s']:>10.3f}  "
+              f"{'OK' if dentro_de_presupuesto(c) else 'EXCEDE'}")
+    
+    candidatos = [n for n, r in resultados.items() if dentro_de_presupuesto(r['costo'])]
+    if not candidatos:
+        print("⚠ Ningún modelo cumple los presupuestos; se consideran todos")
+        candidatos = list(resultados)
+    
+    # Frente de Pareto: nadie es a la vez más preciso y más rápido
+    def _domina(a, b):
+        ra, rb = resultados[a], resultados[b]
+        la, lb = ra['costo']['latencia_fila_ms'], rb['costo']['latencia_fila_ms']
+        return (ra['cv_mean'] >= rb['cv_mean'] and la <= lb
+                and (ra['cv_mean'] > rb['cv_mean'] or la < lb))
+    frente = [b for b in candidatos if not any(_domina(a, b) for a in candidatos if a != b)]
+    
+    mejor_cv = max(resultados[n]['cv_mean'] for n in frente)
+    aceptables = [n for n in frente if resultados[n]['cv_mean'] >= mejor_cv - TOLERANCIA_ACCURACY]
+    elegido = min(aceptables, key=lambda n: resultados[n]['costo']['latencia_fila_ms'])
+    
+    print(f"\nFrente de Pareto (accuracy/latencia): {frente}")
+    return elegido
+
+def optimizar_hiperparametros(X_train, y_train, perfil=None, sample_weight=None,
+                              nombre_modelo='RandomForest'):
+    """Optimiza hiperparámetros del modelo seleccionado"""
+    perfil = perfil if perfil is not None else Perfilador()
     print("\n" + "="*50)
     print("OPTIMIZACIÓN DE HIPERPARÁMETROS")
     print("="*50)
     
-    # Usar RandomForest como base (generalmente funciona bien)
-    param_grid = {
-        'n_estimators': [100, 200],
-        'max_depth': [None, 20],
-        'min_samples_split': [2, 5],
-        'min_samples_leaf': [1, 2]
-    }
-    
-    rf = RandomForestClassifier(random_state=42, n_jobs=-1)
+    # Grilla de la familia del modelo seleccionado
+    param_grid = GRILLAS[nombre_modelo]
+    base = modelos_base()[nombre_modelo]
+    print(f"Modelo base: {nombre_modelo}")
     
     print("Buscando mejores hiperparámetros...")
-    grid_search = GridSearchCV(
-        rf, param_grid, cv=CV_FOLDS, scoring='accuracy', 
-        n_jobs=-1, verbose=1
-    )
+    # Búsqueda en grilla equivalente a GridSearchCV, pero con cada fit medido
+    candidatos = list(ParameterGrid(param_grid))
+    nombres = ['grid/' + ','.join(f'{k}={v}' for k, v in params.items()) for params in candidatos]
+    print(f"Fitting {CV_FOLDS} folds for each of {len(candidatos)} candidates, "
+          f"totalling {CV_FOLDS * len(candidatos)} fits")
+    
+    with perfil.medir('fase', 'grid_busqueda'):
+        scores = validacion_cruzada(
+            [clone(base).set_params(**params) for params in candidatos],
+            X_train, y_train, perfil, nombres, sample_weight
+        )
     
-    grid_search.fit(X_train, y_train)
+    # Registro agregado por candidato a partir de sus folds
+    for nombre, params, fila in zip(nombres, candidatos, scores):
+        folds = [r for r in perfil.registros
+                 if r['tipo'] == 'fold' and r['nombre'].startswith(nombre + '/')]
+        perfil.agregar('candidato', nombre, {
+            'pared_s': round(sum(r['pared_s'] for r in folds), 4),
+            'cpu_s': round(sum(r['cpu_s'] for r in folds), 4),
+            'rss_pico_mb': max(r['rss_pico_mb'] for r in folds),
+        }, cv_mean=round(fila.mean(), 6), params={k: v for k, v in params.items()})
     
-    print(f"\nMejores parámetros: {grid_search.best_params_}")
-    print(f"Mejor score CV: {grid_search.best_score_:.4f}")
+    mejor = int(np.argmax(scores.mean(axis=1)))
+    mejores_params = candidatos[mejor]
     
-    return grid_search.best_estimator_
+    with perfil.medir('ajuste', 'grid/ajuste_final'):
+        mejor_modelo = _ajustar(clone(base).set_params(**mejores_params), X_train, y_train, sample_weight)
+    
+    print(f"\nMejores parámetros: {mejores_params}")
+    print(f"Mejor score CV: {scores[mejor].mean():.4f}")
+    
+    return mejor_modelo, scores[mejor].mean()
+
+def verificar_colapso(X_train, y_train, X_test, y_test, perfil=None):
+    """
+    Compara un RandomForest entrenado sobre filas expandidas contra el mismo
+    modelo entrenado sobre filas únicas ponderadas: tiempo de ajuste y accuracy en prueba.
+    """
+    perfil = perfil if perfil is not None else Perfilador()
+    print("\n" + "="*50)
+    print("VERIFICACIÓN DEL COLAPSO DE DUPLICADOS")
+    print("="*50)
+    
+    if len(X_train) > MUESTRA_VERIFICACION:
+        idx = X_train.sample(n=MUESTRA_VERIFICACION, random_state=42).index
+        X_train, y_train = X_train.loc[idx], y_train.loc[idx]
+    X_unicos, y_unicos, pesos = colapsar_duplicados(X_train, y_train)
+    X_train, X_unicos, X_test = matriz_features(X_train), matriz_features(X_unicos), matriz_features(X_test)
+    
+    base = RandomForestClassifier(random_state=42, n_jobs=-1)
+    with perfil.medir('verificacion', 'colapso/expandido') as expandido:
+        acc_expandido = accuracy_score(y_test, clone(base).fit(X_train, y_train).predict(X_test))
+    with perfil.medir('verificacion', 'colapso/ponderado') as ponderado:
+        modelo = clone(base).fit(X_unicos, y_unicos, sample_weight=pesos)
+        acc_ponderado = accuracy_score(y_test, modelo.predict(X_test))
+    
+    diferencia = abs(acc_ponderado - acc_expandido)
+    aceleracion = expandido['pared_s'] / max(ponderado['pared_s'], 1e-9)
+    expandido['accuracy'] = round(acc_expandido, 6)
+    ponderado.update(accuracy=round(acc_ponderado, 6), aceleracion=round(aceleracion, 2))
+    
+    print(f"\nFilas de ajuste: {len(X_train):,} -> {len(X_unicos):,}")
+    print(f"Accuracy expandido: {acc_expandido:.4f}  ({expandido['pared_s']:.2f} s)")
+    print(f"Accuracy ponderado: {acc_ponderado:.4f}  ({ponderado['pared_s']:.2f} s)")
+    print(f"Aceleración: {aceleracion:.2f}x")
+    if diferencia <= TOLERANCIA_VERIFICACION:
+        print(f"OK Métricas equivalentes (diferencia {diferencia:.4f} <= {TOLERANCIA_VERIFICACION})")
+    else:
+        print(f"⚠ Las métricas difieren en {diferencia:.4f} (> {TOLERANCIA_VERIFICACION})")
+    
+    return diferencia <= TOLERANCIA_VERIFICACION
 
 def evaluar_modelo(modelo, X_test, y_test):
     """Evalúa el modelo en el conjunto de prueba"""
@@ -126,6 +420,113 @@ def guardar_modelo(modelo, nombre='modelo_riesgo_repitencia'):
     print(f"\nOK Modelo guardado en {ruta}")
     return ruta
 
+def sha256_archivo(ruta):
+    """sha256 del contenido de un archivo, leído por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(2**20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def exportar_modelo_mapeable(modelo, nombre='modelo_riesgo_repitencia'):
+    """
+    Exporta los árboles del modelo como arreglos planos .npy (nodos de todos los
+    árboles concatenados) más un manifiesto JSON. La API los abre con
+    np.load(mmap_mode='r'): la carga toma milisegundos y varios workers comparten
+    una sola copia física a través del page cache.
+    Soporta bosques de clasificación y GradientBoostingClassifier.
+    El manifiesto guarda el sha256 del .pkl ya guardado: la API solo sirve el
+    formato mapeado si corresponde a ese pickle (el que evalúa la fase 5).
+    """
+    directorio = f'../04_modelado/{nombre}_mmap'
+    ruta_pickle = f'../04_modelado/{nombre}.pkl'
+    if isinstance(modelo, ForestClassifier):
+        tipo = 'bosque'
+        arboles = [estimador.tree_ for estimador in modelo.estimators_]
+        clase_arbol = np.zeros(len(arboles), dtype=np.int32)
+    elif isinstance(modelo, GradientBoostingClassifier) and (
+            modelo.init_ == 'zero' or isinstance(modelo.init_, DummyClassifier)):
+        tipo = 'gradient_boosting'
+        # estimators_ tiene forma (etapas, K): un árbol de regresión por etapa y clase
+        arboles = [estimador.tree_ for estimador in modelo.estimators_.ravel()]
+        clase_arbol = np.tile(np.arange(modelo.estimators_.shape[1], dtype=np.int32),
+                              modelo.estimators_.shape[0])
+    else:
+        print(f"⚠ {type(modelo).__name__} no tiene formato mapeable; solo se guarda el .pkl")
+        # Un directorio de una corrida anterior ya no corresponde al modelo guardado
+        shutil.rmtree(directorio, ignore_errors=True)
+        return None
+    
+    izquierda, derecha, feature, umbral, valor, raices = [], [], [], [], [], []
+    desplazamiento = 0
+    profundidad = 0
+    for arbol in arboles:
+        indices = np.arange(arbol.node_count) + desplazamiento
+        hoja = arbol.children_left == -1
+        # Las hojas apuntan a sí mismas: recorrer de más no cambia el resultado
+        izquierda.append(np.where(hoja, indices, arbol.children_left + desplazamiento))
+        derecha.append(np.where(hoja, indices, arbol.children_right + desplazamiento))
+        feature.append(np.where(hoja, -1, arbol.feature))
+        umbral.append(arbol.threshold)
+        if tipo == 'bosque':
+            conteos = arbol.value[:, 0, :]
+            valor.append(conteos / conteos.sum(axis=1, keepdims=True))
+        else:
+            valor.append(arbol.value[:, 0, :])
+        raices.append(desplazamiento)
+        desplazamiento += arbol.node_count
+        profundidad = max(profundidad, arbol.max_depth)
+    
+    arreglos = {
+        'izquierda': np.concatenate(izquierda).astype(np.int32),
+        'derecha': np.concatenate(derecha).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'umbral': np.concatenate(umbral).astype(np.float64),
+        'valor': np.ascontiguousarray(np.concatenate(valor), dtype=np.float64),
+        'raices': np.asarray(raices, dtype=np.int32),
+        'clase_arbol': clase_arbol,
+    }
+    
+    huella = hashlib.sha256()
+    for clave in sorted(arreglos):
+        huella.update(arreglos[clave].tobytes())
+    
+    manifiesto = {
+        'formato': 'arboles_planos',
+        'version': 1,
+        'tipo': tipo,
+        'clases': [str(c) for c in modelo.classes_],
+        'features': list(getattr(modelo, 'feature_names_in_', [])),
+        'n_features': int(modelo.n_features_in_),
+        'n_arboles': len(arboles),
+        'n_nodos': int(desplazamiento),
+        'profundidad_max': int(profundidad),
+        'arreglos': {clave: f'{clave}.npy' for clave in arreglos},
+        'huella': huella.hexdigest()[:16],
+        'sha256_pickle': sha256_archivo(ruta_pickle) if os.path.exists(ruta_pickle) else None,
+    }
+    if tipo == 'gradient_boosting':
+        init = modelo._raw_predict_init(np.zeros((1, modelo.n_features_in_), dtype=np.float32))
+        manifiesto['learning_rate'] = float(modelo.learning_rate)
+        manifiesto['init_raw'] = [float(v) for v in init[0]]
+    
+    # Escribir en un directorio temporal y reemplazar el anterior al final;
+    # los workers que tengan mapeados los archivos viejos los conservan
+    temporal = directorio + '.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    for clave, arreglo in arreglos.items():
+        np.save(os.path.join(temporal, f'{clave}.npy'), arreglo)
+    with open(os.path.join(temporal, 'manifiesto.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.replace(temporal, directorio)
+    
+    tamano = sum(a.nbytes for a in arreglos.values())
+    print(f"OK Modelo mapeable guardado en {directorio} "
+          f"({len(arboles)} árboles, {desplazamiento:,} nodos, {tamano/2**20:.1f} MB)")
+    return directorio
+
 def main():
     """Función principal"""
     print("="*70)
@@ -133,30 +534,81 @@ def main():
     print("Fase 4 de CRISP-DM: Modelado")
     print("="*70)
     
+    perfil = Perfilador()
+    
     # Cargar datos
-    X_train, X_test, y_train, y_test = cargar_datos()
+    with perfil.medir('fase', 'cargar_datos'):
+        X_train, X_test, y_train, y_test = cargar_datos()
+    
+    # Colapsar filas duplicadas en filas únicas ponderadas
+    X_fit, y_fit, pesos = X_train, y_train, None
+    if COLAPSAR_DUPLICADOS:
+        with perfil.medir('fase', 'colapsar_duplicados') as registro:
+            X_fit, y_fit, pesos = colapsar_duplicados(X_train, y_train)
+        registro.update(filas_originales=len(X_train), filas_unicas=len(X_fit))
+        
+        if VERIFICAR_COLAPSO:
+            with perfil.medir('fase', 'verificar_colapso'):
+                verificar_colapso(X_train, y_train, X_test, y_test, perfil)
+    
+    # Matrices float32 contiguas para ajuste y evaluación
+    X_fit, X_test = matriz_features(X_fit), matriz_features(X_test)
     
     # Entrenar modelos
-    resultados = entrenar_modelos(X_train, y_train)
+    with perfil.medir('fase', 'entrenar_modelos'):
+        resultados = entrenar_modelos(X_fit, y_fit, perfil, pesos)
+    
+    # Medir el costo de servir cada candidato
+    with perfil.medir('fase', 'medir_costo_servicio'):
+        for nombre, resultado in resultados.items():
+            with perfil.medir('servicio', nombre) as registro:
+                resultado['costo'] = medir_costo_servicio(resultado['modelo'], X_test)
+            registro.update({k: round(v, 4) for k, v in resultado['costo'].items()})
     
-    # Seleccionar mejor modelo basado en CV
-    mejor_nombre = max(resultados.keys(), key=lambda k: resultados[k]['cv_mean'])
+    # Seleccionar modelo por accuracy CV, latencia y tamaño
+    mejor_nombre = seleccionar_modelo(resultados)
     print(f"\n{'='*50}")
-    print(f"MEJOR MODELO (CV): {mejor_nombre}")
+    print(f"MEJOR MODELO (CV + costo de servicio): {mejor_nombre}")
     print(f"Score CV: {resultados[mejor_nombre]['cv_mean']:.4f}")
     print(f"{'='*50}")
     
-    # Optimizar hiperparámetros
-    modelo_optimizado = optimizar_hiperparametros(X_train, y_train)
+    # Optimizar hiperparámetros del modelo seleccionado
+    with perfil.medir('fase', 'optimizar_hiperparametros'):
+        modelo_optimizado, cv_optimizado = optimizar_hiperparametros(
+            X_fit, y_fit, perfil, pesos, mejor_nombre
+        )
+        # El modelo optimizado también debe ganarse su costo de servicio
+        finalistas = {
+            'optimizado': {'cv_mean': cv_optimizado,
+                           'costo': medir_costo_servicio(modelo_optimizado, X_test)},
+            'sin_optimizar': resultados[mejor_nombre],
+        }
+        if seleccionar_modelo(finalistas) == 'sin_optimizar':
+            print(f"⚠ La optimización no compensa su costo de servicio; se usa {mejor_nombre} sin optimizar")
+            modelo_optimizado = resultados[mejor_nombre]['modelo']
     
     # Evaluar modelo optimizado
-    accuracy, y_pred = evaluar_modelo(modelo_optimizado, X_test, y_test)
+    with perfil.medir('fase', 'evaluar_modelo'):
+        accuracy, y_pred = evaluar_modelo(modelo_optimizado, X_test, y_test)
     
     # Guardar modelo
-    ruta_modelo = guardar_modelo(modelo_optimizado)
+    with perfil.medir('fase', 'guardar_modelo'):
+        ruta_modelo = guardar_modelo(modelo_optimizado)
+        
+        # Guardar también el mejor modelo sin optimizar para comparación
+        guardar_modelo(resultados[mejor_nombre]['modelo'], 'modelo_sin_optimizar')
+    
+    # Formato mapeable en memoria para la API
+    with perfil.medir('fase', 'exportar_modelo_mapeable'):
+        exportar_modelo_mapeable(modelo_optimizado)
     
-    # Guardar también el mejor modelo sin optimizar para comparación
-    guardar_modelo(resultados[mejor_nombre]['modelo'], 'modelo_sin_optimizar')
+    # Reporte de perfilado junto al modelo, comparado con la corrida anterior
+    perfil.resumen()
+    perfil.guardar()
+    if os.path.exists(RUTA_REPORTE_ANTERIOR):
+        with open(RUTA_REPORTE_ANTERIOR, encoding='utf-8') as f:
+            anterior = json.load(f)
+        imprimir_comparacion(comparar_reportes(anterior, perfil.reporte()), solo_regresiones=True)
     
     print("\n" + "="*70)
     print("ENTRENAMIENTO COMPLETADO")
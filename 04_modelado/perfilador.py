@@ -0,0 +1,229 @@
+"""
+Perfilador de Entrenamiento
+Registra tiempo de pared, tiempo de CPU y memoria pico (RSS) de cada fase,
+modelo candidato, fold de validación cruzada y candidato de la grilla.
+
+Uso como comando para comparar dos corridas:
+    python perfilador.py                                 # anterior vs actual
+    python perfilador.py base.json nuevo.json --umbral 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+
+INTERVALO_MUESTREO = 0.05  # segundos entre lecturas de RSS
+UMBRAL_REGRESION = 0.10    # 10% más lento / más memoria se marca como regresión
+# Diferencias absolutas por debajo de estos mínimos se consideran ruido
+MINIMOS_RUIDO = {'pared_s': 0.5, 'cpu_s': 0.5, 'rss_pico_mb': 20.0}
+
+RUTA_REPORTE = '../04_modelado/perfil_entrenamiento.json'
+RUTA_REPORTE_ANTERIOR = '../04_modelado/perfil_entrenamiento_anterior.json'
+
+
+class MuestreadorRSS(threading.Thread):
+    """Hilo que lee periódicamente el RSS y conserva el máximo observado"""
+
+    def __init__(self, incluir_hijos):
+        super().__init__(daemon=True)
+        self._proceso = psutil.Process()
+        self._incluir_hijos = incluir_hijos
+        self._detener = threading.Event()
+        self.inicial = self._rss()
+        self.pico = self.inicial
+
+    def _rss(self):
+        rss = self._proceso.memory_info().rss
+        if self._incluir_hijos:
+            for hijo in self._proceso.children(recursive=True):
+                try:
+                    rss += hijo.memory_info().rss
+                except psutil.Error:
+                    pass  # el hijo terminó entre el listado y la lectura
+        return rss
+
+    def run(self):
+        while not self._detener.wait(INTERVALO_MUESTREO):
+            self.pico = max(self.pico, self._rss())
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+        self.pico = max(self.pico, self._rss())
+        return self.pico
+
+
+def _cpu_total(incluir_hijos):
+    """Tiempo de CPU (usuario + sistema) del proceso y, opcionalmente, de sus hijos"""
+    proceso = psutil.Process()
+    tiempos = proceso.cpu_times()
+    total = tiempos.user + tiempos.system
+    if incluir_hijos:
+        # Hijos ya terminados y recolectados
+        total += tiempos.children_user + tiempos.children_system
+        # Hijos vivos (p. ej. los workers persistentes de joblib)
+        for hijo in proceso.children(recursive=True):
+            try:
+                t = hijo.cpu_times()
+                total += t.user + t.system
+            except psutil.Error:
+                pass
+    return total
+
+
+@contextmanager
+def medir_proceso(incluir_hijos=False):
+    """
+    Mide el bloque envuelto y deja el resultado en el diccionario entregado.
+    Con incluir_hijos=True suma la memoria y CPU de los procesos hijos,
+    útil cuando el bloque lanza trabajo en paralelo con joblib.
+    """
+    medicion = {}
+    muestreador = MuestreadorRSS(incluir_hijos)
+    muestreador.start()
+    cpu_inicio = _cpu_total(incluir_hijos)
+    inicio = time.perf_counter()
+    try:
+        yield medicion
+    finally:
+        medicion['pared_s'] = round(time.perf_counter() - inicio, 4)
+        medicion['cpu_s'] = round(max(0.0, _cpu_total(incluir_hijos) - cpu_inicio), 4)
+        pico = muestreador.detener()
+        medicion['rss_pico_mb'] = round(pico / 2**20, 1)
+        medicion['rss_delta_mb'] = round((pico - muestreador.inicial) / 2**20, 1)
+
+
+class Perfilador:
+    """Acumula las mediciones de una corrida de entrenamiento"""
+
+    def __init__(self):
+        self.registros = []
+        self._inicio = time.perf_counter()
+        self._fecha = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    @contextmanager
+    def medir(self, tipo, nombre, **extra):
+        """Mide un bloque en el proceso actual (incluyendo workers hijos)"""
+        registro = {'tipo': tipo, 'nombre': nombre}
+        registro.update(extra)
+        with medir_proceso(incluir_hijos=True) as medicion:
+            yield registro
+        registro.update(medicion)
+        self.registros.append(registro)
+
+    def agregar(self, tipo, nombre, medicion, **extra):
+        """Agrega una medición tomada en otro proceso (p. ej. un fold en un worker)"""
+        registro = {'tipo': tipo, 'nombre': nombre}
+        registro.update(extra)
+        registro.update(medicion)
+        self.registros.append(registro)
+        return registro
+
+    def reporte(self):
+        """Reporte serializable de la corrida"""
+        import sklearn
+
+        return {
+            'version': 1,
+            'fecha': self._fecha,
+            'duracion_total_s': round(time.perf_counter() - self._inicio, 4),
+            'entorno': {
+                'python': platform.python_version(),
+                'sklearn': sklearn.__version__,
+                'plataforma': platform.platform(),
+                'cpus': os.cpu_count(),
+            },
+            'registros': self.registros,
+        }
+
+    def guardar(self, ruta=RUTA_REPORTE, ruta_anterior=RUTA_REPORTE_ANTERIOR):
+        """Guarda el reporte; el reporte previo se conserva como 'anterior'"""
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        if ruta_anterior and os.path.exists(ruta):
+            os.replace(ruta, ruta_anterior)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.reporte(), f, indent=2, ensure_ascii=False)
+        print(f"OK Perfil de entrenamiento guardado en {ruta}")
+        return ruta
+
+    def resumen(self, tipos=('fase', 'modelo')):
+        """Imprime las mediciones de los tipos indicados"""
+        print(f"\n{'Tipo':<8} {'Nombre':<40} {'Pared (s)':>10} {'CPU (s)':>10} {'RSS pico (MB)':>14}")
+        for r in self.registros:
+            if r['tipo'] in tipos:
+                print(f"{r['tipo']:<8} {r['nombre']:<40} {r['pared_s']:>10.2f} "
+                      f"{r['cpu_s']:>10.2f} {r['rss_pico_mb']:>14.1f}")
+
+
+def _indexar(reporte):
+    return {f"{r['tipo']}:{r['nombre']}": r for r in reporte['registros']}
+
+
+def comparar_reportes(anterior, actual, umbral=UMBRAL_REGRESION):
+    """
+    Compara dos reportes registro a registro.
+    Retorna una lista de filas (clave, métrica, anterior, actual, variación, es_regresion).
+    """
+    base = _indexar(anterior)
+    nuevo = _indexar(actual)
+    filas = []
+    for clave, registro in nuevo.items():
+        if clave not in base:
+            continue
+        for metrica, minimo in MINIMOS_RUIDO.items():
+            antes = base[clave].get(metrica)
+            despues = registro.get(metrica)
+            if antes is None or despues is None:
+                continue
+            variacion = (despues - antes) / antes if antes > 0 else 0.0
+            es_regresion = variacion > umbral and (despues - antes) > minimo
+            filas.append((clave, metrica, antes, despues, variacion, es_regresion))
+    return filas
+
+
+def imprimir_comparacion(filas, solo_regresiones=False):
+    """Imprime la comparación y retorna la cantidad de regresiones"""
+    print(f"\n{'Registro':<55} {'Métrica':<12} {'Anterior':>10} {'Actual':>10} {'Var.':>8}")
+    regresiones = 0
+    for clave, metrica, antes, despues, variacion, es_regresion in filas:
+        if es_regresion:
+            regresiones += 1
+        elif solo_regresiones:
+            continue
+        marca = '  <-- REGRESIÓN' if es_regresion else ''
+        print(f"{clave:<55} {metrica:<12} {antes:>10.2f} {despues:>10.2f} {variacion:>+8.1%}{marca}")
+    print(f"\nRegresiones detectadas: {regresiones}")
+    return regresiones
+
+
+def main():
+    """Compara dos reportes de perfilado"""
+    parser = argparse.ArgumentParser(description='Compara dos corridas de entrenamiento')
+    parser.add_argument('anterior', nargs='?', default=RUTA_REPORTE_ANTERIOR)
+    parser.add_argument('actual', nargs='?', default=RUTA_REPORTE)
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION,
+                        help='Variación relativa sobre la cual se marca regresión (0.10 = 10%%)')
+    parser.add_argument('--solo-regresiones', action='store_true')
+    args = parser.parse_args()
+
+    with open(args.anterior, encoding='utf-8') as f:
+        anterior = json.load(f)
+    with open(args.actual, encoding='utf-8') as f:
+        actual = json.load(f)
+
+    print(f"Anterior: {args.anterior} ({anterior['fecha']}, {anterior['duracion_total_s']:.1f} s)")
+    print(f"Actual:   {args.actual} ({actual['fecha']}, {actual['duracion_total_s']:.1f} s)")
+    regresiones = imprimir_comparacion(comparar_reportes(anterior, actual, args.umbral),
+                                       args.solo_regresiones)
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()
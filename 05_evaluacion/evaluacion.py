@@ -6,168 +6,680 @@ Fase 5 de CRISP-DM: Evaluación
 import pandas as pd
 import numpy as np
 import joblib
-from sklearn.metrics import (
-    classification_report, confusion_matrix, accuracy_score,
-    precision_score, recall_score, f1_score,
-    roc_auc_score, roc_curve
-)
 import matplotlib.pyplot as plt
 import seaborn as sns
+import gc
+import glob
+import hashlib
+import json
 import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
+
+# El renderizado con caché de gráficos se comparte con el EDA
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '02_comprension_datos'))
+from graficos_cache import renderizar_graficos
+
+RUTA_ESQUEMA = '../03_preparacion_datos/esquema_features.json'
+RUTA_MODELO = '../04_modelado/modelo_riesgo_repitencia.pkl'
+TAMANO_BLOQUE = 100_000  # filas por bloque al recorrer el conjunto de prueba
+
+# Intervalos de confianza bootstrap
+N_BOOTSTRAP = 5000
+NIVEL_CONFIANZA = 0.95
+BLOQUE_BOOTSTRAP = 1000  # remuestreos por bloque vectorizado
+N_PROCESOS_BOOTSTRAP = 1  # >1 reparte los bloques entre procesos
+SEMILLA_BOOTSTRAP = 42
+OBJETIVO_ACCURACY = 0.80
+
+# Rendimiento de inferencia y presupuestos que debe cumplir el modelo
+TAMANOS_LOTE = [1, 10, 100, 1_000, 10_000, 100_000]
+N_JOBS_INFERENCIA = [1, -1]
+REPETICIONES_FILA = 200
+PRESUPUESTO_LATENCIA_P99_MS = 50.0   # predict_proba de una fila, mejor configuración de n_jobs
+PRESUPUESTO_MEMORIA_MB = 500.0       # memoria del modelo cargado + pico de predicción del lote mayor
+
+# Evaluación comparativa de todos los artefactos de 04_modelado
+DIRECTORIO_MODELOS = '../04_modelado'
+DIRECTORIO_MAPEADO = '../05_evaluacion/datos_mapeados'
+# La partición de la preparación solo agrega filas al final: las ya mapeadas y
+# las matrices de confusión ya calculadas (por huella del .pkl) se reutilizan
+RUTA_PARTICION = '../03_preparacion_datos/particion.json'
+RUTA_CACHE_CONFUSION = os.path.join(DIRECTORIO_MAPEADO, 'confusiones.json')
+N_PROCESOS_EVALUACION = os.cpu_count() or 1
+
+# Gráficos: se dibujan desde agregados y se omiten si su huella no cambió
+DIRECTORIO_GRAFICOS = '../05_evaluacion/graficos'
 
 def cargar_modelo():
     """Carga el modelo entrenado"""
     print("Cargando modelo...")
-    modelo = joblib.load('../04_modelado/modelo_riesgo_repitencia.pkl')
+    modelo = joblib.load(RUTA_MODELO)
     print("OK Modelo cargado")
     return modelo
 
-def cargar_datos():
-    """Carga los datos de prueba"""
-    print("Cargando datos de prueba...")
-    X_test = pd.read_csv('../03_preparacion_datos/X_test.csv')
-    y_test = pd.read_csv('../03_preparacion_datos/y_test.csv').squeeze()
-    print("OK Datos cargados")
-    return X_test, y_test
+def cargar_esquema():
+    """Carga el esquema de features exportado por la fase de preparación"""
+    with open(RUTA_ESQUEMA, encoding='utf-8') as f:
+        return json.load(f)
+
+def matriz_features(X):
+    """DataFrame float32 respaldado por un único arreglo contiguo"""
+    matriz = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+    return pd.DataFrame(matriz, columns=X.columns, index=X.index, copy=False)
+
+def iterar_datos(tamano_bloque=TAMANO_BLOQUE, desde=0):
+    """
+    Lee X_test e y_test en bloques paralelos, aplicando el esquema a cada bloque.
+    Nunca tiene más de un bloque en memoria. desde omite las primeras filas.
+    """
+    print(f"Leyendo datos de prueba en bloques de {tamano_bloque:,} filas...")
+    esquema = cargar_esquema()
+    columnas = list(esquema['features'])
+    omitidas = range(1, desde + 1) if desde else None
+    lector_X = pd.read_csv('../03_preparacion_datos/X_test.csv', dtype=esquema['features'],
+                           chunksize=tamano_bloque, skiprows=omitidas)
+    lector_y = pd.read_csv('../03_preparacion_datos/y_test.csv', dtype=str, chunksize=tamano_bloque,
+                           skiprows=omitidas)
+    # zip_longest: si un archivo se acaba antes (p. ej. un agregado a medias), es un error
+    for X, y in zip_longest(lector_X, lector_y):
+        if X is None or y is None:
+            raise ValueError("X_test e y_test no tienen la misma cantidad de filas")
+        if list(X.columns) != columnas:
+            raise ValueError(f"X_test: columnas {list(X.columns)} no coinciden con el esquema")
+        if len(X) != len(y):
+            raise ValueError("X_test e y_test no tienen la misma cantidad de filas")
+        yield matriz_features(X), y.iloc[:, 0].to_numpy()
+
+def acumular_confusion(modelo, bloques):
+    """
+    Recorre los bloques una sola vez acumulando la matriz de confusión
+    (filas = clase real, columnas = clase predicha, en el orden de modelo.classes_)
+    """
+    clases = np.asarray(modelo.classes_)
+    k = len(clases)
+    cm = np.zeros((k, k), dtype=np.int64)
+    for X, y in bloques:
+        y_pred = modelo.predict(X)
+        real = pd.Categorical(y, categories=clases).codes.astype(np.int64)
+        predicho = pd.Categorical(y_pred, categories=clases).codes.astype(np.int64)
+        if (real < 0).any():
+            raise ValueError(f"Clases desconocidas en y_test: {set(np.asarray(y)[real < 0])}")
+        cm += np.bincount(real * k + predicho, minlength=k * k).reshape(k, k)
+    return cm
+
+def metricas_desde_confusion(cm, clases):
+    """
+    Deriva accuracy y precision/recall/F1 por clase y ponderadas desde la matriz
+    de confusión (mismas definiciones que sklearn, con 0 cuando no hay divisor)
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    verdaderos = np.diag(cm)
+    soporte = cm.sum(axis=1)
+    predichos = cm.sum(axis=0)
+    total = cm.sum()
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predichos > 0, verdaderos / predichos, 0.0)
+        recall = np.where(soporte > 0, verdaderos / soporte, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    pesos = soporte / total if total else soporte
+    
+    return {
+        'accuracy': verdaderos.sum() / total if total else 0.0,
+        'precision': float(np.dot(pesos, precision)),
+        'recall': float(np.dot(pesos, recall)),
+        'f1': float(np.dot(pesos, f1)),
+        'por_clase': {
+            str(clase): {'precision': precision[i], 'recall': recall[i],
+                         'f1': f1[i], 'soporte': int(soporte[i])}
+            for i, clase in enumerate(clases)
+        },
+        'macro': {'precision': precision.mean(), 'recall': recall.mean(), 'f1': f1.mean()},
+        'n': int(total),
+    }
+
+def _metricas_lote(cms):
+    """
+    Métricas de un lote de matrices de confusión (B, k, k), vectorizadas.
+    Retorna arreglos (B,) para las métricas globales y (B, k) por clase.
+    """
+    cms = cms.astype(np.float64)
+    verdaderos = np.diagonal(cms, axis1=1, axis2=2)
+    soporte = cms.sum(axis=2)
+    predichos = cms.sum(axis=1)
+    total = soporte.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predichos > 0, verdaderos / predichos, 0.0)
+        recall = np.where(soporte > 0, verdaderos / soporte, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    pesos = soporte / total[:, None]
+    return {
+        'accuracy': verdaderos.sum(axis=1) / total,
+        'precision': (pesos * precision).sum(axis=1),
+        'recall': (pesos * recall).sum(axis=1),
+        'f1': (pesos * f1).sum(axis=1),
+        'precision_clase': precision,
+        'recall_clase': recall,
+        'f1_clase': f1,
+    }
+
+def _bloque_bootstrap(cm, n, semilla):
+    """
+    n remuestreos bootstrap de las filas de prueba. Remuestrear filas con
+    reemplazo equivale a sortear los conteos de cada celda (real, predicho)
+    con una multinomial, así que no hace falta materializar índices.
+    """
+    rng = np.random.default_rng(semilla)
+    total = int(cm.sum())
+    conteos = rng.multinomial(total, cm.ravel() / total, size=n)
+    return _metricas_lote(conteos.reshape(n, *cm.shape))
+
+def intervalos_bootstrap(cm, n_remuestreos=N_BOOTSTRAP, nivel=NIVEL_CONFIANZA,
+                         n_procesos=N_PROCESOS_BOOTSTRAP):
+    """
+    Intervalos de confianza percentil para todas las métricas, a partir de la
+    matriz de confusión. Cada bloque usa una semilla derivada de SEMILLA_BOOTSTRAP,
+    por lo que el resultado no depende de la cantidad de procesos.
+    """
+    tamanos = [BLOQUE_BOOTSTRAP] * (n_remuestreos // BLOQUE_BOOTSTRAP)
+    if n_remuestreos % BLOQUE_BOOTSTRAP:
+        tamanos.append(n_remuestreos % BLOQUE_BOOTSTRAP)
+    semillas = np.random.SeedSequence(SEMILLA_BOOTSTRAP).spawn(len(tamanos))
+    argumentos = ([cm] * len(tamanos), tamanos, semillas)
+    
+    if n_procesos > 1:
+        with ProcessPoolExecutor(max_workers=n_procesos) as ejecutor:
+            bloques = list(ejecutor.map(_bloque_bootstrap, *argumentos))
+    else:
+        bloques = list(map(_bloque_bootstrap, *argumentos))
+    
+    alfa = (1 - nivel) / 2
+    intervalos = {}
+    for metrica in bloques[0]:
+        valores = np.concatenate([b[metrica] for b in bloques])
+        inferior, superior = np.quantile(valores, [alfa, 1 - alfa], axis=0)
+        intervalos[metrica] = (inferior, superior)
+    return intervalos
+
+def reporte_clasificacion(metricas, digitos=2):
+    """Reporte de clasificación con el formato de sklearn, a partir de las métricas"""
+    ancho = max(len('weighted avg'), *(len(c) for c in metricas['por_clase']))
+    encabezado = ['precision', 'recall', 'f1-score', 'support']
+    lineas = [' ' * ancho + ' ' + ''.join(f'{h:>10}' for h in encabezado), '']
+    for clase, m in metricas['por_clase'].items():
+        lineas.append(f"{clase:>{ancho}} {m['precision']:>10.{digitos}f}{m['recall']:>10.{digitos}f}"
+                      f"{m['f1']:>10.{digitos}f}{m['soporte']:>10}")
+    lineas.append('')
+    lineas.append(f"{'accuracy':>{ancho}} {'':>10}{'':>10}{metricas['accuracy']:>10.{digitos}f}{metricas['n']:>10}")
+    macro = metricas['macro']
+    lineas.append(f"{'macro avg':>{ancho}} {macro['precision']:>10.{digitos}f}{macro['recall']:>10.{digitos}f}"
+                  f"{macro['f1']:>10.{digitos}f}{metricas['n']:>10}")
+    lineas.append(f"{'weighted avg':>{ancho}} {metricas['precision']:>10.{digitos}f}{metricas['recall']:>10.{digitos}f}"
+                  f"{metricas['f1']:>10.{digitos}f}{metricas['n']:>10}")
+    return '\n'.join(lineas)
 
-def evaluar_metricas(modelo, X_test, y_test):
-    """Evalúa métricas del modelo"""
+def evaluar_metricas(modelo, cm):
+    """Evalúa métricas del modelo desde su matriz de confusión sobre el conjunto de prueba"""
     print("\n" + "="*50)
     print("EVALUACIÓN DE MÉTRICAS")
     print("="*50)
     
-    y_pred = modelo.predict(X_test)
+    # La matriz de confusión contiene todo lo necesario
+    clases = [str(c) for c in modelo.classes_]
+    metricas = metricas_desde_confusion(cm, clases)
     
-    # Métricas generales
-    accuracy = accuracy_score(y_test, y_pred)
-    precision = precision_score(y_test, y_pred, average='weighted')
-    recall = recall_score(y_test, y_pred, average='weighted')
-    f1 = f1_score(y_test, y_pred, average='weighted')
+    # Incertidumbre de cada métrica por bootstrap sobre la matriz de confusión
+    intervalos = intervalos_bootstrap(cm)
+    metricas['intervalos'] = intervalos
     
-    print(f"\nMétricas Generales:")
-    print(f"  Accuracy:  {accuracy:.4f}")
-    print(f"  Precision: {precision:.4f}")
-    print(f"  Recall:    {recall:.4f}")
-    print(f"  F1-Score:  {f1:.4f}")
+    nivel = f"IC {NIVEL_CONFIANZA:.0%}"
+    print(f"\nMétricas Generales ({nivel}, {N_BOOTSTRAP:,} remuestreos bootstrap):")
+    for etiqueta, clave in [('Accuracy', 'accuracy'), ('Precision', 'precision'),
+                            ('Recall', 'recall'), ('F1-Score', 'f1')]:
+        inferior, superior = intervalos[clave]
+        print(f"  {etiqueta + ':':<10} {metricas[clave]:.4f}  [{inferior:.4f} - {superior:.4f}]")
+    
+    print(f"\nPor clase ({nivel}):")
+    for i, clase in enumerate(clases):
+        m = metricas['por_clase'][clase]
+        partes = []
+        for etiqueta, clave in [('precision', 'precision'), ('recall', 'recall'), ('f1', 'f1')]:
+            inferior, superior = intervalos[f'{clave}_clase']
+            partes.append(f"{etiqueta} {m[clave]:.3f} [{inferior[i]:.3f}-{superior[i]:.3f}]")
+        print(f"  {clase:<8} " + '  '.join(partes))
     
     # Reporte detallado
     print("\n" + "="*50)
     print("REPORTE DE CLASIFICACIÓN")
     print("="*50)
-    print(classification_report(y_test, y_pred))
+    print(reporte_clasificacion(metricas))
     
     # Matriz de confusión
     print("\n" + "="*50)
     print("MATRIZ DE CONFUSIÓN")
     print("="*50)
-    cm = confusion_matrix(y_test, y_pred)
+    print(f"Clases: {clases}")
     print(cm)
     
-    return {
-        'accuracy': accuracy,
-        'precision': precision,
-        'recall': recall,
-        'f1': f1,
-        'y_pred': y_pred,
-        'confusion_matrix': cm
-    }
+    metricas['confusion_matrix'] = cm
+    metricas['clases'] = clases
+    return metricas
 
-def visualizar_resultados(y_test, y_pred, cm):
-    """Crea visualizaciones de los resultados"""
-    print("\n" + "="*50)
-    print("CREANDO VISUALIZACIONES")
-    print("="*50)
-    
-    os.makedirs('../05_evaluacion/graficos', exist_ok=True)
-    
-    # Matriz de confusión
+def _grafico_matriz_confusion(agregados):
+    """Mapa de calor de la matriz de confusión"""
     plt.figure(figsize=(10, 8))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
-                xticklabels=['Alto', 'Medio', 'Bajo'],
-                yticklabels=['Alto', 'Medio', 'Bajo'])
+    sns.heatmap(np.asarray(agregados['cm']), annot=True, fmt='d', cmap='Blues', 
+                xticklabels=agregados['etiquetas'],
+                yticklabels=agregados['etiquetas'])
     plt.title('Matriz de Confusión')
     plt.ylabel('Verdadero')
     plt.xlabel('Predicho')
     plt.tight_layout()
-    plt.savefig('../05_evaluacion/graficos/matriz_confusion.png', dpi=300)
-    plt.close()
-    print("OK Matriz de confusion guardada")
-    
-    # Distribución de predicciones vs reales
+
+def _grafico_distribucion_predicciones(agregados):
+    """Totales reales (filas) y predichos (columnas) por clase"""
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
     
-    y_test_counts = pd.Series(y_test).value_counts().sort_index()
-    y_pred_counts = pd.Series(y_pred).value_counts().sort_index()
-    
-    axes[0].bar(y_test_counts.index, y_test_counts.values, alpha=0.7, label='Real')
+    axes[0].bar(agregados['clases'], agregados['reales'], alpha=0.7, label='Real')
     axes[0].set_title('Distribución Real')
     axes[0].set_xlabel('Riesgo')
     axes[0].set_ylabel('Cantidad')
     axes[0].legend()
     
-    axes[1].bar(y_pred_counts.index, y_pred_counts.values, alpha=0.7, label='Predicho', color='orange')
+    axes[1].bar(agregados['clases'], agregados['predichos'], alpha=0.7, label='Predicho', color='orange')
     axes[1].set_title('Distribución Predicha')
     axes[1].set_xlabel('Riesgo')
     axes[1].set_ylabel('Cantidad')
     axes[1].legend()
     
     plt.tight_layout()
-    plt.savefig('../05_evaluacion/graficos/distribucion_predicciones.png', dpi=300)
-    plt.close()
-    print("OK Distribucion de predicciones guardada")
 
-def analizar_errores(modelo, X_test, y_test, y_pred):
-    """Analiza los errores del modelo"""
+RENDERIZADORES = {
+    'matriz_confusion': _grafico_matriz_confusion,
+    'distribucion_predicciones': _grafico_distribucion_predicciones,
+}
+
+def visualizar_resultados(cm, clases):
+    """Crea visualizaciones de los resultados a partir de la matriz de confusión"""
+    print("\n" + "="*50)
+    print("CREANDO VISUALIZACIONES")
+    print("="*50)
+    
+    os.makedirs(DIRECTORIO_GRAFICOS, exist_ok=True)
+    clases = [str(c) for c in clases]
+    renderizar_graficos([
+        ('matriz_confusion', {'cm': cm, 'etiquetas': [c.capitalize() for c in clases]}),
+        ('distribucion_predicciones', {'clases': clases, 'reales': cm.sum(axis=1),
+                                       'predichos': cm.sum(axis=0)}),
+    ], RENDERIZADORES, DIRECTORIO_GRAFICOS)
+
+def analizar_errores(metricas):
+    """Analiza los errores del modelo a partir de la matriz de confusión"""
     print("\n" + "="*50)
     print("ANÁLISIS DE ERRORES")
     print("="*50)
     
-    errores = X_test[y_test != y_pred].copy()
-    errores['real'] = y_test[y_test != y_pred]
-    errores['predicho'] = y_pred[y_test != y_pred]
+    cm = metricas['confusion_matrix']
+    clases = metricas['clases']
+    aciertos = np.diag(cm)
+    total_errores = int(cm.sum() - aciertos.sum())
     
-    print(f"Total de errores: {len(errores)}")
-    print(f"Tasa de error: {len(errores)/len(y_test)*100:.2f}%")
+    print(f"Total de errores: {total_errores}")
+    print(f"Tasa de error: {total_errores/max(cm.sum(), 1)*100:.2f}%")
+    
+    por_real = pd.Series(cm.sum(axis=1) - aciertos, index=clases, name='real')
+    por_predicho = pd.Series(cm.sum(axis=0) - aciertos, index=clases, name='predicho')
     
     print("\nDistribución de errores por clase real:")
-    print(errores['real'].value_counts())
+    print(por_real[por_real > 0].sort_values(ascending=False))
     
     print("\nDistribución de errores por clase predicha:")
-    print(errores['predicho'].value_counts())
+    print(por_predicho[por_predicho > 0].sort_values(ascending=False))
+    
+    return {'total': total_errores, 'por_real': por_real, 'por_predicho': por_predicho}
+
+def medir_inferencia(ruta_modelo, X_muestra):
+    """
+    Mide el modelo serializado: tiempo de carga y memoria, percentiles de
+    latencia de una fila y throughput por tamaño de lote, para cada n_jobs.
+    """
+    print("\n" + "="*50)
+    print("RENDIMIENTO DE INFERENCIA")
+    print("="*50)
     
-    # Análisis de promedios en errores
-    if 'promedio_calculado' in errores.columns:
-        print("\nPromedio en casos con error:")
-        print(errores['promedio_calculado'].describe())
+    import psutil
+    proceso = psutil.Process()
     
-    return errores
+    gc.collect()
+    rss_antes = proceso.memory_info().rss
+    inicio = time.perf_counter()
+    modelo = joblib.load(ruta_modelo)
+    carga_s = time.perf_counter() - inicio
+    memoria_modelo_mb = max(0, proceso.memory_info().rss - rss_antes) / 2**20
+    
+    X_muestra = X_muestra.to_numpy(dtype=np.float32)
+    X_max = np.resize(X_muestra, (max(TAMANOS_LOTE), X_muestra.shape[1]))
+    X_max = pd.DataFrame(X_max, columns=modelo.feature_names_in_) \
+        if hasattr(modelo, 'feature_names_in_') else X_max
+    
+    configuraciones = N_JOBS_INFERENCIA if 'n_jobs' in modelo.get_params() else [None]
+    latencias, throughput = {}, {}
+    for n_jobs in configuraciones:
+        if n_jobs is not None:
+            modelo.set_params(n_jobs=n_jobs)
+        modelo.predict_proba(X_max[:10])  # calentar
+        
+        tiempos = []
+        for i in range(REPETICIONES_FILA):
+            inicio = time.perf_counter()
+            modelo.predict_proba(X_max[i:i + 1])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        latencias[n_jobs] = dict(zip(['p50', 'p95', 'p99'], np.percentile(tiempos, [50, 95, 99])))
+        
+        throughput[n_jobs] = {}
+        for tamano in TAMANOS_LOTE:
+            repeticiones = max(1, min(20, 20_000 // tamano))
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                modelo.predict_proba(X_max[:tamano])
+            throughput[n_jobs][tamano] = tamano * repeticiones / (time.perf_counter() - inicio)
+        
+        print(f"\nn_jobs={n_jobs}: latencia 1 fila p50={latencias[n_jobs]['p50']:.2f} ms "
+              f"p95={latencias[n_jobs]['p95']:.2f} ms p99={latencias[n_jobs]['p99']:.2f} ms")
+        for tamano, filas_s in throughput[n_jobs].items():
+            print(f"  lote {tamano:>7,}: {filas_s:>12,.0f} filas/s")
+    
+    # Pico de memoria al predecir el lote mayor
+    tracemalloc.start()
+    modelo.predict_proba(X_max)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    memoria_prediccion_mb = pico / 2**20
+    
+    mejor_n_jobs = min(latencias, key=lambda n: latencias[n]['p99'])
+    rendimiento = {
+        'carga_s': carga_s,
+        'memoria_modelo_mb': memoria_modelo_mb,
+        'memoria_prediccion_mb': memoria_prediccion_mb,
+        'latencias': latencias,
+        'throughput': throughput,
+        'mejor_n_jobs': mejor_n_jobs,
+        'latencia_p99_ms': latencias[mejor_n_jobs]['p99'],
+        'memoria_total_mb': memoria_modelo_mb + memoria_prediccion_mb,
+    }
+    rendimiento['cumple_latencia'] = rendimiento['latencia_p99_ms'] <= PRESUPUESTO_LATENCIA_P99_MS
+    rendimiento['cumple_memoria'] = rendimiento['memoria_total_mb'] <= PRESUPUESTO_MEMORIA_MB
+    
+    print(f"\nCarga: {carga_s:.3f} s, memoria del modelo: {memoria_modelo_mb:.1f} MB, "
+          f"pico al predecir {max(TAMANOS_LOTE):,} filas: {memoria_prediccion_mb:.1f} MB")
+    return rendimiento
+
+def cargar_particion():
+    """Manifiesto de la partición de la preparación, o None si no existe"""
+    if not os.path.exists(RUTA_PARTICION):
+        return None
+    with open(RUTA_PARTICION, encoding='utf-8') as f:
+        return json.load(f)
+
+def materializar_test_mapeado(directorio=DIRECTORIO_MAPEADO):
+    """
+    Convierte X_test/y_test a .npy (float32 contiguo y códigos int8 de clase) una
+    sola vez, escribiendo bloque a bloque. Los workers los abren con mmap_mode='r'
+    y comparten la misma copia física a través del page cache.
+    Se regeneran solo si los CSV son más nuevos que los .npy. Si la partición
+    solo recibió lotes nuevos, se copian las filas ya mapeadas y se convierten
+    únicamente las agregadas.
+    """
+    ruta_X = os.path.join(directorio, 'X_test.npy')
+    ruta_y = os.path.join(directorio, 'y_test.npy')
+    ruta_meta = os.path.join(directorio, 'metadatos.json')
+    fuentes = ['../03_preparacion_datos/X_test.csv', '../03_preparacion_datos/y_test.csv']
+    
+    existe = all(os.path.exists(r) for r in (ruta_X, ruta_y, ruta_meta))
+    if existe and os.path.getmtime(ruta_meta) >= max(os.path.getmtime(f) for f in fuentes):
+        print(f"OK Conjunto de prueba mapeado vigente en {directorio}")
+        return ruta_X, ruta_y, ruta_meta
+    
+    os.makedirs(directorio, exist_ok=True)
+    with open(fuentes[1], encoding='utf-8') as f:
+        n = sum(1 for _ in f) - 1
+    columnas = list(cargar_esquema()['features'])
+    particion = cargar_particion()
+    # Una preparación cortada a la mitad no es una partición válida a la cual agregar
+    base = particion['base'] if particion and not particion.get('en_curso') else None
+    
+    desde, clases = 0, []
+    if existe and base is not None:
+        with open(ruta_meta, encoding='utf-8') as f:
+            previo = json.load(f)
+        if previo.get('particion') == base and previo['features'] == columnas and previo['filas'] <= n:
+            desde, clases = previo['filas'], list(previo['clases'])
+    if desde:
+        print(f"Materializando {n - desde:,} filas nuevas del conjunto de prueba mapeado...")
+    else:
+        print("Materializando conjunto de prueba mapeado...")
+    
+    # Se escribe en temporales para que un corte no deje arreglos a medias
+    temporal_X, temporal_y = f"{ruta_X}.tmp", f"{ruta_y}.tmp"
+    X_map = np.lib.format.open_memmap(temporal_X, mode='w+', dtype=np.float32, shape=(n, len(columnas)))
+    y_map = np.lib.format.open_memmap(temporal_y, mode='w+', dtype=np.int8, shape=(n,))
+    if desde:
+        X_previo = np.load(ruta_X, mmap_mode='r')
+        y_previo = np.load(ruta_y, mmap_mode='r')
+        for i in range(0, desde, TAMANO_BLOQUE):
+            X_map[i:min(i + TAMANO_BLOQUE, desde)] = X_previo[i:min(i + TAMANO_BLOQUE, desde)]
+        y_map[:desde] = y_previo[:desde]
+        del X_previo, y_previo
+    fila = desde
+    for X, y in iterar_datos(desde=desde):
+        nuevas = sorted(set(y) - set(clases))
+        clases.extend(nuevas)
+        X_map[fila:fila + len(X)] = X.to_numpy()
+        y_map[fila:fila + len(y)] = pd.Categorical(y, categories=clases).codes
+        fila += len(X)
+    X_map.flush()
+    y_map.flush()
+    del X_map, y_map
+    os.replace(temporal_X, ruta_X)
+    os.replace(temporal_y, ruta_y)
+    
+    with open(ruta_meta, 'w', encoding='utf-8') as f:
+        json.dump({'filas': n, 'features': columnas, 'clases': clases, 'particion': base}, f, indent=2)
+    print(f"OK {n:,} filas mapeadas en {directorio} ({n - desde:,} convertidas)")
+    return ruta_X, ruta_y, ruta_meta
+
+def _evaluar_artefacto(ruta_modelo, ruta_X, ruta_y, ruta_meta, desde=0):
+    """
+    Worker: carga un modelo y lo evalúa con el motor de una pasada sobre
+    el conjunto de prueba mapeado en memoria (solo lectura, sin copias propias),
+    a partir de la fila desde.
+    """
+    inicio = time.perf_counter()
+    modelo = joblib.load(ruta_modelo)
+    carga_s = time.perf_counter() - inicio
+    if 'n_jobs' in modelo.get_params():
+        modelo.set_params(n_jobs=1)  # el paralelismo lo ponen los procesos
+    
+    with open(ruta_meta, encoding='utf-8') as f:
+        meta = json.load(f)
+    X = np.load(ruta_X, mmap_mode='r')
+    y = np.load(ruta_y, mmap_mode='r')
+    clases = np.array(meta['clases'], dtype=object)
+    
+    def bloques():
+        for i in range(desde, len(y), TAMANO_BLOQUE):
+            yield (pd.DataFrame(X[i:i + TAMANO_BLOQUE], columns=meta['features'], copy=False),
+                   clases[y[i:i + TAMANO_BLOQUE]])
+    
+    inicio = time.perf_counter()
+    cm = acumular_confusion(modelo, bloques())
+    evaluacion_s = time.perf_counter() - inicio
+    return {
+        'nombre': os.path.splitext(os.path.basename(ruta_modelo))[0],
+        'modelo': type(modelo).__name__,
+        'clases': [str(c) for c in modelo.classes_],
+        'confusion_matrix': cm,
+        'filas_evaluadas': len(y) - desde,
+        'carga_s': carga_s,
+        'evaluacion_s': evaluacion_s,
+        'tamano_mb': os.path.getsize(ruta_modelo) / 2**20,
+    }
+
+def huella_archivo(ruta):
+    """Huella del contenido de un archivo (identifica un modelo aunque cambie de nombre)"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(2**20), b''):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+def confusiones_incrementales(rutas, datos, n_procesos=N_PROCESOS_EVALUACION):
+    """
+    Matriz de confusión de cada modelo sobre todo el conjunto de prueba mapeado.
+    Un modelo ya evaluado sobre la misma partición solo se evalúa en las filas
+    agregadas desde entonces, y su matriz se suma a la guardada. Cada resultado
+    informa filas_evaluadas (en esta ejecución) y filas_cache (tomadas de la caché).
+    """
+    with open(datos[2], encoding='utf-8') as f:
+        meta = json.load(f)
+    cache = {}
+    if meta.get('particion') and os.path.exists(RUTA_CACHE_CONFUSION):
+        with open(RUTA_CACHE_CONFUSION, encoding='utf-8') as f:
+            guardado = json.load(f)
+        if guardado['particion'] == meta['particion']:
+            cache = guardado['modelos']
+    
+    huellas = [huella_archivo(ruta) for ruta in rutas]
+    desde = [cache[h]['filas'] if h in cache and cache[h]['filas'] <= meta['filas'] else 0 for h in huellas]
+    if len(rutas) == 1:
+        resultados = [_evaluar_artefacto(rutas[0], *datos, desde[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=max(1, min(n_procesos, len(rutas)))) as ejecutor:
+            futuros = [ejecutor.submit(_evaluar_artefacto, ruta, *datos, d) for ruta, d in zip(rutas, desde)]
+            resultados = [futuro.result() for futuro in futuros]
+    
+    for resultado, huella, d in zip(resultados, huellas, desde):
+        resultado['filas_cache'] = d
+        if d:
+            resultado['confusion_matrix'] = resultado['confusion_matrix'] + np.array(cache[huella]['confusion_matrix'])
+        cache[huella] = {'nombre': resultado['nombre'], 'filas': meta['filas'],
+                         'confusion_matrix': resultado['confusion_matrix'].tolist()}
+    
+    if meta.get('particion'):
+        with open(RUTA_CACHE_CONFUSION, 'w', encoding='utf-8') as f:
+            json.dump({'particion': meta['particion'], 'modelos': cache}, f, indent=2)
+    return resultados
+
+def evaluar_artefactos(directorio=DIRECTORIO_MODELOS, n_procesos=N_PROCESOS_EVALUACION):
+    """Descubre todos los .pkl del directorio de modelado y los evalúa en paralelo"""
+    print("\n" + "="*50)
+    print("EVALUACIÓN COMPARATIVA DE MODELOS")
+    print("="*50)
+    
+    rutas = sorted(glob.glob(os.path.join(directorio, '*.pkl')))
+    print(f"Artefactos encontrados: {[os.path.basename(r) for r in rutas]}")
+    resultados = confusiones_incrementales(rutas, materializar_test_mapeado(), n_procesos)
+    
+    for resultado in resultados:
+        resultado.update(metricas_desde_confusion(resultado['confusion_matrix'], resultado['clases']))
+        resultado['intervalos'] = intervalos_bootstrap(resultado['confusion_matrix'])
+        print(f"  {resultado['nombre']:<32} accuracy {resultado['accuracy']:.4f} "
+              f"({resultado['evaluacion_s']:.2f} s, {resultado['filas_evaluadas']:,} filas evaluadas, "
+              f"{resultado['filas_cache']:,} de caché)")
+    return sorted(resultados, key=lambda r: r['accuracy'], reverse=True)
 
-def generar_reporte_final(metricas):
+def generar_reporte_comparativo(resultados):
+    """Reporte comparativo de todos los artefactos evaluados"""
+    reporte = []
+    reporte.append("="*100)
+    reporte.append("REPORTE COMPARATIVO DE MODELOS")
+    reporte.append("="*100)
+    reporte.append(f"\nFecha: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    reporte.append(f"Filas de prueba: {resultados[0]['n']:,}" if resultados else "Sin artefactos")
+    reporte.append("Eval s y Filas eval corresponden solo a esta ejecución; Filas caché son las filas cuya "
+                   "matriz de confusión se tomó de una evaluación anterior")
+    reporte.append(f"\n{'Artefacto':<30} {'Modelo':<24} {'Accuracy':>9} {'IC ' + format(NIVEL_CONFIANZA, '.0%'):>17} "
+                   f"{'Precision':>9} {'Recall':>7} {'F1':>7} {'MB':>7} {'Carga s':>8} {'Eval s':>7} "
+                   f"{'Filas eval':>11} {'Filas caché':>12}")
+    for r in resultados:
+        inferior, superior = r['intervalos']['accuracy']
+        reporte.append(f"{r['nombre']:<30} {r['modelo']:<24} {r['accuracy']:>9.4f} "
+                       f"{f'[{inferior:.4f}-{superior:.4f}]':>17} {r['precision']:>9.4f} {r['recall']:>7.4f} "
+                       f"{r['f1']:>7.4f} {r['tamano_mb']:>7.2f} {r['carga_s']:>8.3f} {r['evaluacion_s']:>7.2f} "
+                       f"{r['filas_evaluadas']:>11,} {r['filas_cache']:>12,}")
+    
+    reporte_texto = "\n".join(reporte)
+    with open('../05_evaluacion/reporte_comparativo.txt', 'w', encoding='utf-8') as f:
+        f.write(reporte_texto)
+    
+    print("\n" + reporte_texto)
+    print("\nOK Reporte guardado en reporte_comparativo.txt")
+
+def generar_reporte_final(metricas, rendimiento):
     """Genera un reporte final de evaluación"""
     reporte = []
     reporte.append("="*70)
     reporte.append("REPORTE FINAL DE EVALUACIÓN")
     reporte.append("="*70)
     reporte.append(f"\nFecha: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    reporte.append("\nMÉTRICAS DE RENDIMIENTO:")
-    reporte.append(f"  Accuracy:  {metricas['accuracy']:.4f}")
-    reporte.append(f"  Precision: {metricas['precision']:.4f}")
-    reporte.append(f"  Recall:    {metricas['recall']:.4f}")
-    reporte.append(f"  F1-Score:  {metricas['f1']:.4f}")
+    intervalos = metricas['intervalos']
+    reporte.append(f"\nMÉTRICAS DE RENDIMIENTO (IC {NIVEL_CONFIANZA:.0%}, bootstrap de {N_BOOTSTRAP:,} remuestreos):")
+    for etiqueta, clave in [('Accuracy', 'accuracy'), ('Precision', 'precision'),
+                            ('Recall', 'recall'), ('F1-Score', 'f1')]:
+        inferior, superior = intervalos[clave]
+        reporte.append(f"  {etiqueta + ':':<10} {metricas[clave]:.4f}  [{inferior:.4f} - {superior:.4f}]")
+    
+    reporte.append("\nRENDIMIENTO DE INFERENCIA:")
+    reporte.append(f"  Carga del modelo: {rendimiento['carga_s']:.3f} s")
+    reporte.append(f"  Memoria del modelo: {rendimiento['memoria_modelo_mb']:.1f} MB")
+    reporte.append(f"  Pico al predecir {max(TAMANOS_LOTE):,} filas: {rendimiento['memoria_prediccion_mb']:.1f} MB")
+    reporte.append("\n  Latencia de una fila (ms):")
+    reporte.append(f"    {'n_jobs':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for n_jobs, lat in rendimiento['latencias'].items():
+        reporte.append(f"    {str(n_jobs):>8} {lat['p50']:>8.2f} {lat['p95']:>8.2f} {lat['p99']:>8.2f}")
+    reporte.append("\n  Throughput (filas/s):")
+    reporte.append(f"    {'lote':>8} " + ' '.join(f"{'n_jobs=' + str(n):>14}" for n in rendimiento['throughput']))
+    for tamano in TAMANOS_LOTE:
+        reporte.append(f"    {tamano:>8,} " + ' '.join(
+            f"{rendimiento['throughput'][n][tamano]:>14,.0f}" for n in rendimiento['throughput']))
     
     reporte.append("\n" + "="*70)
     reporte.append("CONCLUSIONES")
     reporte.append("="*70)
     
-    if metricas['accuracy'] >= 0.80:
-        reporte.append("OK El modelo cumple con el objetivo de precision (>80%)")
+    # El objetivo se exige al límite inferior del intervalo, no a la estimación puntual
+    limite_inferior = intervalos['accuracy'][0]
+    if limite_inferior >= OBJETIVO_ACCURACY:
+        reporte.append(f"OK El modelo cumple con el objetivo de precision (>{OBJETIVO_ACCURACY:.0%}) "
+                       f"con {NIVEL_CONFIANZA:.0%} de confianza")
+    elif metricas['accuracy'] >= OBJETIVO_ACCURACY:
+        reporte.append(f"⚠ La accuracy puntual supera el {OBJETIVO_ACCURACY:.0%}, pero el límite inferior "
+                       f"del intervalo ({limite_inferior:.4f}) no")
     else:
-        reporte.append("⚠ El modelo no alcanza el objetivo de precisión (>80%)")
+        reporte.append(f"⚠ El modelo no alcanza el objetivo de precisión (>{OBJETIVO_ACCURACY:.0%})")
+    
+    if rendimiento['cumple_latencia']:
+        reporte.append(f"OK Latencia p99 de una fila {rendimiento['latencia_p99_ms']:.2f} ms "
+                       f"(n_jobs={rendimiento['mejor_n_jobs']}) <= {PRESUPUESTO_LATENCIA_P99_MS} ms")
+    else:
+        reporte.append(f"⚠ Latencia p99 de una fila {rendimiento['latencia_p99_ms']:.2f} ms "
+                       f"excede el presupuesto de {PRESUPUESTO_LATENCIA_P99_MS} ms")
+    if rendimiento['cumple_memoria']:
+        reporte.append(f"OK Memoria {rendimiento['memoria_total_mb']:.1f} MB <= {PRESUPUESTO_MEMORIA_MB} MB")
+    else:
+        reporte.append(f"⚠ Memoria {rendimiento['memoria_total_mb']:.1f} MB "
+                       f"excede el presupuesto de {PRESUPUESTO_MEMORIA_MB} MB")
     
     reporte.append("\nEl modelo está listo para el despliegue si:")
-    reporte.append("  1. Accuracy >= 0.80")
+    reporte.append(f"  1. Límite inferior del IC {NIVEL_CONFIANZA:.0%} de la accuracy >= {OBJETIVO_ACCURACY:.2f}")
     reporte.append("  2. Las métricas por clase son balanceadas")
     reporte.append("  3. La matriz de confusión muestra buen rendimiento")
+    reporte.append(f"  4. Latencia p99 de una fila <= {PRESUPUESTO_LATENCIA_P99_MS} ms")
+    reporte.append(f"  5. Memoria (modelo + predicción) <= {PRESUPUESTO_MEMORIA_MB} MB")
     
     reporte_texto = "\n".join(reporte)
     
@@ -185,21 +697,32 @@ def main():
     print("Fase 5 de CRISP-DM: Evaluación")
     print("="*70)
     
-    # Cargar modelo y datos
+    # Cargar modelo
     modelo = cargar_modelo()
-    X_test, y_test = cargar_datos()
     
-    # Evaluar métricas
-    metricas = evaluar_metricas(modelo, X_test, y_test)
+    # Evaluar métricas en una sola pasada (solo por las filas nuevas si ya se había evaluado)
+    cm = confusiones_incrementales([RUTA_MODELO], materializar_test_mapeado())[0]['confusion_matrix']
+    metricas = evaluar_metricas(modelo, cm)
     
     # Visualizar resultados
-    visualizar_resultados(y_test, metricas['y_pred'], metricas['confusion_matrix'])
+    visualizar_resultados(metricas['confusion_matrix'], metricas['clases'])
     
     # Analizar errores
-    errores = analizar_errores(modelo, X_test, y_test, metricas['y_pred'])
+    errores = analizar_errores(metricas)
+    
+    # Medir rendimiento de inferencia del modelo serializado
+    X_muestra, _ = next(iterar_datos(max(TAMANOS_LOTE)))
+    rendimiento = medir_inferencia(RUTA_MODELO, X_muestra)
     
     # Generar reporte final
-    generar_reporte_final(metricas)
+    generar_reporte_final(metricas, rendimiento)
+    
+    # Comparar todos los artefactos de la fase de modelado
+    generar_reporte_comparativo(evaluar_artefactos())
+    
+    # La fase falla si el modelo no cumple los presupuestos de servicio
+    if not (rendimiento['cumple_latencia'] and rendimiento['cumple_memoria']):
+        raise SystemExit("ERROR El modelo excede el presupuesto de latencia o memoria")
     
     print("\n" + "="*70)
     print("EVALUACIÓN COMPLETADA")
@@ -0,0 +1,160 @@
+"""
+Control de Admisión
+Limita el trabajo en curso de cada endpoint por cantidad de solicitudes y por
+filas totales (estudiantes de los lotes). Una solicitud que no cabe espera un
+momento en una cola corta; si no se libera espacio a tiempo, o la cola ya está
+llena, se rechaza con 503 y Retry-After. Así, ante un peak, el servicio
+rechaza lo que sobra en lugar de degradar la latencia de todos.
+
+Los límites por endpoint se pueden reemplazar con la variable de entorno
+ADMISION_LIMITES (JSON con la misma forma que LIMITES_ADMISION).
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+from flask import jsonify
+
+LIMITES_ADMISION = {
+    '/predict': {
+        'max_en_curso': 32,        # solicitudes procesándose a la vez
+        'max_filas': 32,           # filas procesándose a la vez
+        'max_en_cola': 64,         # solicitudes esperando turno
+        'max_espera_s': 0.5,       # espera máxima en la cola
+        'retry_after_s': 1,
+    },
+    '/predict/local': {
+        'max_en_curso': 16,
+        'max_filas': 16,
+        'max_en_cola': 32,
+        'max_espera_s': 0.5,
+        'retry_after_s': 1,
+    },
+    '/predict/batch': {
+        'max_en_curso': 4,
+        'max_filas': 20_000,
+        'max_en_cola': 8,
+        'max_espera_s': 2.0,
+        'retry_after_s': 5,
+    },
+    '/explain': {
+        'max_en_curso': 16,
+        'max_filas': 16,
+        'max_en_cola': 32,
+        'max_espera_s': 0.5,
+        'retry_after_s': 1,
+    },
+    '/explain/batch': {
+        'max_en_curso': 2,
+        'max_filas': 20_000,
+        'max_en_cola': 4,
+        'max_espera_s': 2.0,
+        'retry_after_s': 5,
+    },
+}
+LIMITES_ADMISION.update(json.loads(os.environ.get('ADMISION_LIMITES', '{}')))
+
+
+class Limitador:
+    """Cupos de un endpoint: solicitudes y filas en curso, con cola de espera acotada"""
+
+    def __init__(self, max_en_curso, max_filas, max_en_cola, max_espera_s, retry_after_s):
+        self.max_en_curso = max_en_curso
+        self.max_filas = max_filas
+        self.max_en_cola = max_en_cola
+        self.max_espera_s = max_espera_s
+        self.retry_after_s = retry_after_s
+        self._condicion = threading.Condition()
+        self.en_curso = 0
+        self.filas_en_curso = 0
+        self.en_cola = 0
+        self.admitidas = 0
+        self.rechazadas_cola_llena = 0
+        self.rechazadas_espera = 0
+
+    def _cabe(self, filas):
+        # Un lote mayor que max_filas se admite solo si no hay nada más en curso
+        return self.en_curso < self.max_en_curso and (
+            self.filas_en_curso + filas <= self.max_filas or self.en_curso == 0)
+
+    def entrar(self, filas=1):
+        """True si la solicitud fue admitida; False si se debe rechazar"""
+        with self._condicion:
+            if not self._cabe(filas):
+                if self.en_cola >= self.max_en_cola:
+                    self.rechazadas_cola_llena += 1
+                    return False
+                self.en_cola += 1
+                limite = time.monotonic() + self.max_espera_s
+                try:
+                    while not self._cabe(filas):
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            self.rechazadas_espera += 1
+                            return False
+                        self._condicion.wait(restante)
+                finally:
+                    self.en_cola -= 1
+            self.en_curso += 1
+            self.filas_en_curso += filas
+            self.admitidas += 1
+            return True
+
+    def salir(self, filas=1):
+        with self._condicion:
+            self.en_curso -= 1
+            self.filas_en_curso -= filas
+            self._condicion.notify_all()
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                'en_curso': self.en_curso,
+                'filas_en_curso': self.filas_en_curso,
+                'en_cola': self.en_cola,
+                'admitidas': self.admitidas,
+                'rechazadas': self.rechazadas_cola_llena + self.rechazadas_espera,
+                'rechazadas_cola_llena': self.rechazadas_cola_llena,
+                'rechazadas_espera': self.rechazadas_espera,
+                'limites': {'max_en_curso': self.max_en_curso, 'max_filas': self.max_filas,
+                            'max_en_cola': self.max_en_cola, 'max_espera_s': self.max_espera_s},
+            }
+
+
+class ControlAdmision:
+    """Un Limitador por endpoint y el decorador que lo aplica a las vistas de Flask"""
+
+    def __init__(self, limites=LIMITES_ADMISION):
+        self.limitadores = {endpoint: Limitador(**config) for endpoint, config in limites.items()}
+
+    def limitar(self, endpoint, contar_filas=None):
+        """
+        Envuelve una vista: la admite o responde 503 con Retry-After.
+        contar_filas() retorna las filas de la solicitud (1 si no se indica).
+        """
+        limitador = self.limitadores[endpoint]
+
+        def decorador(vista):
+            @functools.wraps(vista)
+            def envoltura(*args, **kwargs):
+                filas = max(1, contar_filas()) if contar_filas else 1
+                if not limitador.entrar(filas):
+                    respuesta = jsonify({
+                        'error': 'Servicio saturado, intenta nuevamente más tarde',
+                        'retry_after_s': limitador.retry_after_s
+                    })
+                    respuesta.headers['Retry-After'] = str(math.ceil(limitador.retry_after_s))
+                    return respuesta, 503
+                try:
+                    return vista(*args, **kwargs)
+                finally:
+                    limitador.salir(filas)
+            return envoltura
+        return decorador
+
+    def estadisticas(self):
+        return {endpoint: limitador.estadisticas() for endpoint, limitador in self.limitadores.items()}
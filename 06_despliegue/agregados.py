@@ -0,0 +1,187 @@
+"""
+Agregados por Colegio y Curso
+Conteo de estudiantes por clase de riesgo y probabilidad media de cada clase,
+por grupo (colegio, curso), actualizados a medida que se predice. Cada
+estudiante aporta solo su última predicción: al volver a predecirlo se resta
+su aporte anterior y se suma el nuevo, así que reenviar un curso no lo cuenta
+dos veces. Consultar un grupo es O(1) y un colegio, O(cursos), sin volver a
+puntuar a nadie.
+
+Como el estado por estudiante, vive en memoria y se respalda en disco (JSON,
+escritura atómica) cada INTERVALO_SNAPSHOT segundos si hubo cambios, y al
+cerrar la API. El snapshot guarda el aporte de cada estudiante y los grupos se
+reconstruyen al cargarlo.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_SNAPSHOT = os.path.join(BASE_DIR, '06_despliegue', 'estado', 'agregados.json')
+INTERVALO_SNAPSHOT = 30.0  # segundos
+DECIMALES_PROBABILIDAD = 4
+
+
+def grupo_estudiante(estudiante):
+    """
+    (colegio, curso) del estudiante como textos, o None si no trae colegio.
+    El curso es opcional. Lanza ValueError si alguno no es un texto o un entero.
+    """
+    colegio = estudiante.get('colegio')
+    curso = estudiante.get('curso')
+    for campo, valor in (('colegio', colegio), ('curso', curso)):
+        if valor is not None and (isinstance(valor, bool) or not isinstance(valor, (str, int))):
+            raise ValueError(f'"{campo}" debe ser un texto o un entero')
+    if colegio is None:
+        return None
+    return str(colegio), None if curso is None else str(curso)
+
+
+class Grupo:
+    """Conteos por clase y suma de probabilidades de los estudiantes de un grupo"""
+
+    __slots__ = ('total', 'conteos', 'sumas')
+
+    def __init__(self):
+        self.total = 0
+        self.conteos = {}
+        self.sumas = {}
+
+    def sumar(self, riesgo, probabilidades, signo=1):
+        self.total += signo
+        self.conteos[riesgo] = self.conteos.get(riesgo, 0) + signo
+        for clase, p in probabilidades.items():
+            self.sumas[clase] = self.sumas.get(clase, 0.0) + signo * p
+
+    def resumen(self):
+        return {
+            'total': self.total,
+            'conteos': {clase: self.conteos.get(clase, 0) for clase in self.sumas},
+            'probabilidad_media': {clase: round(suma / self.total, DECIMALES_PROBABILIDAD)
+                                   for clase, suma in self.sumas.items()},
+        }
+
+
+class AgregadosGrupos:
+    """Agregados por (colegio, curso), seguros entre hilos, con respaldo periódico en disco"""
+
+    def __init__(self, ruta=RUTA_SNAPSHOT, intervalo=INTERVALO_SNAPSHOT):
+        self.ruta = ruta
+        self._grupos = {}       # (colegio, curso) -> Grupo
+        self._cursos = {}       # colegio -> cursos con estudiantes
+        self._aportes = {}      # id -> (grupo, riesgo, probabilidades)
+        self._lock = threading.Lock()
+        self._cambios = False
+        self.cargar()
+        self._detener = threading.Event()
+        self._respaldo = threading.Thread(target=self._respaldar, args=(intervalo,),
+                                          name='snapshot_agregados', daemon=True)
+        self._respaldo.start()
+        atexit.register(self.cerrar)
+
+    def cargar(self):
+        if os.path.exists(self.ruta):
+            with open(self.ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+            with self._lock:
+                for id_, (colegio, curso, riesgo, probabilidades) in datos['estudiantes'].items():
+                    self._sumar(id_, (colegio, curso), riesgo, probabilidades)
+        return len(self._aportes)
+
+    def guardar(self):
+        """Escribe el snapshot si hubo cambios desde el último"""
+        with self._lock:
+            if not self._cambios:
+                return False
+            # Solo se copian las referencias: los aportes son tuplas que no se
+            # modifican, así que el snapshot se arma sin bloquear las predicciones
+            aportes = list(self._aportes.items())
+            self._cambios = False
+        contenido = {'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+                     'estudiantes': {id_: [*grupo, riesgo, probabilidades]
+                                     for id_, (grupo, riesgo, probabilidades) in aportes}}
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(contenido, f, separators=(',', ':'))
+        os.replace(temporal, self.ruta)
+        return True
+
+    def _respaldar(self, intervalo):
+        while not self._detener.wait(intervalo):
+            self.guardar()
+
+    def cerrar(self):
+        self._detener.set()
+        self.guardar()
+
+    def _sumar(self, id_, grupo, riesgo, probabilidades):
+        if grupo not in self._grupos:
+            self._grupos[grupo] = Grupo()
+            self._cursos.setdefault(grupo[0], set()).add(grupo[1])
+        self._grupos[grupo].sumar(riesgo, probabilidades)
+        self._aportes[id_] = (grupo, riesgo, probabilidades)
+
+    def _restar(self, id_):
+        grupo, riesgo, probabilidades = self._aportes.pop(id_)
+        agregado = self._grupos[grupo]
+        agregado.sumar(riesgo, probabilidades, signo=-1)
+        if agregado.total == 0:
+            del self._grupos[grupo]
+            self._cursos[grupo[0]].discard(grupo[1])
+            if not self._cursos[grupo[0]]:
+                del self._cursos[grupo[0]]
+        return grupo
+
+    def registrar_lote(self, ids, grupos, riesgos, probabilidades):
+        """
+        Reemplaza el aporte de cada estudiante por su predicción nueva.
+        probabilidades es una lista de dicts {clase: p}. Un grupo None conserva
+        el grupo anterior del estudiante; si no tenía, no se agrega.
+        """
+        with self._lock:
+            for id_, grupo, riesgo, prob_dict in zip(ids, grupos, riesgos, probabilidades):
+                if id_ is None:
+                    continue
+                id_ = str(id_)
+                if id_ in self._aportes:
+                    anterior = self._restar(id_)
+                    grupo = grupo or anterior
+                if grupo is not None:
+                    self._sumar(id_, grupo, riesgo, prob_dict)
+                    self._cambios = True
+
+    def consultar(self, colegio, curso=None):
+        """Resumen de un curso o, sin curso, de todos los cursos del colegio con su total; None si no hay datos"""
+        with self._lock:
+            if curso is not None:
+                agregado = self._grupos.get((colegio, curso))
+                return None if agregado is None else {'colegio': colegio, 'curso': curso, **agregado.resumen()}
+            cursos = self._cursos.get(colegio)
+            if not cursos:
+                return None
+            colegio_total = Grupo()
+            resultados = []
+            for nombre in sorted(cursos, key=lambda c: (c is None, c)):
+                agregado = self._grupos[(colegio, nombre)]
+                colegio_total.total += agregado.total
+                for clase, n in agregado.conteos.items():
+                    colegio_total.conteos[clase] = colegio_total.conteos.get(clase, 0) + n
+                for clase, suma in agregado.sumas.items():
+                    colegio_total.sumas[clase] = colegio_total.sumas.get(clase, 0.0) + suma
+                resultados.append({'curso': nombre, **agregado.resumen()})
+            return {'colegio': colegio, **colegio_total.resumen(), 'cursos': resultados}
+
+    def listar(self):
+        """Resumen de todos los grupos"""
+        with self._lock:
+            return [{'colegio': colegio, 'curso': curso, **agregado.resumen()}
+                    for (colegio, curso), agregado in sorted(self._grupos.items(),
+                                                             key=lambda g: (g[0][0], g[0][1] is None, g[0][1] or ''))]
+
+    def estadisticas(self):
+        with self._lock:
+            return {'grupos': len(self._grupos), 'colegios': len(self._cursos), 'estudiantes': len(self._aportes)}
@@ -3,27 +3,70 @@ API de Despliegue
 Fase 6 de CRISP-DM: Despliegue
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, send_file, Response
 from flask_cors import CORS
-import joblib
 import numpy as np
 import pandas as pd
+import json
+import logging
 import os
 
+import features_modelo
+from features_modelo import calcular_features, cargar_esquema
+from modelo_mapeado import ModeloMapeado, cargar_modelo, exportar_modelo_web, huella_modelo_web, RUTA_MODELO_WEB
+from monitor_deriva import MonitorDeriva, RUTA_PERFIL_REFERENCIA
+from auditoria import AuditoriaPredicciones
+from admision import ControlAdmision
+from estado_estudiantes import AlmacenEstudiantes
+from trabajos import GestorTrabajos, POR_PAGINA_DEFECTO, POR_PAGINA_MAXIMO
+from explicaciones import Explicador
+from serializacion import PlantillaLote, argumentos_json, serializar_lote, comprimir, MINIMO_GZIP
+from arranque import Arranque
+from agregados import AgregadosGrupos, grupo_estudiante
+
+logger = logging.getLogger('api')
+if __name__ == '__main__':
+    # Ejecutada directamente; bajo un servidor WSGI el registro lo configura el servidor
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+# Línea de tiempo del arranque: el modelo se carga y calienta en segundo plano
+# (ver preparar_modelo); hasta entonces /ready responde 503
+arranque = Arranque()
+arranque.marcar('importaciones')
+
 app = Flask(__name__)
 CORS(app)  # Permitir CORS para todas las rutas
 
-# Cargar modelo al iniciar
-print("Cargando modelo...")
+# Esquema de features (orden y dtypes) exportado por la fase de preparación
+ESQUEMA = None
+
+# Se publican al terminar el calentamiento; mientras tanto los endpoints del modelo responden 503
+modelo = None
+explicador = None
+HUELLA_MODELO_WEB = None
+
+# Entradas del calentamiento: de 1 a 3 notas, para recorrer todos los caminos de las features
+NOTAS_CALENTAMIENTO = [[4.0], [2.0, 7.0], [5.5, 3.0, 6.1], [6.5, 6.8, 7.0]]
+
+# Monitor de deriva contra el perfil de entrenamiento (lo exporta preparacion.py)
 try:
-    # Obtener el directorio base del proyecto
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    modelo_path = os.path.join(base_dir, '04_modelado', 'modelo_riesgo_repitencia.pkl')
-    modelo = joblib.load(modelo_path)
-    print("OK Modelo cargado exitosamente")
-except Exception as e:
-    print(f"Error cargando modelo: {e}")
-    modelo = None
+    monitor = MonitorDeriva.desde_archivo(RUTA_PERFIL_REFERENCIA)
+    logger.info("OK Monitor de deriva activo")
+except FileNotFoundError:
+    logger.warning("⚠ Sin perfil de referencia; ejecuta 03_preparacion_datos/preparacion.py para activar /drift")
+    monitor = None
+
+# Control de admisión: cupos por endpoint y rechazo con 503 ante saturación
+admision = ControlAdmision()
+
+# Estado incremental por estudiante (en memoria, con respaldo en disco)
+estudiantes_estado = AlmacenEstudiantes()
+
+# Conteos y probabilidades medias por (colegio, curso), con la última predicción de cada estudiante
+agregados = AgregadosGrupos()
+
+# Auditoría de cada predicción: cola en memoria + escritor en segundo plano
+auditoria = AuditoriaPredicciones()
 
 def clasificar_riesgo(promedio):
     """Clasifica el riesgo basado en el promedio"""
@@ -34,75 +77,255 @@ def clasificar_riesgo(promedio):
     else:
         return 'bajo'
 
-def calcular_features(notas):
+def validar_notas(notas, max_notas=3, permitir_nulos=False):
     """
-    Calcula las features necesarias para el modelo
-    a partir de las notas ingresadas
+    Retorna el mensaje de error de una lista de notas, o None si es válida.
+    Con permitir_nulos, una nota null cuenta como ausente (como en calcular_features).
     """
-    # Asegurar que tenemos máximo 3 notas
-    notas = notas[:3]
+    if not isinstance(notas, list):
+        return 'El campo "notas" debe ser una lista'
+    if max_notas is not None and len(notas) > max_notas:
+        return 'Se pueden ingresar máximo 3 notas'
+    for nota in notas:
+        if nota is None and permitir_nulos:
+            continue
+        if not isinstance(nota, (int, float)) or isinstance(nota, bool):
+            return f'La nota {nota} no es un número válido'
+        if nota < 1.0 or nota > 7.0:
+            return f'La nota {nota} está fuera del rango válido (1.0 - 7.0)'
+    return None
+
+def calcular_features_lote(lista_notas):
+    """calcular_features_lote con el esquema cargado al arrancar; retorna (X, promedios)"""
+    return features_modelo.calcular_features_lote(lista_notas, ESQUEMA)
+
+def grupos_lote(estudiantes):
+    """(colegio, curso) de cada estudiante, o None; ValueError indicando el estudiante inválido"""
+    grupos = []
+    for i, estudiante in enumerate(estudiantes):
+        try:
+            grupos.append(grupo_estudiante(estudiante) if isinstance(estudiante, dict) else None)
+        except ValueError as e:
+            raise ValueError(f'Estudiante {i}: {e}') from None
+    return grupos
+
+def registrar_agregados(ids, grupos, riesgos, probabilidades, clases):
+    """
+    Actualiza los agregados con los estudiantes del lote que traen id. Sin
+    colegio (grupo None) se conserva el grupo anterior del estudiante, así su
+    aporte pasa a ser la predicción nueva.
+    """
+    con_id = [i for i, estudiante_id in enumerate(ids) if estudiante_id is not None]
+    if con_id:
+        agregados.registrar_lote([ids[i] for i in con_id], [grupos[i] for i in con_id],
+                                 [riesgos[i] for i in con_id],
+                                 [dict(zip(clases, fila)) for fila in probabilidades[con_id].tolist()])
+
+def puntuar_estudiantes(estudiantes, endpoint='/jobs'):
+    """Predice un bloque de estudiantes con una sola llamada al modelo"""
+    X, promedios = calcular_features_lote([e.get('notas', []) for e in estudiantes])
+    probabilidades = modelo.predict_proba(X)
+    clases = [str(c) for c in modelo.classes_]
+    predicciones = np.asarray(clases, dtype=object)[probabilidades.argmax(axis=1)]
     
-    # Rellenar con NaN si hay menos de 3 notas
-    while len(notas) < 3:
-        notas.append(np.nan)
+    if monitor is not None:
+        monitor.registrar_lote(X, predicciones)
+    auditoria.registrar_lote(endpoint, [e.get('id') for e in estudiantes], [e.get('notas', []) for e in estudiantes],
+                             predicciones, probabilidades, clases)
+    registrar_agregados([e.get('id') for e in estudiantes], grupos_lote(estudiantes), predicciones,
+                        probabilidades, clases)
     
-    nota_1, nota_2, nota_3 = notas[0], notas[1], notas[2]
+    resultados = []
+    for i, estudiante in enumerate(estudiantes):
+        prob_dict = dict(zip(clases, probabilidades[i].tolist()))
+        resultados.append({
+            'id': estudiante.get('id'),
+            'promedio': round(float(promedios[i]), 2),
+            'riesgo': predicciones[i],
+            'probabilidades': prob_dict
+        })
+    return resultados
+
+# Trabajos asíncronos; los que quedaron a medias se reanudan al terminar el arranque
+gestor_trabajos = GestorTrabajos(puntuar_estudiantes)
+
+def predecir_features(filas_features):
+    """Predice varias filas de features en una sola llamada; retorna (riesgos, probabilidades)"""
+    X = matriz_modelo(filas_features)
+    probabilidades = modelo.predict_proba(X)
+    clases = [str(c) for c in modelo.classes_]
+    riesgos = [clases[i] for i in probabilidades.argmax(axis=1)]
+    prob_dicts = [dict(zip(clases, fila.tolist())) for fila in probabilidades]
+    if monitor is not None:
+        monitor.registrar_lote(X, riesgos)
+    return riesgos, prob_dicts
+
+def respuesta_estado(estudiante_id, estado, features, recalculado):
+    """Respuesta de los endpoints con estado, con la forma de /predict"""
+    return {
+        'id': estudiante_id,
+        'promedio': round(features['_promedio_calculado'], 2),
+        'riesgo': estado.riesgo,
+        'probabilidades': estado.probabilidades,
+        'cantidad_notas': estado.cantidad,
+        'tendencia': 'mejora' if features['tendencia'] > 0 else 'empeora' if features['tendencia'] < 0 else 'estable',
+        'recalculado': recalculado
+    }
+
+def filas_lote():
+    """Cantidad de estudiantes de la solicitud de lote (para el control de admisión)"""
+    data = request.get_json(silent=True) or {}
+    estudiantes = data.get('estudiantes') if isinstance(data, dict) else None
+    return len(estudiantes) if isinstance(estudiantes, list) else 1
+
+def redondear_promedios(promedios):
+    """round(promedio, 2) de Python (no np.round), una vez por valor distinto"""
+    distintos, inversa = np.unique(promedios, return_inverse=True)
+    return np.asarray([round(v, 2) for v in distintos.tolist()])[inversa]
+
+_plantillas_lote = {}
+
+def respuesta_lote(ids, promedios, probabilidades, clases):
+    """
+    Respuesta {'resultados': [...], 'total': n} de /predict/batch armada desde
+    los arreglos, idéntica a la de jsonify. Se comprime con gzip si el cliente
+    lo acepta y supera MINIMO_GZIP.
+    """
+    argumentos = argumentos_json(app)
+    clave = (tuple(clases), json.dumps(argumentos))
+    if clave not in _plantillas_lote:
+        _plantillas_lote[clave] = PlantillaLote(lambda obj: app.json.dumps(obj, **argumentos), clases)
+    texto = serializar_lote(_plantillas_lote[clave], ids, promedios, probabilidades)
     
-    # Calcular promedio
-    notas_validas = [n for n in notas if not pd.isna(n)]
-    promedio_calculado = np.mean(notas_validas) if notas_validas else 0
+    if texto is None:
+        # Algún id no es escalar (p. ej. un objeto): camino general
+        riesgos = np.asarray(clases, dtype=object)[probabilidades.argmax(axis=1)]
+        resultados = [{
+            'id': estudiante_id,
+            'promedio': promedio,
+            'riesgo': riesgo,
+            'probabilidades': dict(zip(clases, fila))
+        } for estudiante_id, promedio, riesgo, fila in zip(ids, promedios.tolist(), riesgos, probabilidades.tolist())]
+        texto = app.json.dumps({'resultados': resultados, 'total': len(resultados)}, **argumentos) + '\n'
     
-    # Cantidad de notas
-    cantidad_notas = len(notas_validas)
+    respuesta = Response(texto, mimetype=app.json.mimetype)
+    respuesta.vary.add('Accept-Encoding')
+    if 'gzip' in request.accept_encodings and len(texto) >= MINIMO_GZIP:
+        respuesta.set_data(comprimir(texto))
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    return respuesta
+
+def matriz_modelo(filas_features):
+    """
+    Construye la entrada del modelo según el esquema declarado: valida que cada
+    fila traiga exactamente las features del esquema, las convierte a sus dtypes
+    compactos y entrega una matriz float32 contigua con los nombres de columna.
+    """
+    columnas = list(ESQUEMA)
+    for features in filas_features:
+        recibidas = [k for k in features if not k.startswith('_')]
+        if sorted(recibidas) != sorted(columnas):
+            raise ValueError(f"Features {recibidas} no coinciden con el esquema {columnas}")
     
-    # Tendencia
-    if len(notas_validas) >= 2:
-        if notas_validas[-1] > notas_validas[0]:
-            tendencia = 1  # Mejora
-        elif notas_validas[-1] < notas_validas[0]:
-            tendencia = -1  # Empeora
-        else:
-            tendencia = 0  # Estable
-    else:
-        tendencia = 0
+    X = pd.DataFrame(filas_features, columns=columnas).astype(ESQUEMA)
+    return pd.DataFrame(np.ascontiguousarray(X.to_numpy(dtype=np.float32)), columns=columnas)
+
+def calentar(modelo_nuevo, explicador_nuevo):
+    """
+    Inferencias reales por los mismos caminos que las solicitudes (features,
+    predicción individual y en lote, serialización y explicaciones), sin pasar
+    por el monitor ni la auditoría: deja listos los cachés y los hilos antes
+    del primer cliente.
+    """
+    X, promedios = calcular_features_lote([list(notas) for notas in NOTAS_CALENTAMIENTO])
+    probabilidades = modelo_nuevo.predict_proba(X)
+    clases = [str(c) for c in modelo_nuevo.classes_]
+    for notas in NOTAS_CALENTAMIENTO:
+        X_uno = matriz_modelo([calcular_features(list(notas))])
+        modelo_nuevo.predict(X_uno)
+        modelo_nuevo.predict_proba(X_uno)
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        respuesta_lote(list(range(len(NOTAS_CALENTAMIENTO))), redondear_promedios(promedios), probabilidades, clases)
+    if explicador_nuevo is not None:
+        explicador_nuevo.explicar(NOTAS_CALENTAMIENTO)
+
+def preparar_modelo():
+    """Carga el modelo, lo calienta y recién entonces lo publica a los endpoints"""
+    global ESQUEMA, modelo, explicador, HUELLA_MODELO_WEB
+    with arranque.etapa('carga_modelo'):
+        ESQUEMA = cargar_esquema()
+        # Formato mapeado en memoria si existe; si no, el pickle (importa sklearn)
+        modelo_nuevo = cargar_modelo()
     
-    # Variabilidad
-    if len(notas_validas) >= 2:
-        variabilidad = np.std(notas_validas)
-    else:
-        variabilidad = 0
-    
-    # Nota mínima y máxima
-    nota_min = min(notas_validas) if notas_validas else 0
-    nota_max = max(notas_validas) if notas_validas else 0
-    
-    # Rellenar NaN con 0 para el modelo
-    nota_1 = nota_1 if not pd.isna(nota_1) else 0
-    nota_2 = nota_2 if not pd.isna(nota_2) else 0
-    nota_3 = nota_3 if not pd.isna(nota_3) else 0
-    
-    # Features para el modelo (SIN promedio_calculado ni distancia_umbral para evitar data leakage)
-    features = {
-        'nota_1': nota_1,
-        'nota_2': nota_2,
-        'nota_3': nota_3,
-        'cantidad_notas': cantidad_notas,
-        'tendencia': tendencia,
-        'variabilidad': variabilidad,
-        'nota_min': nota_min,
-        'nota_max': nota_max
-    }
+    # Activo estático para predecir en el navegador: se regenera si no
+    # corresponde al modelo mapeado cargado (p. ej. tras reentrenar)
+    huella = None
+    if isinstance(modelo_nuevo, ModeloMapeado):
+        with arranque.etapa('modelo_web'):
+            try:
+                if huella_modelo_web() != modelo_nuevo.huella:
+                    exportar_modelo_web()
+                huella = modelo_nuevo.huella
+            except OSError as e:
+                logger.warning(f"⚠ No se pudo exportar el modelo web: {e}")
     
-    # Guardar promedio_calculado para mostrarlo en la respuesta (pero no como feature)
-    features['_promedio_calculado'] = promedio_calculado  # Prefijo _ para indicar que no es feature del modelo
+    with arranque.etapa('calentamiento'):
+        # Explicaciones por feature (requieren los árboles del modelo mapeado)
+        explicador_nuevo = Explicador(modelo_nuevo, calcular_features_lote) if isinstance(modelo_nuevo, ModeloMapeado) else None
+        calentar(modelo_nuevo, explicador_nuevo)
+    modelo, explicador, HUELLA_MODELO_WEB = modelo_nuevo, explicador_nuevo, huella
     
-    return features
+    with arranque.etapa('reanudar_trabajos'):
+        reanudados = gestor_trabajos.reanudar()
+        if reanudados:
+            logger.info(f"OK Trabajos reanudados: {len(reanudados)}")
+
+def modelo_no_disponible():
+    """503 con Retry-After mientras el modelo se carga; 500 si la carga falló"""
+    if not arranque.terminado():
+        respuesta = jsonify({
+            'error': 'Modelo cargándose; reintente en unos segundos',
+            'etapa': arranque.etapa_actual
+        })
+        respuesta.headers['Retry-After'] = '1'
+        return respuesta, 503
+    return jsonify({
+        'error': 'Modelo no disponible'
+    }), 500
 
 @app.route('/')
 def home():
     """Sirve el formulario HTML"""
     return send_from_directory(os.path.dirname(os.path.abspath(__file__)), 'index.html')
 
+@app.route('/prediccion_local.js')
+def prediccion_local_js():
+    """Predictor del navegador que usa el formulario"""
+    return send_from_directory(os.path.dirname(os.path.abspath(__file__)), 'prediccion_local.js')
+
+@app.route('/modelo/version')
+def modelo_version():
+    """
+    Huella del modelo desplegado. La página compara esta huella con la del
+    modelo guardado en su caché antes de predecir localmente.
+    """
+    return jsonify({
+        'huella': HUELLA_MODELO_WEB,
+        'disponible': HUELLA_MODELO_WEB is not None,
+        'url': '/modelo/web'
+    })
+
+@app.route('/modelo/web')
+def modelo_web():
+    """Árboles del modelo como JSON compacto (con ETag, para revalidar sin descargarlo de nuevo)"""
+    if HUELLA_MODELO_WEB is None or not os.path.exists(RUTA_MODELO_WEB):
+        return jsonify({
+            'error': 'Modelo web no disponible (requiere el modelo mapeado)'
+        }), 404
+    respuesta = send_file(RUTA_MODELO_WEB, mimetype='application/json', etag=True)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
 @app.route('/api')
 def api_info():
     """Endpoint de información de la API"""
@@ -113,19 +336,94 @@ def api_info():
             '/': 'Formulario web',
             '/api': 'Información de la API',
             '/predict': 'POST - Predicción de riesgo',
-            '/health': 'GET - Estado del servicio'
+            '/predict/batch': 'POST - Predicción en lote',
+            '/predict/local': 'POST - Registra una predicción hecha en el navegador (auditoría y deriva)',
+            '/modelo/version': 'GET - Huella del modelo para el caché del navegador',
+            '/modelo/web': 'GET - Modelo como JSON para predecir en el navegador',
+            '/jobs': 'POST - Trabajo asíncrono para lotes muy grandes',
+            '/jobs/<id>': 'GET - Progreso y resultados paginados de un trabajo',
+            '/estudiantes/<id>': 'GET - Estado y última predicción de un estudiante',
+            '/estudiantes/<id>/notas': 'POST - Agrega una nota y recalcula el riesgo',
+            '/estudiantes/batch': 'POST - Sincroniza notas de muchos estudiantes (solo recalcula los que cambiaron)',
+            '/explain': 'POST - Contribución de cada feature a la predicción',
+            '/explain/batch': 'POST - Explicaciones en lote',
+            '/agregados': 'GET - Estudiantes por riesgo y probabilidad media por colegio y curso',
+            '/drift': 'GET - Deriva de las entradas respecto del entrenamiento',
+            '/health': 'GET - Estado del servicio (vivo, aunque el modelo aún se esté cargando)',
+            '/ready': 'GET - 200 solo cuando el modelo está cargado y calentado'
         }
     })
 
 @app.route('/health')
 def health():
-    """Endpoint de salud del servicio"""
+    """Endpoint de salud del servicio (liveness: el proceso responde)"""
     return jsonify({
         'status': 'healthy',
-        'modelo_cargado': modelo is not None
+        'modelo_cargado': modelo is not None,
+        'listo': arranque.listo,
+        'auditoria': auditoria.estadisticas(),
+        'admision': admision.estadisticas(),
+        'agregados': agregados.estadisticas(),
+        'explicaciones': explicador.cache.estadisticas() if explicador else None
     })
 
+@app.route('/ready')
+def ready():
+    """
+    Readiness: 200 solo después de cargar y calentar el modelo; antes, 503
+    con la etapa en curso. Incluye la línea de tiempo del arranque.
+    """
+    estado = arranque.estado()
+    if not estado['listo']:
+        respuesta = jsonify(estado)
+        if not arranque.terminado():
+            respuesta.headers['Retry-After'] = '1'
+        return respuesta, 503
+    return jsonify(estado)
+
+@app.route('/agregados')
+def consultar_agregados():
+    """
+    Estudiantes por clase de riesgo y probabilidad media de cada clase, por
+    colegio y curso, según la última predicción de cada estudiante (sin volver
+    a puntuar). Parámetros: ?colegio=8485&curso=3 (un curso), ?colegio=8485
+    (cada curso y el total del colegio) o ninguno (todos los grupos).
+    """
+    colegio = request.args.get('colegio')
+    curso = request.args.get('curso')
+    if colegio is None:
+        if curso is not None:
+            return jsonify({
+                'error': 'El parámetro curso requiere colegio'
+            }), 400
+        return jsonify({**agregados.estadisticas(), 'resultados': agregados.listar()})
+    
+    resultado = agregados.consultar(colegio, curso)
+    if resultado is None:
+        return jsonify({
+            'error': 'Sin predicciones para ese colegio' + (' y curso' if curso is not None else '')
+        }), 404
+    return jsonify(resultado)
+
+@app.route('/drift')
+def drift():
+    """
+    Compara las distribuciones recibidas (notas, features y clases predichas)
+    contra el perfil de entrenamiento usando PSI.
+    Con ?reiniciar=1 descarta lo observado después de reportarlo.
+    """
+    if monitor is None:
+        return jsonify({
+            'error': 'Monitor de deriva no disponible (falta perfil_referencia.json)'
+        }), 503
+    
+    reporte = monitor.reporte()
+    if request.args.get('reiniciar') == '1':
+        monitor.reiniciar()
+    return jsonify(reporte)
+
 @app.route('/predict', methods=['POST'])
+@admision.limitar('/predict')
 def predict():
     """
     Endpoint de predicción
@@ -148,9 +446,7 @@ def predict():
     }
     """
     if modelo is None:
-        return jsonify({
-            'error': 'Modelo no disponible'
-        }), 500
+        return modelo_no_disponible()
     
     try:
         # Obtener datos del request
@@ -189,9 +485,8 @@ def predict():
         # Calcular features
         features = calcular_features(notas)
         
-        # Preparar datos para el modelo (excluir _promedio_calculado que no es feature)
-        features_modelo = {k: v for k, v in features.items() if not k.startswith('_')}
-        X = pd.DataFrame([features_modelo])
+        # Preparar datos para el modelo según el esquema (excluye _promedio_calculado)
+        X = matriz_modelo([features])
         
         # Realizar predicción
         prediccion = modelo.predict(X)[0]
@@ -206,6 +501,11 @@ def predict():
             for clase, prob in zip(clases, probabilidades)
         }
         
+        # Monitoreo de deriva (O(1), en memoria)
+        if monitor is not None:
+            monitor.registrar(features, prediccion)
+        auditoria.registrar('/predict', data.get('id'), notas, prediccion, prob_dict)
+        
         # Calcular promedio (para mostrar en respuesta, pero no usado por el modelo)
         promedio = features['_promedio_calculado']
         
@@ -225,7 +525,46 @@ def predict():
             'error': f'Error al procesar la solicitud: {str(e)}'
         }), 500
 
+@app.route('/predict/local', methods=['POST'])
+@admision.limitar('/predict/local')
+def predict_local():
+    """
+    Registro de una predicción hecha en el navegador con el modelo web
+    (prediccion_local.js). La página lo envía con navigator.sendBeacon sin
+    esperar respuesta, para que la auditoría y el monitor de deriva vean
+    también esas predicciones. La clase y las probabilidades no se toman del
+    cliente: se recalculan con el modelo de la API desde las notas, así el
+    registro solo contiene clases del modelo.
+    
+    Request body:
+    {
+        "notas": [2.0, 7.0, 5.5]
+    }
+    """
+    if modelo is None:
+        return modelo_no_disponible()
+    
+    # sendBeacon envía text/plain para evitar la verificación previa de CORS
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict) or 'notas' not in data:
+        return jsonify({'error': 'Se requiere el campo "notas" en el body'}), 400
+    error = validar_notas(data['notas'])
+    if error:
+        return jsonify({'error': error}), 400
+    
+    notas = data['notas']
+    features = calcular_features(list(notas))
+    probabilidades = modelo.predict_proba(matriz_modelo([features]))[0]
+    clases = [str(c) for c in modelo.classes_]
+    riesgo = clases[int(probabilidades.argmax())]
+    if monitor is not None:
+        monitor.registrar(features, riesgo)
+    auditoria.registrar('/predict/local', data.get('id'), notas, riesgo,
+                        dict(zip(clases, probabilidades.tolist())))
+    return '', 204
+
 @app.route('/predict/batch', methods=['POST'])
+@admision.limitar('/predict/batch', contar_filas=filas_lote)
 def predict_batch():
     """
     Endpoint para predicciones en lote
@@ -234,14 +573,14 @@ def predict_batch():
     {
         "estudiantes": [
             {"id": 1, "notas": [2.0, 7.0]},
-            {"id": 2, "notas": [3.0, 3.5, 3.8]}
+            {"id": 2, "notas": [3.0, 3.5, 3.8], "colegio": "8485", "curso": "3"}
         ]
     }
+    Los estudiantes con "colegio" (y opcionalmente "curso") actualizan /agregados;
+    uno ya agregado que llega sin colegio actualiza su aporte en su grupo anterior.
     """
     if modelo is None:
-        return jsonify({
-            'error': 'Modelo no disponible'
-        }), 500
+        return modelo_no_disponible()
     
     try:
         data = request.get_json()
@@ -252,36 +591,147 @@ def predict_batch():
             }), 400
         
         estudiantes = data['estudiantes']
-        resultados = []
-        
-        for estudiante in estudiantes:
-            notas = estudiante.get('notas', [])
-            estudiante_id = estudiante.get('id', None)
-            
-            # Calcular features
-            features = calcular_features(notas)
-            
-            # Preparar datos para el modelo (excluir _promedio_calculado)
-            features_modelo = {k: v for k, v in features.items() if not k.startswith('_')}
-            X = pd.DataFrame([features_modelo])
-            
-            # Predicción
-            prediccion = modelo.predict(X)[0]
-            probabilidades = modelo.predict_proba(X)[0]
-            clases = modelo.classes_
-            
-            prob_dict = {
-                clase: float(prob) 
-                for clase, prob in zip(clases, probabilidades)
-            }
-            
-            resultados.append({
-                'id': estudiante_id,
-                'promedio': round(features['_promedio_calculado'], 2),
-                'riesgo': prediccion,
-                'probabilidades': prob_dict
+        if not isinstance(estudiantes, list):
+            return jsonify({
+                'error': 'El campo "estudiantes" debe ser una lista'
+            }), 400
+        if not estudiantes:
+            return jsonify({
+                'resultados': [],
+                'total': 0
             })
+        for i, estudiante in enumerate(estudiantes):
+            # Las notas null se aceptan como ausentes, igual que antes del cálculo vectorizado
+            error = validar_notas(estudiante.get('notas', []), permitir_nulos=True) \
+                if isinstance(estudiante, dict) else 'Formato inválido'
+            if error:
+                return jsonify({
+                    'error': f'Estudiante {i}: {error}'
+                }), 400
+        ids = [estudiante.get('id', None) for estudiante in estudiantes]
+        lista_notas = [estudiante.get('notas', []) for estudiante in estudiantes]
+        try:
+            grupos = grupos_lote(estudiantes)
+        except ValueError as e:
+            return jsonify({
+                'error': str(e)
+            }), 400
+        
+        # Features y predicción de todo el lote en una sola llamada al modelo
+        X, promedios = calcular_features_lote(lista_notas)
+        probabilidades = modelo.predict_proba(X)
+        clases = [str(c) for c in modelo.classes_]
+        riesgos = np.asarray(clases, dtype=object)[probabilidades.argmax(axis=1)]
+        
+        if monitor is not None:
+            monitor.registrar_lote(X, riesgos)
+        auditoria.registrar_lote('/predict/batch', ids, lista_notas, riesgos, probabilidades, clases)
+        registrar_agregados(ids, grupos, riesgos, probabilidades, clases)
         
+        return respuesta_lote(ids, redondear_promedios(promedios), probabilidades, clases)
+    
+    except Exception as e:
+        return jsonify({
+            'error': f'Error al procesar el lote: {str(e)}'
+        }), 500
+
+def validar_clase(data):
+    """Mensaje de error si la clase pedida no existe, o None"""
+    clase = data.get('clase')
+    if clase is not None and clase not in explicador.clases:
+        return f'La clase {clase} no existe; opciones: {explicador.clases}'
+    return None
+
+@app.route('/explain', methods=['POST'])
+@admision.limitar('/explain')
+def explain():
+    """
+    Explica la predicción de un estudiante: contribución de cada feature.
+    
+    Request body:
+    {
+        "notas": [2.0, 3.5, 3.0],
+        "clase": "alto"          # opcional; por defecto, la clase predicha
+    }
+    
+    Response: como /predict, más
+    {
+        "clase_explicada": "alto",
+        "escala": "probabilidad",
+        "base": 0.33,
+        "contribuciones": {"nota_1": 0.12, ..., "nota_max": -0.02},
+        "features": {"nota_1": 2.0, ...}
+    }
+    base + suma de contribuciones = probabilidad de clase_explicada
+    """
+    if explicador is None:
+        if not arranque.terminado():
+            return modelo_no_disponible()
+        return jsonify({
+            'error': 'Explicaciones no disponibles (requieren el modelo mapeado)'
+        }), 503
+    
+    data = request.get_json(silent=True)
+    if not data or 'notas' not in data:
+        return jsonify({
+            'error': 'Se requiere el campo "notas" en el body'
+        }), 400
+    error = validar_notas(data['notas']) or validar_clase(data)
+    if error:
+        return jsonify({
+            'error': error
+        }), 400
+    
+    try:
+        (explicacion,) = explicador.explicar([data['notas']], data.get('clase'))
+        return jsonify(explicacion)
+    
+    except Exception as e:
+        return jsonify({
+            'error': f'Error al procesar la solicitud: {str(e)}'
+        }), 500
+
+@app.route('/explain/batch', methods=['POST'])
+@admision.limitar('/explain/batch', contar_filas=filas_lote)
+def explain_batch():
+    """
+    Explicaciones en lote; las tuplas de notas repetidas se calculan una vez.
+    
+    Request body:
+    {
+        "estudiantes": [{"id": 1, "notas": [2.0, 7.0]}, ...],
+        "clase": "alto"          # opcional
+    }
+    """
+    if explicador is None:
+        if not arranque.terminado():
+            return modelo_no_disponible()
+        return jsonify({
+            'error': 'Explicaciones no disponibles (requieren el modelo mapeado)'
+        }), 503
+    
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('estudiantes'), list):
+        return jsonify({
+            'error': 'Se requiere el campo "estudiantes" (lista) en el body'
+        }), 400
+    for i, estudiante in enumerate(data['estudiantes']):
+        error = validar_notas(estudiante.get('notas', [])) if isinstance(estudiante, dict) else 'Formato inválido'
+        if error:
+            return jsonify({
+                'error': f'Estudiante {i}: {error}'
+            }), 400
+    error = validar_clase(data)
+    if error:
+        return jsonify({
+            'error': error
+        }), 400
+    
+    try:
+        estudiantes = data['estudiantes']
+        explicaciones = explicador.explicar([e.get('notas', []) for e in estudiantes], data.get('clase'))
+        resultados = [dict(explicacion, id=estudiante.get('id'))
+                      for estudiante, explicacion in zip(estudiantes, explicaciones)]
         return jsonify({
             'resultados': resultados,
             'total': len(resultados)
@@ -292,18 +742,231 @@ def predict_batch():
             'error': f'Error al procesar el lote: {str(e)}'
         }), 500
 
+@app.route('/estudiantes/<estudiante_id>')
+def consultar_estudiante(estudiante_id):
+    """Estado acumulado y última predicción de un estudiante"""
+    estado = estudiantes_estado.obtener(estudiante_id)
+    if estado is None:
+        return jsonify({
+            'error': 'Estudiante no encontrado'
+        }), 404
+    return jsonify(respuesta_estado(estudiante_id, estado, estado.features(), False))
+
+@app.route('/estudiantes/<estudiante_id>/notas', methods=['POST'])
+def agregar_nota(estudiante_id):
+    """
+    Agrega una nota al estudiante y recalcula su riesgo sin reenviar las anteriores.
+    
+    Request body:
+    {
+        "nota": 5.5,
+        "colegio": "8485", "curso": "3"   # opcionales; si faltan, se mantiene el grupo anterior
+    }
+    """
+    if modelo is None:
+        return modelo_no_disponible()
+    
+    data = request.get_json(silent=True)
+    if not data or 'nota' not in data:
+        return jsonify({
+            'error': 'Se requiere el campo "nota" en el body'
+        }), 400
+    error = validar_notas([data['nota']])
+    try:
+        grupo = grupo_estudiante(data)
+    except ValueError as e:
+        error = error or str(e)
+    if error:
+        return jsonify({
+            'error': error
+        }), 400
+    
+    try:
+        estado, features = estudiantes_estado.agregar_nota(estudiante_id, float(data['nota']))
+        (riesgo,), (probabilidades,) = predecir_features([features])
+        estudiantes_estado.guardar_prediccion(estado, features, riesgo, probabilidades)
+        auditoria.registrar('/estudiantes/notas', estudiante_id, [data['nota']], riesgo, probabilidades)
+        agregados.registrar_lote([estudiante_id], [grupo], [riesgo], [probabilidades])
+        
+        respuesta = respuesta_estado(estudiante_id, estado, features, True)
+        respuesta.update(riesgo=riesgo, probabilidades=probabilidades)
+        return jsonify(respuesta)
+    
+    except Exception as e:
+        return jsonify({
+            'error': f'Error al procesar la solicitud: {str(e)}'
+        }), 500
+
+@app.route('/estudiantes/batch', methods=['POST'])
+def sincronizar_estudiantes():
+    """
+    Recibe la lista completa de notas de cada estudiante. Solo se agregan las
+    notas nuevas y solo se recalculan los estudiantes cuyas notas cambiaron
+    desde el envío anterior; el resto responde con su predicción guardada.
+    
+    Request body:
+    {
+        "estudiantes": [
+            {"id": 1, "notas": [2.0, 7.0, 5.5, 6.0], "colegio": "8485", "curso": "3"},
+            {"id": 2, "notas": [3.0]}
+        ]
+    }
+    "colegio" y "curso" son opcionales; si faltan, se mantiene el grupo anterior en /agregados.
+    """
+    if modelo is None:
+        return modelo_no_disponible()
+    
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('estudiantes'), list):
+        return jsonify({
+            'error': 'Se requiere el campo "estudiantes" (lista) en el body'
+        }), 400
+    for i, estudiante in enumerate(data['estudiantes']):
+        if not isinstance(estudiante, dict) or estudiante.get('id') is None:
+            return jsonify({
+                'error': f'Estudiante {i}: se requiere "id"'
+            }), 400
+        error = validar_notas(estudiante.get('notas', []), max_notas=None)
+        if error:
+            return jsonify({
+                'error': f'Estudiante {i}: {error}'
+            }), 400
+    try:
+        grupos = grupos_lote(data['estudiantes'])
+    except ValueError as e:
+        return jsonify({
+            'error': str(e)
+        }), 400
+    
+    try:
+        sincronizados = [
+            (estudiante, *estudiantes_estado.sincronizar(
+                estudiante['id'], [float(n) for n in estudiante.get('notas', [])]))
+            for estudiante in data['estudiantes']
+        ]
+        # Una sola llamada al modelo para todos los que cambiaron
+        cambiados = [s for s in sincronizados if s[3]]
+        predichos = {}
+        if cambiados:
+            riesgos, probabilidades = predecir_features([features for _, _, features, _ in cambiados])
+            for (estudiante, estado, features, _), riesgo, prob_dict in zip(cambiados, riesgos, probabilidades):
+                estudiantes_estado.guardar_prediccion(estado, features, riesgo, prob_dict)
+                auditoria.registrar('/estudiantes/batch', estudiante['id'], estudiante.get('notas', []),
+                                    riesgo, prob_dict)
+                predichos[id(estudiante)] = (riesgo, prob_dict)
+        
+        # Agregados: los recalculados y los que informan su grupo (pueden haber cambiado de curso)
+        ids, grupos_agregados, riesgos_agregados, prob_agregados = [], [], [], []
+        for (estudiante, estado, _, _), grupo in zip(sincronizados, grupos):
+            riesgo, prob_dict = predichos.get(id(estudiante), (estado.riesgo, estado.probabilidades))
+            if riesgo is not None and (grupo is not None or id(estudiante) in predichos):
+                ids.append(estudiante['id'])
+                grupos_agregados.append(grupo)
+                riesgos_agregados.append(riesgo)
+                prob_agregados.append(prob_dict)
+        agregados.registrar_lote(ids, grupos_agregados, riesgos_agregados, prob_agregados)
+        
+        resultados = [respuesta_estado(estudiante['id'], estado, features, cambio)
+                      for estudiante, estado, features, cambio in sincronizados]
+        return jsonify({
+            'resultados': resultados,
+            'total': len(resultados),
+            'recalculados': len(cambiados)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': f'Error al procesar el lote: {str(e)}'
+        }), 500
+
+@app.route('/jobs', methods=['POST'])
+def crear_trabajo():
+    """
+    Recibe un lote grande y responde de inmediato con el id del trabajo.
+    
+    Request body: igual que /predict/batch
+    {
+        "estudiantes": [{"id": 1, "notas": [2.0, 7.0]}, ...]
+    }
+    
+    Response (202):
+    {"id": "...", "estado": "pendiente", "total": 250000, "url": "/jobs/<id>"}
+    """
+    if modelo is None:
+        return modelo_no_disponible()
+    
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('estudiantes'), list):
+        return jsonify({
+            'error': 'Se requiere el campo "estudiantes" (lista) en el body'
+        }), 400
+    
+    # Validar todo antes de aceptar: un trabajo aceptado no falla por la entrada
+    for i, estudiante in enumerate(data['estudiantes']):
+        error = validar_notas(estudiante.get('notas', [])) if isinstance(estudiante, dict) else 'Formato inválido'
+        if error:
+            return jsonify({
+                'error': f'Estudiante {i}: {error}'
+            }), 400
+    try:
+        grupos_lote(data['estudiantes'])
+    except ValueError as e:
+        return jsonify({
+            'error': str(e)
+        }), 400
+    
+    estado = gestor_trabajos.crear(data['estudiantes'])
+    estado['url'] = f"/jobs/{estado['id']}"
+    return jsonify(estado), 202
+
+@app.route('/jobs/<trabajo_id>')
+def consultar_trabajo(trabajo_id):
+    """
+    Progreso del trabajo y una página de resultados.
+    Parámetros: ?pagina=1&por_pagina=1000
+    """
+    pagina = request.args.get('pagina', 1, type=int)
+    por_pagina = request.args.get('por_pagina', POR_PAGINA_DEFECTO, type=int)
+    if pagina < 1 or not 1 <= por_pagina <= POR_PAGINA_MAXIMO:
+        return jsonify({
+            'error': f'pagina debe ser >= 1 y por_pagina entre 1 y {POR_PAGINA_MAXIMO}'
+        }), 400
+    
+    estado = gestor_trabajos.consultar(trabajo_id, pagina, por_pagina)
+    if estado is None:
+        return jsonify({
+            'error': 'Trabajo no encontrado'
+        }), 404
+    return jsonify(estado)
+
+# Carga y calentamiento en segundo plano, con todo el módulo ya definido
+# (con el recargador de debug, solo en el proceso que atiende solicitudes)
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    arranque.iniciar(preparar_modelo)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print(f"\n{'='*70}")
     print("API de Predicción de Riesgo de Repitencia")
     print("="*70)
     print(f"Servidor iniciado en http://localhost:{port}")
-    print(f"Modelo cargado: {modelo is not None}")
+    print("Modelo: se carga y calienta en segundo plano (GET /ready indica cuándo está listo)")
     print("\nEndpoints disponibles:")
     print(f"  GET  http://localhost:{port}/")
     print(f"  GET  http://localhost:{port}/health")
+    print(f"  GET  http://localhost:{port}/ready")
+    print(f"  GET  http://localhost:{port}/drift")
+    print(f"  GET  http://localhost:{port}/agregados")
+    print(f"  GET  http://localhost:{port}/modelo/version")
+    print(f"  GET  http://localhost:{port}/modelo/web")
     print(f"  POST http://localhost:{port}/predict")
     print(f"  POST http://localhost:{port}/predict/batch")
+    print(f"  POST http://localhost:{port}/explain")
+    print(f"  POST http://localhost:{port}/explain/batch")
+    print(f"  POST http://localhost:{port}/estudiantes/<id>/notas")
+    print(f"  POST http://localhost:{port}/estudiantes/batch")
+    print(f"  POST http://localhost:{port}/jobs")
+    print(f"  GET  http://localhost:{port}/jobs/<id>")
     print("="*70 + "\n")
     
     app.run(host='0.0.0.0', port=port, debug=True)
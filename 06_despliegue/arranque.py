@@ -0,0 +1,87 @@
+"""
+Arranque de la API
+Carga y calentamiento del modelo en un hilo en segundo plano, con la línea de
+tiempo medida desde que se creó el proceso (intérprete e importaciones
+incluidos). /health responde apenas el proceso está vivo; /ready, solo cuando
+el modelo ya respondió inferencias reales, para que un despliegue no envíe
+tráfico a un worker frío.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class Arranque:
+    """Etapas del arranque (segundos desde el inicio del proceso) y estado de preparación"""
+
+    def __init__(self):
+        self._inicio = psutil.Process().create_time()
+        self._terminado = threading.Event()
+        self._lock = threading.Lock()
+        self.etapas = []
+        self.etapa_actual = None
+        self.listo = False
+        self.error = None
+
+    def _segundos(self):
+        return round(time.time() - self._inicio, 3)
+
+    def marcar(self, nombre, duracion_s=None):
+        """Registra el fin de una etapa"""
+        with self._lock:
+            t = self._segundos()
+            if duracion_s is None:
+                duracion_s = t - (self.etapas[-1]['t_s'] if self.etapas else 0.0)
+            self.etapas.append({'etapa': nombre, 't_s': t, 'duracion_s': round(duracion_s, 3)})
+        logger.info("Arranque: %s en %.3f s (t = %.3f s)", nombre, duracion_s, t)
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide una etapa; si falla, el arranque queda con error"""
+        self.etapa_actual = nombre
+        inicio = time.perf_counter()
+        yield
+        self.marcar(nombre, time.perf_counter() - inicio)
+
+    def iniciar(self, preparar):
+        """Ejecuta preparar() en un hilo; el servicio queda listo cuando termina sin error"""
+        hilo = threading.Thread(target=self._ejecutar, args=(preparar,), name='arranque', daemon=True)
+        hilo.start()
+        return hilo
+
+    def _ejecutar(self, preparar):
+        try:
+            preparar()
+            self.listo = True
+            logger.info("OK API lista en %.3f s desde el inicio del proceso", self._segundos())
+        except Exception as e:
+            self.error = f"{self.etapa_actual}: {e}"
+            logger.exception("Error en el arranque (etapa %s)", self.etapa_actual)
+        finally:
+            self.etapa_actual = None
+            self._terminado.set()
+
+    def terminado(self):
+        return self._terminado.is_set()
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta que el arranque termine (bien o con error); retorna si quedó listo"""
+        self._terminado.wait(timeout)
+        return self.listo
+
+    def estado(self):
+        with self._lock:
+            etapas = list(self.etapas)
+        return {
+            'listo': self.listo,
+            'etapa_actual': self.etapa_actual,
+            'error': self.error,
+            'segundos_desde_inicio': self._segundos(),
+            'etapas': etapas,
+        }
@@ -0,0 +1,235 @@
+"""
+Auditoría de Predicciones
+Registro de cada predicción sin I/O en el camino de la solicitud: los
+handlers encolan una tupla compacta en una cola acotada y un hilo escritor
+la serializa y la agrega por lotes a archivos JSON Lines rotados por tamaño.
+
+Los endpoints de lote encolan un solo registro con los arreglos del lote
+(registrar_lote); el escritor lo expande a una línea por estudiante.
+
+Política con la cola llena (variable de entorno AUDITORIA_POLITICA):
+    'descartar'  el registro se pierde y se cuenta en 'descartados' (default)
+    'bloquear'   la solicitud espera a que el escritor libere espacio
+
+Uso como comando para medir el costo en el camino de la solicitud:
+    python auditoria.py
+"""
+
+import atexit
+import glob
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_AUDITORIA = os.path.join(BASE_DIR, '06_despliegue', 'auditoria')
+NOMBRE_ARCHIVO = 'predicciones.jsonl'
+
+TAMANO_COLA = 10_000                    # registros en memoria antes de aplicar la política
+TAMANO_LOTE = 1_000                     # registros por escritura
+INTERVALO_VACIADO = 0.5                 # segundos máximos que un registro espera en la cola
+TAMANO_MAX_ARCHIVO = 50 * 2**20         # bytes antes de rotar
+ARCHIVOS_CONSERVADOS = 10               # predicciones.1.jsonl ... predicciones.10.jsonl
+POLITICA_COLA_LLENA = os.environ.get('AUDITORIA_POLITICA', 'descartar')
+
+_FIN = object()
+
+
+class AuditoriaPredicciones:
+    """Cola acotada + hilo escritor con rotación por tamaño"""
+
+    def __init__(self, directorio=DIRECTORIO_AUDITORIA, politica=POLITICA_COLA_LLENA,
+                 tamano_cola=TAMANO_COLA, tamano_max_archivo=TAMANO_MAX_ARCHIVO):
+        if politica not in ('descartar', 'bloquear'):
+            raise ValueError(f"Política no soportada: {politica}")
+        self.directorio = directorio
+        self.politica = politica
+        self.tamano_max_archivo = tamano_max_archivo
+        self.ruta = os.path.join(directorio, NOMBRE_ARCHIVO)
+        self._cola = queue.Queue(maxsize=tamano_cola)
+        self._lock = threading.Lock()
+        self.encolados = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.errores_escritura = 0
+
+        os.makedirs(directorio, exist_ok=True)
+        self._escritor = threading.Thread(target=self._escribir, name='auditoria', daemon=True)
+        self._escritor.start()
+        atexit.register(self.cerrar)
+
+    def registrar(self, endpoint, estudiante_id, notas, riesgo, probabilidades):
+        """Encola una predicción; no serializa ni toca disco"""
+        registro = (time.time(), endpoint, estudiante_id, notas, riesgo, probabilidades)
+        return self._encolar(registro, 1)
+
+    def registrar_lote(self, endpoint, ids, notas, riesgos, probabilidades, clases):
+        """
+        Encola las predicciones de un lote como un solo registro: probabilidades
+        es la matriz (estudiantes, clases) sin convertir a dicts.
+        """
+        registro = (time.time(), endpoint, ids, notas, riesgos, probabilidades, clases)
+        return self._encolar(registro, len(ids))
+
+    def _encolar(self, registro, n):
+        """
+        Aplica la política con la cola llena. Si el escritor ya no corre, nadie
+        vaciará la cola: el registro se descarta en vez de esperar para siempre.
+        """
+        encolado = False
+        if self.politica == 'bloquear':
+            while not encolado and self._escritor.is_alive():
+                try:
+                    self._cola.put(registro, timeout=INTERVALO_VACIADO)
+                    encolado = True
+                except queue.Full:
+                    pass
+        elif self._escritor.is_alive():
+            try:
+                self._cola.put_nowait(registro)
+                encolado = True
+            except queue.Full:
+                pass
+        with self._lock:
+            if encolado:
+                self.encolados += n
+            else:
+                self.descartados += n
+        return encolado
+
+    @staticmethod
+    def _predicciones(registro):
+        """Cantidad de predicciones de un registro (individual o de lote)"""
+        return 1 if len(registro) == 6 else len(registro[2])
+
+    @staticmethod
+    def _lineas(registro):
+        """Una línea JSON por predicción del registro (individual o de lote)"""
+        if len(registro) == 6:
+            ts, endpoint, estudiante_id, notas, riesgo, probabilidades = registro
+            filas = [(estudiante_id, notas, riesgo, probabilidades)]
+        else:
+            ts, endpoint, ids, notas, riesgos, probabilidades, clases = registro
+            filas = [(estudiante_id, notas_i, riesgo, dict(zip(clases, fila)))
+                     for estudiante_id, notas_i, riesgo, fila in zip(ids, notas, riesgos, probabilidades.tolist())]
+        return [
+            json.dumps({'ts': round(ts, 6), 'endpoint': endpoint, 'id': estudiante_id, 'notas': notas,
+                        'riesgo': riesgo, 'probabilidades': probabilidades},
+                       ensure_ascii=False, separators=(',', ':')) + '\n'
+            for estudiante_id, notas, riesgo, probabilidades in filas
+        ]
+
+    def _siguiente_lote(self):
+        """Espera el primer registro y luego toma sin bloquear los que haya, hasta TAMANO_LOTE"""
+        try:
+            lote = [self._cola.get(timeout=INTERVALO_VACIADO)]
+        except queue.Empty:
+            return []
+        while len(lote) < TAMANO_LOTE and lote[-1] is not _FIN:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _rotar(self):
+        """predicciones.jsonl -> .1.jsonl -> .2.jsonl ...; el más antiguo se elimina"""
+        base, extension = os.path.splitext(self.ruta)
+        for i in range(ARCHIVOS_CONSERVADOS - 1, 0, -1):
+            origen = f"{base}.{i}{extension}"
+            if os.path.exists(origen):
+                os.replace(origen, f"{base}.{i + 1}{extension}")
+        os.replace(self.ruta, f"{base}.1{extension}")
+
+    def _escribir(self):
+        terminar = False
+        while not terminar:
+            lote = self._siguiente_lote()
+            if lote and lote[-1] is _FIN:
+                lote.pop()
+                terminar = True
+            if not lote:
+                continue
+            # Cualquier error (disco, un registro mal formado) se cuenta y el
+            # escritor sigue: si el hilo muriera, la cola se llenaría
+            try:
+                lineas = [linea for registro in lote for linea in self._lineas(registro)]
+                with open(self.ruta, 'a', encoding='utf-8') as f:
+                    f.write(''.join(lineas))
+                    tamano = f.tell()
+                if tamano >= self.tamano_max_archivo:
+                    self._rotar()
+                with self._lock:
+                    self.escritos += len(lineas)
+            except Exception:
+                with self._lock:
+                    self.errores_escritura += sum(self._predicciones(registro) for registro in lote)
+
+    def cerrar(self, timeout=5.0):
+        """Escribe lo pendiente y detiene el escritor"""
+        if self._escritor.is_alive():
+            self._cola.put(_FIN)
+            self._escritor.join(timeout)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'politica': self.politica,
+                'en_cola': self._cola.qsize(),
+                'encolados': self.encolados,
+                'escritos': self.escritos,
+                'descartados': self.descartados,
+                'errores_escritura': self.errores_escritura,
+                'archivos': len(glob.glob(os.path.join(self.directorio, '*.jsonl'))),
+            }
+
+
+def _percentiles_us(tiempos):
+    tiempos = sorted(tiempos)
+    return {p: tiempos[int(len(tiempos) * p / 100) - 1] * 1e6 for p in (50, 99, 100)}
+
+
+def benchmark(n=200_000):
+    """Costo por registro en el camino de la solicitud: cola vs escritura síncrona"""
+    directorio = tempfile.mkdtemp(prefix='auditoria_')
+    try:
+        args = ('/predict', None, [5.0, 4.0, 6.0], 'bajo', {'alto': 0.01, 'bajo': 0.97, 'medio': 0.02})
+        resultados = {}
+        for politica in ('descartar', 'bloquear'):
+            auditoria = AuditoriaPredicciones(os.path.join(directorio, politica), politica=politica)
+            tiempos = []
+            for _ in range(n):
+                inicio = time.perf_counter()
+                auditoria.registrar(*args)
+                tiempos.append(time.perf_counter() - inicio)
+            auditoria.cerrar()
+            resultados[politica] = (_percentiles_us(tiempos), auditoria.estadisticas())
+
+        # Referencia: escribir cada registro directamente en el handler
+        tiempos = []
+        ruta = os.path.join(directorio, 'sincrono.jsonl')
+        for _ in range(n // 10):
+            inicio = time.perf_counter()
+            with open(ruta, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'ts': time.time(), 'endpoint': args[0], 'id': args[1], 'notas': args[2],
+                                    'riesgo': args[3], 'probabilidades': args[4]}) + '\n')
+            tiempos.append(time.perf_counter() - inicio)
+        sincrono = _percentiles_us(tiempos)
+    finally:
+        shutil.rmtree(directorio)
+
+    print(f"\n{'Modo':<24} {'p50 (µs)':>10} {'p99 (µs)':>10} {'máx (µs)':>10} {'escritos':>10} {'descartados':>12}")
+    for politica, (p, estadisticas) in resultados.items():
+        print(f"{'cola / ' + politica:<24} {p[50]:>10.2f} {p[99]:>10.2f} {p[100]:>10.1f} "
+              f"{estadisticas['escritos']:>10,} {estadisticas['descartados']:>12,}")
+    print(f"{'escritura síncrona':<24} {sincrono[50]:>10.2f} {sincrono[99]:>10.2f} {sincrono[100]:>10.1f}")
+    print(f"\n({n:,} registros seguidos, sin pausas: el peor caso para la cola)")
+    return resultados, sincrono
+
+
+if __name__ == "__main__":
+    benchmark()
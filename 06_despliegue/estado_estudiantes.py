@@ -0,0 +1,211 @@
+"""
+Estado por Estudiante
+Guarda por estudiante estadísticas suficientes de sus notas (cantidad, suma,
+suma de cuadrados, primera y última, mínimo y máximo, y las tres primeras
+notas que usa el modelo). Agregar una nota actualiza las features en O(1) sin
+recorrer las anteriores.
+
+El estado vive en memoria y se respalda en disco (JSON, escritura atómica)
+cada INTERVALO_SNAPSHOT segundos si hubo cambios, y al cerrar la API.
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_SNAPSHOT = os.path.join(BASE_DIR, '06_despliegue', 'estado', 'estudiantes.json')
+INTERVALO_SNAPSHOT = 30.0  # segundos
+BLOQUE_SNAPSHOT = 10_000   # estados copiados por cada toma del lock al respaldar
+TOLERANCIA_SUMA = 1e-6     # para reconocer que una lista reenviada empieza con las notas ya guardadas
+
+
+class EstadoEstudiante:
+    """Estadísticas suficientes de las notas de un estudiante y su última predicción"""
+
+    __slots__ = ('cantidad', 'suma', 'suma_cuadrados', 'primera', 'ultima', 'minimo', 'maximo',
+                 'primeras', 'riesgo', 'probabilidades')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.suma = 0.0
+        self.suma_cuadrados = 0.0
+        self.primera = None
+        self.ultima = None
+        self.minimo = None
+        self.maximo = None
+        self.primeras = []
+        self.riesgo = None
+        self.probabilidades = None
+
+    def agregar(self, nota):
+        """O(1): actualiza las estadísticas con una nota nueva"""
+        self.cantidad += 1
+        self.suma += nota
+        self.suma_cuadrados += nota * nota
+        if self.primera is None:
+            self.primera = self.minimo = self.maximo = nota
+        self.ultima = nota
+        self.minimo = min(self.minimo, nota)
+        self.maximo = max(self.maximo, nota)
+        if len(self.primeras) < 3:
+            self.primeras.append(nota)
+        # La predicción guardada deja de corresponder a las notas
+        self.riesgo = self.probabilidades = None
+
+    def coincide(self, notas):
+        """
+        True si estas notas dan las mismas estadísticas guardadas (suma, suma de
+        cuadrados, mínimo, máximo, primeras y última). Así, editar una nota
+        intermedia que conserva la suma igual se detecta y el estado se reconstruye.
+        """
+        if len(notas) != self.cantidad:
+            return False
+        if not notas:
+            return True
+        return (abs(sum(notas) - self.suma) <= TOLERANCIA_SUMA and
+                abs(sum(nota * nota for nota in notas) - self.suma_cuadrados) <= TOLERANCIA_SUMA and
+                min(notas) == self.minimo and max(notas) == self.maximo and
+                notas[:len(self.primeras)] == self.primeras and notas[-1] == self.ultima)
+
+    @property
+    def promedio(self):
+        return self.suma / self.cantidad if self.cantidad else 0
+
+    def features(self):
+        """
+        Features del modelo. Con hasta 3 notas coinciden con calcular_features;
+        con más, nota_1..3 son las tres primeras, cantidad_notas se limita a 3
+        (el dominio de entrenamiento) y tendencia, variabilidad, mínimo y máximo
+        consideran todas las notas.
+        """
+        primeras = self.primeras + [0] * (3 - len(self.primeras))
+        if self.cantidad >= 2:
+            tendencia = (self.ultima > self.primera) - (self.ultima < self.primera)
+            variabilidad = math.sqrt(max(self.suma_cuadrados / self.cantidad - self.promedio ** 2, 0.0))
+        else:
+            tendencia = 0
+            variabilidad = 0
+        return {
+            'nota_1': primeras[0],
+            'nota_2': primeras[1],
+            'nota_3': primeras[2],
+            'cantidad_notas': min(self.cantidad, 3),
+            'tendencia': tendencia,
+            'variabilidad': variabilidad,
+            'nota_min': self.minimo if self.cantidad else 0,
+            'nota_max': self.maximo if self.cantidad else 0,
+            '_promedio_calculado': self.promedio,
+        }
+
+    def a_dict(self):
+        # primeras se modifica en su lugar: el snapshot necesita su propia copia
+        return {campo: list(self.primeras) if campo == 'primeras' else getattr(self, campo)
+                for campo in self.__slots__}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        estado = cls()
+        for campo in cls.__slots__:
+            setattr(estado, campo, datos.get(campo, getattr(estado, campo)))
+        return estado
+
+
+class AlmacenEstudiantes:
+    """Estados por id de estudiante, seguros entre hilos, con respaldo periódico en disco"""
+
+    def __init__(self, ruta=RUTA_SNAPSHOT, intervalo=INTERVALO_SNAPSHOT):
+        self.ruta = ruta
+        self._estados = {}
+        self._lock = threading.RLock()
+        self._cambios = False
+        self.cargar()
+        self._detener = threading.Event()
+        self._respaldo = threading.Thread(target=self._respaldar, args=(intervalo,),
+                                          name='snapshot_estudiantes', daemon=True)
+        self._respaldo.start()
+        atexit.register(self.cerrar)
+
+    def cargar(self):
+        if os.path.exists(self.ruta):
+            with open(self.ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+            with self._lock:
+                self._estados = {id_: EstadoEstudiante.desde_dict(e) for id_, e in datos['estudiantes'].items()}
+        return len(self._estados)
+
+    def guardar(self):
+        """Escribe el snapshot si hubo cambios desde el último"""
+        with self._lock:
+            if not self._cambios:
+                return False
+            estados = list(self._estados.items())
+            self._cambios = False
+        # Los estados se modifican en su lugar, así que cada uno se copia bajo el
+        # lock, pero por bloques: las solicitudes no esperan la copia completa
+        estudiantes = {}
+        for inicio in range(0, len(estados), BLOQUE_SNAPSHOT):
+            with self._lock:
+                for id_, estado in estados[inicio:inicio + BLOQUE_SNAPSHOT]:
+                    estudiantes[id_] = estado.a_dict()
+        contenido = {'fecha': time.strftime('%Y-%m-%d %H:%M:%S'), 'estudiantes': estudiantes}
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(contenido, f, separators=(',', ':'))
+        os.replace(temporal, self.ruta)
+        return True
+
+    def _respaldar(self, intervalo):
+        while not self._detener.wait(intervalo):
+            self.guardar()
+
+    def cerrar(self):
+        self._detener.set()
+        self.guardar()
+
+    def obtener(self, estudiante_id):
+        with self._lock:
+            return self._estados.get(str(estudiante_id))
+
+    def agregar_nota(self, estudiante_id, nota):
+        """Agrega una nota (O(1)) y retorna el estado y sus features en ese momento"""
+        with self._lock:
+            estado = self._estados.setdefault(str(estudiante_id), EstadoEstudiante())
+            estado.agregar(nota)
+            self._cambios = True
+            return estado, estado.features()
+
+    def sincronizar(self, estudiante_id, notas):
+        """
+        Deja el estado consistente con la lista completa de notas reenviada.
+        Si la lista solo agrega notas al final, se agregan únicamente las nuevas;
+        si cambió alguna anterior, el estado se reconstruye.
+        Retorna (estado, features, cambió); sin cambios, la predicción guardada sigue vigente.
+        """
+        with self._lock:
+            estado = self._estados.get(str(estudiante_id))
+            if estado is not None and len(notas) >= estado.cantidad and estado.coincide(notas[:estado.cantidad]):
+                nuevas = notas[estado.cantidad:]
+            else:
+                estado = self._estados[str(estudiante_id)] = EstadoEstudiante()
+                nuevas = notas
+            for nota in nuevas:
+                estado.agregar(nota)
+            cambio = bool(nuevas) or estado.riesgo is None
+            self._cambios = self._cambios or cambio
+            return estado, estado.features(), cambio
+
+    def guardar_prediccion(self, estado, features, riesgo, probabilidades):
+        """Guarda la predicción solo si nadie agregó notas mientras se calculaba"""
+        with self._lock:
+            if estado.features() == features:
+                estado.riesgo = riesgo
+                estado.probabilidades = probabilidades
+                self._cambios = True
+
+    def __len__(self):
+        return len(self._estados)
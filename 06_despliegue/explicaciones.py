@@ -0,0 +1,126 @@
+"""
+Explicaciones de Predicciones
+Contribución de cada una de las 8 features a la predicción de un estudiante,
+con la descomposición exacta por caminos de ModeloMapeado.contribuciones:
+base + suma de contribuciones = probabilidad de la clase explicada (en un
+bosque) o su puntaje bruto (en gradient boosting).
+
+Las features dependen solo de las notas, así que la explicación se guarda en
+un caché LRU por tupla de notas. En un lote se calculan juntas, en una sola
+pasada por los árboles, solo las tuplas distintas que no están en el caché.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+TAMANO_CACHE_EXPLICACIONES = 100_000  # tuplas de notas (~0,5 KB cada una)
+DECIMALES_FEATURES = 4                # valores de las features en la respuesta
+
+
+class CacheLRU:
+    """Diccionario acotado que descarta lo menos usado, seguro entre hilos"""
+
+    def __init__(self, capacidad=TAMANO_CACHE_EXPLICACIONES):
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener_varios(self, claves):
+        """Las entradas presentes de claves (y las marca como recién usadas)"""
+        encontrados = {}
+        with self._lock:
+            for clave in claves:
+                valor = self._datos.get(clave)
+                if valor is not None:
+                    self._datos.move_to_end(clave)
+                    encontrados[clave] = valor
+            self.aciertos += len(encontrados)
+            self.fallos += len(claves) - len(encontrados)
+        return encontrados
+
+    def guardar_varios(self, entradas):
+        with self._lock:
+            self._datos.update(entradas)
+            for clave in entradas:
+                self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'capacidad': self.capacidad,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else None,
+            }
+
+
+class Explicador:
+    """
+    Explica las predicciones de un ModeloMapeado. calcular_features_lote(lista_notas)
+    retorna (X, promedios) como la función de la API.
+    """
+
+    def __init__(self, modelo, calcular_features_lote, capacidad=TAMANO_CACHE_EXPLICACIONES):
+        self.modelo = modelo
+        self.calcular_features_lote = calcular_features_lote
+        self.features = [str(f) for f in modelo.feature_names_in_]
+        self.clases = [str(c) for c in modelo.classes_]
+        self.escala = 'probabilidad' if modelo.tipo == 'bosque' else 'puntaje_bruto'
+        self.cache = CacheLRU(capacidad)
+
+    def _calcular(self, tuplas):
+        """Explicación de varias tuplas de notas en una sola pasada por los árboles"""
+        X, promedios = self.calcular_features_lote([list(t) for t in tuplas])
+        base, aportes = self.modelo.contribuciones(X)
+        # Las mismas probabilidades de /predict (sumar las contribuciones difiere en el último decimal)
+        probabilidades = self.modelo.predict_proba(X)
+        if aportes.shape[2] == 1:
+            # Gradient boosting binario: el puntaje es de la clase positiva
+            base = np.concatenate([-base, base])
+            aportes = np.concatenate([-aportes, aportes], axis=2)
+        valores = np.round(X.to_numpy(dtype=np.float64), DECIMALES_FEATURES)
+        predicciones = probabilidades.argmax(axis=1).tolist()
+        return {
+            tupla: (round(float(promedios[i]), 2), valores[i].tolist(), probabilidades[i].tolist(),
+                    predicciones[i], base, aportes[i])
+            for i, tupla in enumerate(tuplas)
+        }
+
+    def explicar(self, lista_notas, clase=None):
+        """
+        Una explicación por estudiante, en el orden recibido. clase indica la
+        clase a explicar; por defecto, la predicha para cada estudiante.
+        """
+        claves = [tuple(float(n) for n in notas[:3]) for notas in lista_notas]
+        distintas = list(dict.fromkeys(claves))
+        explicaciones = self.cache.obtener_varios(distintas)
+        faltantes = [c for c in distintas if c not in explicaciones]
+        if faltantes:
+            calculadas = self._calcular(faltantes)
+            self.cache.guardar_varios(calculadas)
+            explicaciones.update(calculadas)
+
+        indice_fijo = self.clases.index(clase) if clase is not None else None
+        resultados = []
+        for clave in claves:
+            promedio, valores, probabilidades, prediccion, base, aportes = explicaciones[clave]
+            indice = prediccion if indice_fijo is None else indice_fijo
+            resultados.append({
+                'promedio': promedio,
+                'riesgo': self.clases[prediccion],
+                'probabilidades': dict(zip(self.clases, probabilidades)),
+                'clase_explicada': self.clases[indice],
+                'escala': self.escala,
+                'base': float(base[indice]),
+                'contribuciones': dict(zip(self.features, aportes[:, indice].tolist())),
+                'features': dict(zip(self.features, valores)),
+            })
+        return resultados
@@ -0,0 +1,132 @@
+"""
+Features del Modelo
+Las 8 features que recibe el modelo, calculadas desde las notas de un
+estudiante (fila a fila) o de muchos a la vez (vectorizado). El módulo no
+tiene efectos al importarse: lo usan la API y los benchmarks sin levantar
+el servidor ni cargar el modelo.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_ESQUEMA = os.path.join(BASE_DIR, '03_preparacion_datos', 'esquema_features.json')
+
+
+def cargar_esquema(ruta=RUTA_ESQUEMA):
+    """Esquema exportado por la fase de preparación: feature -> dtype, en orden"""
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)['features']
+
+
+def calcular_features(notas):
+    """
+    Calcula las features necesarias para el modelo
+    a partir de las notas ingresadas
+    """
+    # Asegurar que tenemos máximo 3 notas
+    notas = notas[:3]
+    
+    # Rellenar con NaN si hay menos de 3 notas
+    while len(notas) < 3:
+        notas.append(np.nan)
+    
+    nota_1, nota_2, nota_3 = notas[0], notas[1], notas[2]
+    
+    # Calcular promedio
+    notas_validas = [n for n in notas if not pd.isna(n)]
+    promedio_calculado = np.mean(notas_validas) if notas_validas else 0
+    
+    # Cantidad de notas
+    cantidad_notas = len(notas_validas)
+    
+    # Tendencia
+    if len(notas_validas) >= 2:
+        if notas_validas[-1] > notas_validas[0]:
+            tendencia = 1  # Mejora
+        elif notas_validas[-1] < notas_validas[0]:
+            tendencia = -1  # Empeora
+        else:
+            tendencia = 0  # Estable
+    else:
+        tendencia = 0
+    
+    # Variabilidad
+    if len(notas_validas) >= 2:
+        variabilidad = np.std(notas_validas)
+    else:
+        variabilidad = 0
+    
+    # Nota mínima y máxima
+    nota_min = min(notas_validas) if notas_validas else 0
+    nota_max = max(notas_validas) if notas_validas else 0
+    
+    # Rellenar NaN con 0 para el modelo
+    nota_1 = nota_1 if not pd.isna(nota_1) else 0
+    nota_2 = nota_2 if not pd.isna(nota_2) else 0
+    nota_3 = nota_3 if not pd.isna(nota_3) else 0
+    
+    # Features para el modelo (SIN promedio_calculado ni distancia_umbral para evitar data leakage)
+    features = {
+        'nota_1': nota_1,
+        'nota_2': nota_2,
+        'nota_3': nota_3,
+        'cantidad_notas': cantidad_notas,
+        'tendencia': tendencia,
+        'variabilidad': variabilidad,
+        'nota_min': nota_min,
+        'nota_max': nota_max
+    }
+    
+    # Guardar promedio_calculado para mostrarlo en la respuesta (pero no como feature)
+    features['_promedio_calculado'] = promedio_calculado  # Prefijo _ para indicar que no es feature del modelo
+    
+    return features
+
+
+def calcular_features_lote(lista_notas, esquema):
+    """
+    Versión vectorizada de calcular_features para muchos estudiantes.
+    Retorna (X según el esquema, promedios); los resultados son los mismos
+    que fila a fila. esquema: feature -> dtype (ver cargar_esquema).
+    """
+    n = len(lista_notas)
+    notas = np.full((n, 3), np.nan)
+    for i, fila in enumerate(lista_notas):
+        fila = fila[:3]
+        notas[i, :len(fila)] = fila
+    
+    validas = ~np.isnan(notas)
+    cantidad = validas.sum(axis=1)
+    con_notas = cantidad > 0
+    rellenas = np.where(validas, notas, 0.0)
+    
+    promedio = np.divide(rellenas.sum(axis=1), cantidad, out=np.zeros(n), where=con_notas)
+    # Primera y última nota válida: con nulos intermedios ([5.0, None, 6.0]) o
+    # iniciales no están en las columnas 0 y cantidad-1
+    filas = np.arange(n)
+    primera = rellenas[filas, validas.argmax(axis=1)]
+    ultima = rellenas[filas, 2 - validas[:, ::-1].argmax(axis=1)]
+    dos_o_mas = cantidad >= 2
+    tendencia = np.where(dos_o_mas, np.sign(ultima - primera), 0)
+    # np.std poblacional sobre las notas válidas, igual que la versión fila a fila
+    desviacion = np.sqrt(np.divide(((rellenas - promedio[:, None]) ** 2 * validas).sum(axis=1), cantidad,
+                                   out=np.zeros(n), where=con_notas))
+    variabilidad = np.where(dos_o_mas, desviacion, 0.0)
+    nota_min = np.where(con_notas, np.where(validas, notas, np.inf).min(axis=1), 0.0)
+    nota_max = np.where(con_notas, np.where(validas, notas, -np.inf).max(axis=1), 0.0)
+    
+    X = pd.DataFrame({
+        'nota_1': rellenas[:, 0],
+        'nota_2': rellenas[:, 1],
+        'nota_3': rellenas[:, 2],
+        'cantidad_notas': cantidad,
+        'tendencia': tendencia,
+        'variabilidad': variabilidad,
+        'nota_min': nota_min,
+        'nota_max': nota_max,
+    })[list(esquema)].astype(esquema)
+    return pd.DataFrame(np.ascontiguousarray(X.to_numpy(dtype=np.float32)), columns=list(esquema)), promedio
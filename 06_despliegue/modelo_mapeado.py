@@ -0,0 +1,418 @@
+"""
+Modelo Mapeado en Memoria
+Carga el modelo exportado por la fase de modelado como arreglos planos .npy
+abiertos con np.load(mmap_mode='r'). No requiere sklearn ni deserializar el
+pickle, y todos los workers comparten una sola copia física de los nodos.
+
+Uso como comando para comparar contra el .pkl:
+    python modelo_mapeado.py                # 4 workers por formato
+    python modelo_mapeado.py --workers 8
+    python modelo_mapeado.py --exportar-web # activo estático para predecir en el navegador
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_MAPEADO = os.path.join(BASE_DIR, '04_modelado', 'modelo_riesgo_repitencia_mmap')
+RUTA_PICKLE = os.path.join(BASE_DIR, '04_modelado', 'modelo_riesgo_repitencia.pkl')
+RUTA_MODELO_WEB = os.path.join(BASE_DIR, '04_modelado', 'modelo_riesgo_repitencia_web.json')
+RUTA_PREDICTOR_JS = os.path.join(BASE_DIR, '06_despliegue', 'prediccion_local.js')
+FILAS_BLOQUE = 16_384  # filas recorridas a la vez en predict_proba (memoria ~ árboles x bloque)
+
+
+class ModeloMapeado:
+    """
+    Predictor con la misma interfaz que el clasificador de sklearn
+    (classes_, predict, predict_proba) sobre los árboles planos.
+    """
+
+    def __init__(self, directorio=RUTA_MAPEADO, mmap_mode='r'):
+        with open(os.path.join(directorio, 'manifiesto.json'), encoding='utf-8') as f:
+            self.manifiesto = json.load(f)
+        if self.manifiesto.get('formato') != 'arboles_planos':
+            raise ValueError(f"Formato no soportado: {self.manifiesto.get('formato')}")
+
+        arreglos = {
+            clave: np.load(os.path.join(directorio, archivo), mmap_mode=mmap_mode)
+            for clave, archivo in self.manifiesto['arreglos'].items()
+        }
+        self.izquierda = arreglos['izquierda']
+        self.derecha = arreglos['derecha']
+        self.feature = arreglos['feature']
+        self.umbral = arreglos['umbral']
+        self.valor = arreglos['valor']
+        self.raices = arreglos['raices']
+        self.clase_arbol = arreglos['clase_arbol']
+
+        self.tipo = self.manifiesto['tipo']
+        self.classes_ = np.array(self.manifiesto['clases'], dtype=object)
+        self.feature_names_in_ = np.array(self.manifiesto['features'], dtype=object)
+        self.n_features_in_ = self.manifiesto['n_features']
+        self.huella = self.manifiesto['huella']
+
+    def _matriz(self, X):
+        """Entrada como float32, igual que la comparan los árboles de sklearn"""
+        if hasattr(X, 'columns') and len(self.feature_names_in_):
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Se esperaban {self.n_features_in_} features, se recibió {X.shape}")
+        return X
+
+    def apply(self, X):
+        """Índice global de la hoja alcanzada en cada árbol: (n_arboles, n_filas)"""
+        X = self._matriz(X)
+        filas = np.arange(X.shape[0])
+        nodos = np.repeat(self.raices[:, None], X.shape[0], axis=1)
+        # Todos los árboles y filas avanzan un nivel por iteración; las hojas
+        # apuntan a sí mismas, así que las ramas más cortas quedan detenidas
+        for _ in range(self.manifiesto['profundidad_max']):
+            columnas = np.maximum(self.feature[nodos], 0)
+            va_izquierda = X[filas, columnas] <= self.umbral[nodos]
+            nodos = np.where(va_izquierda, self.izquierda[nodos], self.derecha[nodos])
+        return nodos
+
+    def contribuciones(self, X):
+        """
+        Descomposición exacta por caminos (Saabas): el valor de la raíz más, por
+        feature, la suma de los cambios de valor en cada división del camino a la
+        hoja. Se recorren todos los árboles y filas a la vez, como en apply.
+        Retorna (base (clases,), contribuciones (filas, features, clases)) con
+        base + contribuciones.sum(axis=1) = predict_proba en un bosque, o el
+        puntaje bruto de decision_raw en gradient boosting.
+        """
+        X = self._matriz(X)
+        n, n_features = X.shape
+        filas = np.arange(n)
+        nodos = np.repeat(self.raices[:, None], n, axis=1)
+        celda = filas * n_features  # fila * features + feature, aplanado
+        if self.tipo == 'bosque':
+            k = self.valor.shape[1]
+            escala = 1.0 / len(self.raices)
+            base = self.valor[self.raices].mean(axis=0)
+        else:
+            k = int(self.clase_arbol.max()) + 1
+            escala = self.manifiesto['learning_rate']
+            base = np.asarray(self.manifiesto['init_raw'], dtype=np.float64).copy()
+            np.add.at(base, self.clase_arbol, self.valor[self.raices, 0] * escala)
+            clase = np.broadcast_to(self.clase_arbol[:, None], nodos.shape)
+
+        aportes = np.zeros(n * n_features * k)
+        for _ in range(self.manifiesto['profundidad_max']):
+            feature = self.feature[nodos]
+            division = feature >= 0
+            if not division.any():
+                break
+            columnas = np.maximum(feature, 0)
+            va_izquierda = X[filas, columnas] <= self.umbral[nodos]
+            siguientes = np.where(va_izquierda, self.izquierda[nodos], self.derecha[nodos])
+            # Solo las divisiones aportan; en una hoja el nodo no cambia
+            origen, destino = nodos[division], siguientes[division]
+            indice = (celda + feature)[division] * k
+            cambio = (self.valor[destino] - self.valor[origen]) * escala
+            if self.tipo == 'bosque':
+                for c in range(k):
+                    aportes += np.bincount(indice + c, weights=cambio[:, c], minlength=len(aportes))
+            else:
+                aportes += np.bincount(indice + clase[division], weights=cambio[:, 0], minlength=len(aportes))
+            nodos = siguientes
+        return base, aportes.reshape(n, n_features, k)
+
+    def decision_raw(self, X):
+        """Puntaje bruto por clase de GradientBoosting (antes de softmax/sigmoide)"""
+        hojas = self.apply(X)
+        k = int(self.clase_arbol.max()) + 1
+        raw = np.tile(np.asarray(self.manifiesto['init_raw'], dtype=np.float64), (hojas.shape[1], 1))
+        escala = self.manifiesto['learning_rate']
+        # Árbol por árbol, sin materializar (árboles, filas) valores a la vez
+        for hojas_arbol, clase in zip(hojas, self.clase_arbol):
+            raw[:, clase] += self.valor[hojas_arbol, 0] * escala
+        return raw
+
+    def _proba_bloque(self, X):
+        """predict_proba de un bloque de filas ya convertido con _matriz"""
+        if self.tipo == 'bosque':
+            hojas = self.apply(X)
+            proba = np.zeros((X.shape[0], self.valor.shape[1]))
+            for hojas_arbol in hojas:
+                proba += self.valor[hojas_arbol]
+            return proba / len(hojas)
+        raw = self.decision_raw(X)
+        if raw.shape[1] == 1:
+            positiva = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - positiva, positiva])
+        raw = raw - raw.max(axis=1, keepdims=True)
+        exp = np.exp(raw)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        """
+        Probabilidad por clase, en el orden de classes_. Las filas se recorren
+        en bloques de FILAS_BLOQUE, así la memoria auxiliar no crece con la
+        cantidad de filas.
+        """
+        X = self._matriz(X)
+        if len(X) <= FILAS_BLOQUE:
+            return self._proba_bloque(X)
+        return np.concatenate([self._proba_bloque(X[inicio:inicio + FILAS_BLOQUE])
+                               for inicio in range(0, len(X), FILAS_BLOQUE)])
+
+    def predict(self, X):
+        """Clase de mayor probabilidad"""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+def sha256_archivo(ruta):
+    """sha256 del contenido de un archivo, leído por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(2**20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def mapeado_vigente(directorio=RUTA_MAPEADO, ruta_pickle=RUTA_PICKLE):
+    """
+    True si el formato mapeado se exportó desde el pickle actual (sha256 del
+    manifiesto). Sin pickle para comparar, el mapeado es el único artefacto.
+    """
+    if not os.path.exists(ruta_pickle):
+        return True
+    with open(os.path.join(directorio, 'manifiesto.json'), encoding='utf-8') as f:
+        esperado = json.load(f).get('sha256_pickle')
+    return esperado == sha256_archivo(ruta_pickle)
+
+
+def cargar_modelo(formato=None):
+    """
+    Carga el modelo desplegado. Con formato None usa el mapeado si existe y
+    corresponde al pickle actual; si no, el pickle (variable de entorno
+    MODELO_FORMATO = 'mmap' | 'pkl'). Forzar 'mmap' omite la verificación.
+    """
+    formato = formato or os.environ.get('MODELO_FORMATO')
+    if formato == 'mmap':
+        return ModeloMapeado(RUTA_MAPEADO)
+    if formato is None and os.path.isdir(RUTA_MAPEADO):
+        if mapeado_vigente():
+            return ModeloMapeado(RUTA_MAPEADO)
+        warnings.warn(f"{RUTA_MAPEADO} no corresponde a {RUTA_PICKLE} (¿se reentrenó sin exportar?); "
+                      "se usa el pickle", RuntimeWarning)
+    import joblib
+    return joblib.load(RUTA_PICKLE)
+
+
+def _umbral_float32(umbral):
+    """
+    Mayor float32 <= umbral. Como la entrada es float32, x <= umbral equivale a
+    x <= este valor, que se escribe con pocas cifras y el navegador recupera
+    exacto con Math.fround.
+    """
+    umbral32 = umbral.astype(np.float32)
+    mayores = umbral32.astype(np.float64) > umbral
+    umbral32[mayores] = np.nextafter(umbral32[mayores], np.float32(-np.inf))
+    return umbral32
+
+
+def exportar_modelo_web(directorio=RUTA_MAPEADO, ruta=RUTA_MODELO_WEB):
+    """
+    Exporta el modelo mapeado como un JSON compacto para prediccion_local.js:
+    los mismos árboles planos, con umbrales float32 y solo los valores de las
+    hojas (en una hoja, izquierda apunta a su primer valor). Lleva la huella
+    del manifiesto, que la página usa como versión del caché.
+    """
+    modelo = ModeloMapeado(directorio, mmap_mode=None)
+    hoja = modelo.feature < 0
+    k = modelo.valor.shape[1]
+    posicion_hoja = np.cumsum(hoja) - 1
+    contenido = {
+        'formato': 'arboles_web',
+        'version': 1,
+        'huella': modelo.huella,
+        'tipo': modelo.tipo,
+        'clases': modelo.classes_.tolist(),
+        'features': modelo.feature_names_in_.tolist(),
+        'n_clases_valor': k,
+        'raices': modelo.raices.tolist(),
+        'feature': modelo.feature.tolist(),
+        # str de un float32 es su representación más corta
+        'umbral': [0 if h else float(str(u)) for h, u in zip(hoja.tolist(), _umbral_float32(modelo.umbral))],
+        'izquierda': np.where(hoja, posicion_hoja * k, modelo.izquierda).tolist(),
+        'derecha': np.where(hoja, 0, modelo.derecha).tolist(),
+        'valor': modelo.valor[hoja].ravel().tolist(),
+    }
+    if modelo.tipo == 'gradient_boosting':
+        contenido['clase_arbol'] = modelo.clase_arbol.tolist()
+        contenido['learning_rate'] = modelo.manifiesto['learning_rate']
+        contenido['init_raw'] = modelo.manifiesto['init_raw']
+
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f, separators=(',', ':'))
+    os.replace(temporal, ruta)
+    print(f"OK Modelo web guardado en {ruta} ({os.path.getsize(ruta) / 1024:.1f} KB, huella {modelo.huella})")
+    return ruta
+
+
+def huella_modelo_web(ruta=RUTA_MODELO_WEB):
+    """Huella del activo web exportado, o None si no existe"""
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f).get('huella')
+
+
+def _worker(formato):
+    """Carga el modelo en un proceso nuevo y reporta tiempos y memoria"""
+    import psutil
+
+    inicio = time.perf_counter()
+    modelo = cargar_modelo(formato)
+    carga = time.perf_counter() - inicio
+    X = np.array([[5.0, 4.0, 6.0, 3, 1, 0.8, 4.0, 6.0]], dtype=np.float32)
+    inicio = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # el pickle avisa por la falta de nombres de columna
+        modelo.predict_proba(X)
+    primera = time.perf_counter() - inicio
+    # Tocar todos los nodos para que el RSS refleje el modelo completo
+    if isinstance(modelo, ModeloMapeado):
+        for arreglo in (modelo.izquierda, modelo.derecha, modelo.feature, modelo.umbral, modelo.valor):
+            float(np.asarray(arreglo).sum())
+
+    memoria = psutil.Process().memory_full_info()
+    print(json.dumps({
+        'carga_s': carga,
+        'primera_prediccion_s': primera,
+        'rss_mb': memoria.rss / 2**20,
+        'uss_mb': memoria.uss / 2**20,
+        'pss_mb': getattr(memoria, 'pss', memoria.uss) / 2**20,
+    }), flush=True)
+    sys.stdin.read()  # mantenerse vivo hasta que el padre mida a todos
+
+
+def comparar_formatos(n_workers=4):
+    """Arranca N workers por formato a la vez y compara arranque en frío y memoria"""
+    resultados = {}
+    for formato in ('pkl', 'mmap'):
+        procesos, mediciones = [], []
+        inicio = time.perf_counter()
+        for _ in range(n_workers):
+            procesos.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--worker', formato],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+            ))
+        for proceso in procesos:
+            mediciones.append(json.loads(proceso.stdout.readline()))
+        arranque = time.perf_counter() - inicio
+        for proceso in procesos:
+            proceso.communicate('')
+        resultados[formato] = {
+            'arranque_total_s': arranque,
+            'carga_s': np.mean([m['carga_s'] for m in mediciones]),
+            'primera_prediccion_s': np.mean([m['primera_prediccion_s'] for m in mediciones]),
+            'rss_mb': np.mean([m['rss_mb'] for m in mediciones]),
+            'uss_mb': np.mean([m['uss_mb'] for m in mediciones]),
+            'pss_total_mb': np.sum([m['pss_mb'] for m in mediciones]),
+        }
+
+    print(f"\n{'Métrica':<28} {'pickle':>12} {'mapeado':>12}")
+    for metrica in resultados['pkl']:
+        print(f"{metrica:<28} {resultados['pkl'][metrica]:>12.4f} {resultados['mmap'][metrica]:>12.4f}")
+    print(f"\n({n_workers} workers por formato; uss = memoria privada por worker, "
+          f"pss_total = memoria física total repartida)")
+    return resultados
+
+
+def _features_aleatorias(n, semilla):
+    """Notas aleatorias de 1 a 3 por estudiante y sus features como las calcula la API"""
+    import pandas as pd
+
+    rng = np.random.default_rng(semilla)
+    notas = np.round(rng.uniform(1.0, 7.0, (n, 3)), 1)
+    cantidad = rng.integers(1, 4, n)
+    notas[cantidad < 2, 1] = np.nan
+    notas[cantidad < 3, 2] = np.nan
+    validas = np.where(np.isnan(notas), 0.0, notas)
+    ultima = notas[np.arange(n), cantidad - 1]
+    X = pd.DataFrame({
+        'nota_1': validas[:, 0], 'nota_2': validas[:, 1], 'nota_3': validas[:, 2],
+        'cantidad_notas': cantidad,
+        'tendencia': np.where(cantidad >= 2, np.sign(ultima - notas[:, 0]), 0),
+        'variabilidad': np.where(cantidad >= 2, np.nanstd(notas, axis=1), 0.0),
+        'nota_min': np.nanmin(notas, axis=1),
+        'nota_max': np.nanmax(notas, axis=1),
+    }).astype(np.float32)
+    listas = [fila[:c].tolist() for fila, c in zip(notas, cantidad)]
+    return listas, X
+
+
+def verificar_paridad(n=20000, semilla=42):
+    """Compara predict_proba del modelo mapeado contra el pickle sobre notas aleatorias"""
+    import joblib
+
+    _, X = _features_aleatorias(n, semilla)
+    esperado = joblib.load(RUTA_PICKLE).predict_proba(X)
+    obtenido = ModeloMapeado(RUTA_MAPEADO).predict_proba(X)
+    diferencia = float(np.abs(esperado - obtenido).max())
+    print(f"Paridad con el pickle sobre {n:,} filas: diferencia máxima {diferencia:.2e}")
+    return diferencia < 1e-9
+
+
+_SCRIPT_NODE = """
+const fs = require('fs');
+const { predecirLocal } = require(process.argv[1]);
+const modelo = JSON.parse(fs.readFileSync(process.argv[2], 'utf8'));
+const notas = JSON.parse(fs.readFileSync(0, 'utf8'));
+const salida = notas.map(n => { const r = predecirLocal(modelo, n); return modelo.clases.map(c => r.probabilidades[c]); });
+process.stdout.write(JSON.stringify(salida));
+"""
+
+
+def verificar_paridad_web(n=20000, semilla=7, ruta=RUTA_MODELO_WEB):
+    """
+    Ejecuta prediccion_local.js en node sobre el activo web y lo compara con el
+    modelo mapeado que usa la API: features calculadas en JS a partir de las
+    notas, misma clase predicha y probabilidades iguales.
+    """
+    listas, X = _features_aleatorias(n, semilla)
+    esperado = ModeloMapeado(RUTA_MAPEADO).predict_proba(X)
+    try:
+        proceso = subprocess.run(['node', '-e', _SCRIPT_NODE, RUTA_PREDICTOR_JS, ruta],
+                                 input=json.dumps(listas), capture_output=True, text=True, check=True)
+    except FileNotFoundError:
+        print("⚠ node no está instalado; no se verificó la paridad del modelo web")
+        return None
+    obtenido = np.asarray(json.loads(proceso.stdout))
+    diferencia = float(np.abs(esperado - obtenido).max())
+    distintas = int((esperado.argmax(axis=1) != obtenido.argmax(axis=1)).sum())
+    print(f"Paridad del modelo web sobre {n:,} estudiantes: diferencia máxima {diferencia:.2e}, "
+          f"clases distintas {distintas}")
+    return diferencia < 1e-9 and distintas == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara el modelo mapeado contra el pickle')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--exportar-web', action='store_true',
+                        help='exporta el activo para predecir en el navegador y verifica su paridad')
+    parser.add_argument('--worker', choices=['pkl', 'mmap'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker)
+    elif args.exportar_web:
+        exportar_modelo_web()
+        if verificar_paridad_web() is False:
+            sys.exit(1)
+    else:
+        verificar_paridad()
+        comparar_formatos(args.workers)
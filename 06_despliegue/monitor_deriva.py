@@ -0,0 +1,175 @@
+"""
+Monitor de Deriva
+Mantiene en memoria constante las distribuciones de lo que recibe la API
+(notas, features derivadas y clases predichas) y las compara contra el perfil
+de referencia exportado por la fase de preparación usando PSI.
+
+Cada registro es O(1): una búsqueda binaria sobre bordes fijos por variable
+continua y un incremento de contador por variable discreta.
+
+Uso como comando para medir el costo por registro:
+    python monitor_deriva.py
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_PERFIL_REFERENCIA = os.path.join(BASE_DIR, '03_preparacion_datos', 'perfil_referencia.json')
+
+# Umbrales habituales del Population Stability Index
+UMBRAL_PSI_MODERADO = 0.10
+UMBRAL_PSI_ALTO = 0.25
+EPSILON_PSI = 1e-4  # evita log(0) en intervalos vacíos
+MINIMO_OBSERVACIONES = 100  # bajo esto el PSI se informa pero no se evalúa
+
+
+def _indice(bordes, valor):
+    """Intervalo de valor en bordes (como np.histogram); fuera de rango cae en los extremos"""
+    return min(max(bisect.bisect_right(bordes, valor) - 1, 0), len(bordes) - 2)
+
+
+def psi(referencia, actual):
+    """Population Stability Index entre dos vectores de conteos alineados"""
+    total_ref = sum(referencia) or 1
+    total_act = sum(actual) or 1
+    valor = 0.0
+    for r, a in zip(referencia, actual):
+        p_ref = max(r / total_ref, EPSILON_PSI)
+        p_act = max(a / total_act, EPSILON_PSI)
+        valor += (p_act - p_ref) * math.log(p_act / p_ref)
+    return valor
+
+
+def nivel_deriva(valor, n):
+    """Clasificación del PSI según los umbrales"""
+    if n < MINIMO_OBSERVACIONES:
+        return 'insuficiente'
+    if valor >= UMBRAL_PSI_ALTO:
+        return 'alta'
+    if valor >= UMBRAL_PSI_MODERADO:
+        return 'moderada'
+    return 'estable'
+
+
+class MonitorDeriva:
+    """Histogramas de intervalos fijos y conteos por categoría, seguros entre hilos"""
+
+    def __init__(self, referencia):
+        self.referencia = referencia
+        self._bordes = {col: h['bordes'] for col, h in referencia['histogramas'].items()}
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    @classmethod
+    def desde_archivo(cls, ruta=RUTA_PERFIL_REFERENCIA):
+        with open(ruta, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def reiniciar(self):
+        """Descarta lo observado (p. ej. tras reentrenar el modelo)"""
+        with self._lock:
+            self.n = 0
+            self.inicio = time.time()
+            self.histogramas = {col: [0] * (len(b) - 1) for col, b in self._bordes.items()}
+            self.categorias = {col: dict.fromkeys(conteos, 0)
+                               for col, conteos in self.referencia['categorias'].items()}
+
+    def registrar(self, features, clase):
+        """Registra una predicción: features calculadas por la API y clase predicha"""
+        cantidad = int(features['cantidad_notas'])
+        # Índices fuera del lock: el tramo protegido son solo los incrementos
+        indices = [
+            (col, _indice(bordes, float(features[col])))
+            for col, bordes in self._bordes.items()
+            if not (col[-1].isdigit() and int(col[-1]) > cantidad)  # nota ausente
+        ]
+        claves = (('cantidad_notas', str(cantidad)), ('tendencia', str(int(features['tendencia']))),
+                  ('riesgo', str(clase)))
+        with self._lock:
+            self.n += 1
+            for col, i in indices:
+                self.histogramas[col][i] += 1
+            for col, clave in claves:
+                conteos = self.categorias[col]
+                conteos[clave] = conteos.get(clave, 0) + 1
+
+    def registrar_lote(self, X, clases):
+        """Registra muchas predicciones a la vez (X con las columnas de las features)"""
+        cantidad = np.asarray(X['cantidad_notas']).astype(int)
+        sumas = {}
+        for col, bordes in self._bordes.items():
+            valores = np.asarray(X[col], dtype=np.float64)
+            if col[-1].isdigit():
+                valores = valores[cantidad >= int(col[-1])]
+            indices = np.clip(np.searchsorted(bordes, valores, side='right') - 1, 0, len(bordes) - 2)
+            sumas[col] = np.bincount(indices, minlength=len(bordes) - 1).tolist()
+        categorias = {
+            'cantidad_notas': np.unique(cantidad.astype(str), return_counts=True),
+            'tendencia': np.unique(np.asarray(X['tendencia']).astype(int).astype(str), return_counts=True),
+            'riesgo': np.unique(np.asarray(clases).astype(str), return_counts=True),
+        }
+        with self._lock:
+            self.n += len(cantidad)
+            for col, conteos in sumas.items():
+                self.histogramas[col] = [a + b for a, b in zip(self.histogramas[col], conteos)]
+            for col, (claves, conteos) in categorias.items():
+                for clave, conteo in zip(claves.tolist(), conteos.tolist()):
+                    self.categorias[col][clave] = self.categorias[col].get(clave, 0) + conteo
+
+    def reporte(self):
+        """PSI por variable contra la referencia y nivel de deriva global"""
+        with self._lock:
+            n = self.n
+            histogramas = {col: list(c) for col, c in self.histogramas.items()}
+            categorias = {col: dict(c) for col, c in self.categorias.items()}
+
+        variables = {}
+        for col, conteos in histogramas.items():
+            valor = psi(self.referencia['histogramas'][col]['conteos'], conteos)
+            variables[col] = {'psi': round(valor, 4), 'nivel': nivel_deriva(valor, sum(conteos)),
+                              'conteos': conteos}
+        for col, conteos in categorias.items():
+            claves = sorted(set(conteos) | set(self.referencia['categorias'][col]))
+            referencia = [self.referencia['categorias'][col].get(k, 0) for k in claves]
+            actual = [conteos.get(k, 0) for k in claves]
+            valor = psi(referencia, actual)
+            variables[col] = {'psi': round(valor, 4), 'nivel': nivel_deriva(valor, sum(actual)),
+                              'conteos': dict(zip(claves, actual))}
+
+        niveles = [v['nivel'] for v in variables.values()]
+        global_ = next((nivel for nivel in ('alta', 'moderada', 'estable', 'insuficiente') if nivel in niveles),
+                       'insuficiente')
+        return {
+            'observaciones': n,
+            'desde': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.inicio)),
+            'referencia_n': self.referencia['n'],
+            'deriva': global_,
+            'umbrales_psi': {'moderada': UMBRAL_PSI_MODERADO, 'alta': UMBRAL_PSI_ALTO},
+            'variables': variables,
+        }
+
+
+if __name__ == "__main__":
+    referencia = {
+        'n': 1,
+        'histogramas': {col: {'bordes': [1.0 + 0.5 * i for i in range(13)], 'conteos': [1] * 12}
+                        for col in ('nota_1', 'nota_2', 'nota_3', 'nota_min', 'nota_max')},
+        'categorias': {'cantidad_notas': {'1': 1, '2': 1, '3': 1}, 'tendencia': {'-1': 1, '0': 1, '1': 1},
+                       'riesgo': {'alto': 1, 'bajo': 1, 'medio': 1}},
+    }
+    monitor = MonitorDeriva(referencia)
+    features = {'nota_1': 5.0, 'nota_2': 4.0, 'nota_3': 6.0, 'cantidad_notas': 3, 'tendencia': 1,
+                'variabilidad': 0.8, 'nota_min': 4.0, 'nota_max': 6.0}
+    repeticiones = 100_000
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        monitor.registrar(features, 'bajo')
+    costo = (time.perf_counter() - inicio) / repeticiones
+    print(f"Costo por registro: {costo * 1e6:.2f} µs ({repeticiones:,} registros)")
@@ -0,0 +1,140 @@
+/*
+ * Predicción local en el navegador
+ * Recorre los árboles exportados por modelo_mapeado.py --exportar-web
+ * (modelo_riesgo_repitencia_web.json) con las mismas features que
+ * calcular_features de app.py. Las features y los umbrales se comparan como
+ * float32 (Math.fround), igual que los árboles de sklearn, así que el
+ * resultado coincide con el de la API.
+ *
+ * En la página el modelo se descarga una vez y se guarda en localStorage con
+ * su huella; si la API informa otra huella, o no hay activo, se usa la API.
+ * Cada predicción local se informa a /predict/local con sendBeacon, así la
+ * auditoría y el monitor de deriva de la API también la registran.
+ * En node se puede usar con require() para verificar la paridad.
+ */
+
+const CLAVE_CACHE_MODELO = 'modelo_riesgo_repitencia_web';
+
+function calcularFeatures(notas) {
+    // Igual que calcular_features: hasta 3 notas, ausentes en 0
+    const validas = notas.slice(0, 3);
+    const cantidad = validas.length;
+    let suma = 0;
+    for (const nota of validas) suma += nota;
+    const promedio = cantidad ? suma / cantidad : 0;
+
+    let tendencia = 0;
+    let variabilidad = 0;
+    if (cantidad >= 2) {
+        const primera = validas[0], ultima = validas[cantidad - 1];
+        tendencia = ultima > primera ? 1 : ultima < primera ? -1 : 0;
+        // np.std poblacional
+        let cuadrados = 0;
+        for (const nota of validas) cuadrados += (nota - promedio) * (nota - promedio);
+        variabilidad = Math.sqrt(cuadrados / cantidad);
+    }
+
+    return {
+        nota_1: cantidad > 0 ? validas[0] : 0,
+        nota_2: cantidad > 1 ? validas[1] : 0,
+        nota_3: cantidad > 2 ? validas[2] : 0,
+        cantidad_notas: cantidad,
+        tendencia: tendencia,
+        variabilidad: variabilidad,
+        nota_min: cantidad ? Math.min(...validas) : 0,
+        nota_max: cantidad ? Math.max(...validas) : 0,
+        _promedio_calculado: promedio
+    };
+}
+
+function hojaArbol(modelo, raiz, x) {
+    let nodo = raiz;
+    while (modelo.feature[nodo] >= 0) {
+        nodo = x[modelo.feature[nodo]] <= Math.fround(modelo.umbral[nodo])
+            ? modelo.izquierda[nodo] : modelo.derecha[nodo];
+    }
+    // En una hoja, izquierda es la posición de sus valores
+    return modelo.izquierda[nodo];
+}
+
+function predecirProbabilidades(modelo, x) {
+    const k = modelo.n_clases_valor;
+    if (modelo.tipo === 'bosque') {
+        const suma = new Array(k).fill(0);
+        for (const raiz of modelo.raices) {
+            const inicio = hojaArbol(modelo, raiz, x);
+            for (let c = 0; c < k; c++) suma[c] += modelo.valor[inicio + c];
+        }
+        return suma.map(v => v / modelo.raices.length);
+    }
+    // gradient_boosting: puntaje bruto por clase y luego sigmoide/softmax
+    const raw = modelo.init_raw.slice();
+    modelo.raices.forEach((raiz, i) => {
+        raw[modelo.clase_arbol[i]] += modelo.valor[hojaArbol(modelo, raiz, x)] * modelo.learning_rate;
+    });
+    if (raw.length === 1) {
+        const positiva = 1 / (1 + Math.exp(-raw[0]));
+        return [1 - positiva, positiva];
+    }
+    const maximo = Math.max(...raw);
+    const exp = raw.map(v => Math.exp(v - maximo));
+    const total = exp.reduce((a, b) => a + b, 0);
+    return exp.map(v => v / total);
+}
+
+function predecirLocal(modelo, notas) {
+    // Respuesta con la forma de /predict
+    const features = calcularFeatures(notas);
+    const x = modelo.features.map(nombre => Math.fround(features[nombre]));
+    const probabilidades = predecirProbabilidades(modelo, x);
+
+    let mejor = 0;
+    probabilidades.forEach((p, i) => { if (p > probabilidades[mejor]) mejor = i; });
+    const probDict = {};
+    modelo.clases.forEach((clase, i) => { probDict[clase] = probabilidades[i]; });
+
+    return {
+        promedio: Math.round(features._promedio_calculado * 100) / 100,
+        riesgo: modelo.clases[mejor],
+        probabilidades: probDict,
+        cantidad_notas: features.cantidad_notas,
+        tendencia: features.tendencia > 0 ? 'mejora' : features.tendencia < 0 ? 'empeora' : 'estable',
+        local: true
+    };
+}
+
+async function cargarModeloLocal(apiUrl) {
+    // Modelo vigente según la API, desde localStorage o descargado; null si no hay
+    try {
+        const respuesta = await fetch(`${apiUrl}/modelo/version`);
+        const version = await respuesta.json();
+        if (!respuesta.ok || !version.disponible) return null;
+
+        const guardado = JSON.parse(localStorage.getItem(CLAVE_CACHE_MODELO) || 'null');
+        if (guardado && guardado.huella === version.huella) return guardado;
+
+        const modelo = await (await fetch(`${apiUrl}${version.url}`)).json();
+        if (modelo.huella !== version.huella) return null;
+        try {
+            localStorage.setItem(CLAVE_CACHE_MODELO, JSON.stringify(modelo));
+        } catch (e) {
+            // Sin espacio en localStorage: se usa solo en esta página
+        }
+        return modelo;
+    } catch (e) {
+        return null;
+    }
+}
+
+function registrarPrediccionLocal(apiUrl, notas) {
+    // Envía las notas de la predicción local a la API para la auditoría y el
+    // monitor de deriva, sin esperar respuesta; la API recalcula la clase con
+    // su modelo. text/plain evita la verificación de CORS
+    if (typeof navigator === 'undefined' || !navigator.sendBeacon) return false;
+    const cuerpo = JSON.stringify({ notas: notas });
+    return navigator.sendBeacon(`${apiUrl}/predict/local`, new Blob([cuerpo], { type: 'text/plain' }));
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = { calcularFeatures, predecirProbabilidades, predecirLocal };
+}
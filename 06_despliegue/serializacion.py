@@ -0,0 +1,190 @@
+"""
+Serialización Rápida de Lotes
+Arma la respuesta JSON de /predict/batch directamente desde los arreglos de
+NumPy, sin construir un dict por estudiante ni recorrerlos con json.dumps.
+
+Las partes fijas de cada resultado (llaves, nombres de clase, separadores e
+indentación) se obtienen una vez serializando con el mismo proveedor JSON de
+Flask un resultado con marcadores, y quedan como un formato '%s' por fila.
+Los valores se codifican por columna y cada valor distinto una sola vez: las
+probabilidades de un bosque y los promedios de notas con 1 decimal toman
+pocos valores (~100 por columna en 100.000 estudiantes), y repr es lo mismo
+que usa json para un float. La clase es un fragmento ya codificado. El texto
+es idéntico byte a byte al de jsonify, en modo compacto o indentado.
+
+Uso como comando para medir contra jsonify:
+    python serializacion.py              # 100.000 filas
+    python serializacion.py --filas 500000
+"""
+
+import argparse
+import gzip
+import time
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+import numpy as np
+
+MINIMO_GZIP = 1024   # bytes; respuestas más chicas no se comprimen
+NIVEL_GZIP = 1       # el más rápido; niveles mayores apenas reducen más este JSON
+
+_MARCA_ID = '\x00id'
+_MARCA_TOTAL = '\x00total'
+_MARCA_PROMEDIO = '\x00promedio'
+_MARCA_RIESGO = '\x00riesgo'
+
+
+def argumentos_json(app):
+    """Argumentos que usa jsonify según el modo de la app (indentado en debug)"""
+    if (app.json.compact is None and app.debug) or app.json.compact is False:
+        return {'indent': 2}
+    return {'separators': (',', ':')}
+
+
+def _marca_probabilidad(i):
+    return f'\x00prob{i}'
+
+
+def _fila_marcada(marca_id, clases):
+    return {
+        'id': marca_id,
+        'promedio': _MARCA_PROMEDIO,
+        'riesgo': _MARCA_RIESGO,
+        'probabilidades': {clase: _marca_probabilidad(i) for i, clase in enumerate(clases)},
+    }
+
+
+class PlantillaLote:
+    """Partes fijas de la respuesta {'resultados': [...], 'total': n} para un proveedor JSON"""
+
+    def __init__(self, dumps, clases):
+        self.dumps = dumps
+        self.clases = list(clases)
+        self.ascii = '\\u0000' in dumps('\x00')
+
+        una = dumps({'resultados': [_fila_marcada(_MARCA_ID, self.clases)], 'total': _MARCA_TOTAL})
+        dos = dumps({'resultados': [_fila_marcada(_MARCA_ID, self.clases)] * 2, 'total': _MARCA_TOTAL})
+        # La lista es el único '[' y ']' del documento: las filas van entre ellos
+        apertura = una.index('[') + 1
+        inicio = apertura + len(una[apertura:]) - len(una[apertura:].lstrip())
+        fin = len(una[:una.index(']', inicio)].rstrip())
+        fila = una[inicio:fin]
+        self.cabecera = una[:inicio]
+        self.pie = una[fin:].replace(dumps(_MARCA_TOTAL), '%d')
+        self.separador = dos[fin:fin + len(dos) - len(una) - len(fila)]
+
+        # Formato de una fila y orden en que aparecen sus valores (depende de sort_keys)
+        marcas = {dumps(_MARCA_ID): 'id', dumps(_MARCA_PROMEDIO): 'promedio', dumps(_MARCA_RIESGO): 'riesgo'}
+        marcas.update({dumps(_marca_probabilidad(i)): i for i in range(len(self.clases))})
+        self.orden = sorted(marcas.values(), key=lambda campo: fila.index(
+            next(marca for marca, c in marcas.items() if c == campo)))
+        self.formato_fila = fila.replace('%', '%%')
+        for marca in marcas:
+            self.formato_fila = self.formato_fila.replace(marca, '%s')
+        self.riesgos = np.asarray([dumps(clase) for clase in self.clases], dtype=object)
+
+    def codificar_id(self, valor):
+        """Texto JSON de un id escalar; None si requiere el camino general"""
+        tipo = type(valor)
+        if tipo is int:
+            return int.__repr__(valor)
+        if tipo is str:
+            return encode_basestring_ascii(valor) if self.ascii else encode_basestring(valor)
+        if valor is None or tipo is bool or tipo is float:
+            return self.dumps(valor)
+        return None
+
+
+def _textos_float(valores):
+    """repr de cada valor (como json.dumps), calculado una vez por valor distinto"""
+    distintos, inversa = np.unique(np.asarray(valores, dtype=np.float64), return_inverse=True)
+    textos = np.asarray(list(map(float.__repr__, distintos.tolist())), dtype=object)
+    return textos[inversa].tolist()
+
+
+def serializar_lote(plantilla, ids, promedios, probabilidades):
+    """
+    Texto JSON (con el salto de línea final de jsonify) de los resultados del
+    lote, o None si algún id no es un escalar JSON y hay que usar jsonify.
+    promedios ya redondeados; probabilidades (n, clases) en el orden de la plantilla.
+    """
+    ids_json = [plantilla.codificar_id(valor) for valor in ids]
+    if None in ids_json:
+        return None
+    n = len(ids_json)
+    if n == 0:
+        return plantilla.dumps({'resultados': [], 'total': 0}) + '\n'
+
+    probabilidades = np.asarray(probabilidades, dtype=np.float64)
+    columnas = {
+        'id': ids_json,
+        'promedio': _textos_float(promedios),
+        'riesgo': plantilla.riesgos[probabilidades.argmax(axis=1)].tolist(),
+    }
+    for i in range(probabilidades.shape[1]):
+        columnas[i] = _textos_float(probabilidades[:, i])
+
+    filas = plantilla.separador.join(map(plantilla.formato_fila.__mod__,
+                                         zip(*[columnas[campo] for campo in plantilla.orden])))
+    return plantilla.cabecera + filas + plantilla.pie % n + '\n'
+
+
+def comprimir(texto, nivel=NIVEL_GZIP):
+    """gzip determinista (sin fecha en el encabezado)"""
+    return gzip.compress(texto.encode('utf-8'), compresslevel=nivel, mtime=0)
+
+
+def benchmark(n=100_000, semilla=42):
+    """Compara dicts + jsonify contra la serialización por plantillas para n filas"""
+    from flask import Flask, jsonify
+
+    rng = np.random.default_rng(semilla)
+    clases = ['alto', 'bajo', 'medio']
+    notas = np.round(rng.uniform(1.0, 7.0, (n, 3)), 1)
+    promedios = np.round(notas.mean(axis=1), 2)
+    # Probabilidades de bosque: pocos valores distintos, como las del modelo
+    base = rng.dirichlet(np.ones(3), 2_000)
+    probabilidades = base[rng.integers(0, len(base), n)]
+    ids = list(range(n))
+
+    app = Flask(__name__)
+    resultados = {}
+    for modo, debug in (('compacto', False), ('indentado', True)):
+        app.debug = debug
+        with app.app_context():
+            inicio = time.perf_counter()
+            clases_np = np.asarray(clases, dtype=object)[probabilidades.argmax(axis=1)]
+            filas = [{'id': ids[i], 'promedio': round(float(promedios[i]), 2), 'riesgo': clases_np[i],
+                      'probabilidades': dict(zip(clases, probabilidades[i].tolist()))} for i in range(n)]
+            esperado = jsonify({'resultados': filas, 'total': n}).get_data(as_text=True)
+            t_jsonify = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            argumentos = argumentos_json(app)
+            plantilla = PlantillaLote(lambda obj: app.json.dumps(obj, **argumentos), clases)
+            obtenido = serializar_lote(plantilla, ids, promedios, probabilidades)
+            t_rapido = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            comprimido = comprimir(obtenido)
+            t_gzip = time.perf_counter() - inicio
+        resultados[modo] = {
+            'jsonify_s': t_jsonify, 'plantillas_s': t_rapido, 'gzip_s': t_gzip,
+            'bytes': len(obtenido.encode('utf-8')), 'bytes_gzip': len(comprimido),
+            'identico': obtenido == esperado,
+        }
+
+    print(f"\n{'Modo':<12} {'jsonify (s)':>12} {'plantillas (s)':>15} {'aceleración':>12} "
+          f"{'gzip (s)':>10} {'MB':>8} {'MB gzip':>9} {'idéntico':>9}")
+    for modo, r in resultados.items():
+        print(f"{modo:<12} {r['jsonify_s']:>12.3f} {r['plantillas_s']:>15.3f} "
+              f"{r['jsonify_s'] / r['plantillas_s']:>11.1f}x {r['gzip_s']:>10.3f} "
+              f"{r['bytes'] / 2**20:>8.2f} {r['bytes_gzip'] / 2**20:>9.2f} {str(r['identico']):>9}")
+    print(f"\n({n:,} filas)")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara la serialización por plantillas contra jsonify')
+    parser.add_argument('--filas', type=int, default=100_000)
+    args = parser.parse_args()
+    benchmark(args.filas)
@@ -4,6 +4,7 @@ Script de prueba para la API de predicción
 
 import requests
 import json
+import time
 
 API_URL = "http://localhost:5000"
 
@@ -17,6 +18,25 @@ def test_health():
     print(f"Response: {json.dumps(response.json(), indent=2)}")
     print()
 
+def test_ready(espera_maxima_s=60):
+    """Espera a que el modelo esté cargado y calentado (/ready en 200) y muestra el arranque"""
+    print("="*50)
+    print("Test: Readiness")
+    print("="*50)
+    limite = time.time() + espera_maxima_s
+    response = requests.get(f"{API_URL}/ready")
+    while response.status_code == 503 and time.time() < limite:
+        print(f"  aún no lista (etapa: {response.json()['etapa_actual']})")
+        time.sleep(float(response.headers.get('Retry-After', 1)))
+        response = requests.get(f"{API_URL}/ready")
+    print(f"Status: {response.status_code}")
+    result = response.json()
+    for etapa in result['etapas']:
+        print(f"  {etapa['etapa']:<20} {etapa['duracion_s']:>8.3f} s  (t = {etapa['t_s']:.3f} s)")
+    if result['error']:
+        print(f"Error: {result['error']}")
+    print()
+
 def test_predict_1_nota():
     """Prueba predicción con 1 nota"""
     print("="*50)
@@ -104,6 +124,153 @@ def test_batch():
     print(f"Response: {json.dumps(response.json(), indent=2)}")
     print()
 
+def test_batch_grande():
+    """Prueba un lote grande con respuesta comprimida"""
+    print("="*50)
+    print("Test: Lote de 20.000 estudiantes (gzip)")
+    print("="*50)
+    data = {"estudiantes": [{"id": i, "notas": [1.0 + (i % 61) / 10, 1.0 + (i % 37) / 6]} for i in range(20000)]}
+    inicio = time.time()
+    response = requests.post(f"{API_URL}/predict/batch", json=data, headers={"Accept-Encoding": "gzip"})
+    print(f"Status: {response.status_code} en {time.time() - inicio:.2f} s")
+    print(f"Content-Encoding: {response.headers.get('Content-Encoding')}")
+    print(f"Bytes recibidos: {int(response.headers['Content-Length']):,}, JSON: {len(response.content):,}")
+    print(f"Total: {response.json()['total']}")
+    print()
+
+def test_explain():
+    """Prueba las explicaciones por feature, individual y en lote"""
+    print("="*50)
+    print("Test: Explicación (2.0, 3.5, 3.0)")
+    print("="*50)
+    response = requests.post(f"{API_URL}/explain", json={"notas": [2.0, 3.5, 3.0]})
+    print(f"Status: {response.status_code}")
+    result = response.json()
+    if response.status_code == 200:
+        print(f"Riesgo: {result['riesgo']} (base {result['base']:.4f} en {result['escala']})")
+        for feature, aporte in sorted(result['contribuciones'].items(), key=lambda x: -abs(x[1])):
+            print(f"  {feature}: {aporte:+.4f}")
+        print(f"Base + contribuciones: {result['base'] + sum(result['contribuciones'].values()):.4f}")
+    else:
+        print(f"Response: {json.dumps(result, indent=2)}")
+    
+    data = {"estudiantes": [{"id": i, "notas": [1.0 + (i % 61) / 10, 1.0 + (i % 37) / 6]} for i in range(10000)]}
+    inicio = time.time()
+    response = requests.post(f"{API_URL}/explain/batch", json=data)
+    print(f"Lote de 10.000: status {response.status_code} en {time.time() - inicio:.2f} s")
+    print()
+
+def test_estudiantes():
+    """Prueba el puntaje con estado: notas de a una y sincronización en lote"""
+    print("="*50)
+    print("Test: Estado por estudiante")
+    print("="*50)
+    for nota in [3.0, 3.5, 5.0, 6.0]:
+        response = requests.post(f"{API_URL}/estudiantes/test-1/notas", json={"nota": nota})
+        result = response.json()
+        print(f"  + {nota}: {result['cantidad_notas']} notas, promedio {result['promedio']}, riesgo {result['riesgo']}")
+    
+    data = {"estudiantes": [
+        {"id": "test-1", "notas": [3.0, 3.5, 5.0, 6.0]},
+        {"id": "test-2", "notas": [4.0, 4.5]}
+    ]}
+    response = requests.post(f"{API_URL}/estudiantes/batch", json=data)
+    print(f"Status: {response.status_code}")
+    print(f"Recalculados: {response.json()['recalculados']} de {response.json()['total']}")
+    print()
+
+def test_jobs():
+    """Prueba un trabajo asíncrono: creación, progreso y resultados paginados"""
+    print("="*50)
+    print("Test: Trabajo asíncrono")
+    print("="*50)
+    estudiantes = [{"id": i, "notas": [3.0 + (i % 40) / 10, 4.5]} for i in range(12000)]
+    response = requests.post(f"{API_URL}/jobs", json={"estudiantes": estudiantes})
+    print(f"Status: {response.status_code}")
+    trabajo = response.json()
+    print(f"Trabajo: {trabajo['id']} ({trabajo['total']} estudiantes)")
+    
+    for _ in range(60):
+        estado = requests.get(f"{API_URL}{trabajo['url']}", params={"por_pagina": 1}).json()
+        print(f"  {estado['estado']}: {estado['procesados']}/{estado['total']}")
+        if estado['estado'] in ('completado', 'error'):
+            break
+        time.sleep(0.5)
+    
+    pagina = requests.get(f"{API_URL}{trabajo['url']}", params={"pagina": 2, "por_pagina": 5000}).json()
+    print(f"Página 2 de {pagina['paginas']}: {len(pagina['resultados'])} resultados")
+    print(f"Primer resultado: {json.dumps(pagina['resultados'][0])}")
+    print()
+
+def test_drift():
+    """Prueba el reporte de deriva (después de las predicciones anteriores)"""
+    print("="*50)
+    print("Test: Monitor de deriva")
+    print("="*50)
+    response = requests.get(f"{API_URL}/drift")
+    print(f"Status: {response.status_code}")
+    result = response.json()
+    if response.status_code == 200:
+        print(f"Observaciones: {result['observaciones']}")
+        print(f"Deriva global: {result['deriva']}")
+        for variable, detalle in result['variables'].items():
+            print(f"  {variable}: PSI {detalle['psi']} ({detalle['nivel']})")
+    else:
+        print(f"Response: {json.dumps(result, indent=2)}")
+    print()
+
+def test_agregados():
+    """Prueba los agregados por colegio y curso (reenviar el curso no lo cuenta dos veces)"""
+    print("="*50)
+    print("Test: Agregados por colegio y curso")
+    print("="*50)
+    data = {
+        "estudiantes": [
+            {"id": "agr-1", "notas": [2.0, 2.5], "colegio": "prueba", "curso": "1A"},
+            {"id": "agr-2", "notas": [6.0, 6.5], "colegio": "prueba", "curso": "1A"},
+            {"id": "agr-3", "notas": [3.8], "colegio": "prueba", "curso": "2B"}
+        ]
+    }
+    requests.post(f"{API_URL}/predict/batch", json=data)
+    requests.post(f"{API_URL}/predict/batch", json=data)
+    response = requests.get(f"{API_URL}/agregados", params={"colegio": "prueba", "curso": "1A"})
+    print(f"Status: {response.status_code}")
+    print(f"Curso 1A: {json.dumps(response.json())}")
+    response = requests.get(f"{API_URL}/agregados", params={"colegio": "prueba"})
+    result = response.json()
+    print(f"Colegio: total {result['total']}, conteos {result['conteos']} (esperado total 3)")
+    for curso in result['cursos']:
+        print(f"  {curso['curso']}: {curso['conteos']}")
+    print()
+
+def test_modelo_web():
+    """Prueba la versión y el activo del modelo para el navegador"""
+    print("="*50)
+    print("Test: Modelo web")
+    print("="*50)
+    version = requests.get(f"{API_URL}/modelo/version").json()
+    print(f"Version: {json.dumps(version)}")
+    if version['disponible']:
+        response = requests.get(f"{API_URL}{version['url']}")
+        modelo = response.json()
+        print(f"Status: {response.status_code} ({len(response.content) / 1024:.1f} KB)")
+        print(f"Árboles: {len(modelo['raices'])}, nodos: {len(modelo['feature'])}")
+        print(f"Huella coincide: {modelo['huella'] == version['huella']}")
+    print()
+
+def test_predict_local():
+    """Prueba el registro de una predicción hecha en el navegador (como lo envía sendBeacon)"""
+    print("="*50)
+    print("Test: Registro de predicción local")
+    print("="*50)
+    response = requests.post(f"{API_URL}/predict/local", data=json.dumps({"notas": [2.0, 7.0]}),
+                             headers={'Content-Type': 'text/plain'})
+    print(f"Status: {response.status_code}")
+    response = requests.post(f"{API_URL}/predict/local", data=json.dumps({"notas": [9.0]}),
+                             headers={'Content-Type': 'text/plain'})
+    print(f"Nota inválida -> Status: {response.status_code} ({response.json().get('error')})")
+    print()
+
 def main():
     """Ejecuta todos los tests"""
     print("="*70)
@@ -114,11 +281,20 @@ def main():
     
     try:
         test_health()
+        test_ready()
         test_predict_1_nota()
         test_predict_2_notas()
         test_predict_3_notas()
         test_predict_casos_varios()
         test_batch()
+        test_batch_grande()
+        test_explain()
+        test_estudiantes()
+        test_jobs()
+        test_drift()
+        test_agregados()
+        test_modelo_web()
+        test_predict_local()
         
         print("="*70)
         print("TODAS LAS PRUEBAS COMPLETADAS")
@@ -0,0 +1,140 @@
+"""
+Trabajos de Predicción Asíncronos
+Lotes muy grandes (p. ej. una región completa) se reciben en POST /jobs, se
+guardan en disco y se procesan por bloques en un pool de workers en segundo
+plano. El estado y los resultados de cada bloque quedan en disco, de modo que
+un trabajo interrumpido por un reinicio continúa desde el último bloque
+terminado.
+
+Estructura de un trabajo en DIRECTORIO_TRABAJOS/<id>/:
+    entrada.json            estudiantes recibidos
+    estado.json             estado, total, procesados, fechas y error
+    bloque_00000.json ...   resultados de cada bloque, en orden
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_TRABAJOS = os.path.join(BASE_DIR, '06_despliegue', 'trabajos')
+
+TAMANO_BLOQUE_TRABAJO = 5_000   # estudiantes por bloque (unidad de avance y de reanudación)
+N_WORKERS_TRABAJOS = 2          # trabajos procesados en paralelo
+POR_PAGINA_DEFECTO = 1_000
+POR_PAGINA_MAXIMO = 10_000
+
+ESTADOS_FINALES = ('completado', 'error')
+
+
+def _escribir_json(ruta, contenido):
+    """Escritura atómica: un lector nunca ve un archivo a medio escribir"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporal, ruta)
+
+
+def _leer_json(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class GestorTrabajos:
+    """
+    Crea, procesa y consulta trabajos. puntuar(estudiantes) recibe un bloque
+    de estudiantes y retorna la lista de resultados en el mismo orden.
+    """
+
+    def __init__(self, puntuar, directorio=DIRECTORIO_TRABAJOS, n_workers=N_WORKERS_TRABAJOS,
+                 tamano_bloque=TAMANO_BLOQUE_TRABAJO):
+        self.puntuar = puntuar
+        self.directorio = directorio
+        self.tamano_bloque = tamano_bloque
+        self._pool = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='trabajos')
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, trabajo_id, archivo):
+        return os.path.join(self.directorio, trabajo_id, archivo)
+
+    def _actualizar_estado(self, trabajo_id, **cambios):
+        with self._lock:
+            estado = _leer_json(self._ruta(trabajo_id, 'estado.json'))
+            estado.update(cambios, actualizado=time.strftime('%Y-%m-%d %H:%M:%S'))
+            _escribir_json(self._ruta(trabajo_id, 'estado.json'), estado)
+        return estado
+
+    def crear(self, estudiantes):
+        """Guarda la entrada, encola el trabajo y retorna su estado inicial"""
+        trabajo_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.directorio, trabajo_id))
+        _escribir_json(self._ruta(trabajo_id, 'entrada.json'), estudiantes)
+        ahora = time.strftime('%Y-%m-%d %H:%M:%S')
+        estado = {
+            'id': trabajo_id,
+            'estado': 'pendiente',
+            'total': len(estudiantes),
+            'procesados': 0,
+            'tamano_bloque': self.tamano_bloque,
+            'creado': ahora,
+            'actualizado': ahora,
+            'error': None,
+        }
+        _escribir_json(self._ruta(trabajo_id, 'estado.json'), estado)
+        self._pool.submit(self._procesar, trabajo_id)
+        return estado
+
+    def _procesar(self, trabajo_id):
+        """Puntúa los bloques que aún no tienen resultados en disco"""
+        try:
+            estado = self._actualizar_estado(trabajo_id, estado='procesando')
+            estudiantes = _leer_json(self._ruta(trabajo_id, 'entrada.json'))
+            tamano = estado['tamano_bloque']
+            for numero, inicio in enumerate(range(0, len(estudiantes), tamano)):
+                ruta_bloque = self._ruta(trabajo_id, f'bloque_{numero:05d}.json')
+                if not os.path.exists(ruta_bloque):
+                    _escribir_json(ruta_bloque, self.puntuar(estudiantes[inicio:inicio + tamano]))
+                self._actualizar_estado(trabajo_id, procesados=min(inicio + tamano, len(estudiantes)))
+            self._actualizar_estado(trabajo_id, estado='completado')
+        except Exception as e:
+            self._actualizar_estado(trabajo_id, estado='error', error=str(e))
+
+    def reanudar(self):
+        """Vuelve a encolar los trabajos que quedaron sin terminar (p. ej. tras un reinicio)"""
+        reanudados = []
+        for trabajo_id in sorted(os.listdir(self.directorio)):
+            ruta_estado = self._ruta(trabajo_id, 'estado.json')
+            if os.path.exists(ruta_estado) and _leer_json(ruta_estado)['estado'] not in ESTADOS_FINALES:
+                self._pool.submit(self._procesar, trabajo_id)
+                reanudados.append(trabajo_id)
+        return reanudados
+
+    def consultar(self, trabajo_id, pagina=1, por_pagina=POR_PAGINA_DEFECTO):
+        """
+        Estado del trabajo y una página de resultados ya calculados.
+        Retorna None si el trabajo no existe.
+        """
+        if not trabajo_id.isalnum() or not os.path.isfile(self._ruta(trabajo_id, 'estado.json')):
+            return None
+        estado = _leer_json(self._ruta(trabajo_id, 'estado.json'))
+        tamano = estado['tamano_bloque']
+        inicio = (pagina - 1) * por_pagina
+        fin = min(inicio + por_pagina, estado['procesados'])
+
+        # Solo se leen los bloques que cubren la página pedida
+        resultados = []
+        for numero in range(inicio // tamano, (fin - 1) // tamano + 1 if fin > inicio else 0):
+            bloque = _leer_json(self._ruta(trabajo_id, f'bloque_{numero:05d}.json'))
+            desde = max(inicio - numero * tamano, 0)
+            resultados.extend(bloque[desde:fin - numero * tamano])
+
+        estado['progreso'] = round(estado['procesados'] / estado['total'], 4) if estado['total'] else 1.0
+        estado['pagina'] = pagina
+        estado['por_pagina'] = por_pagina
+        estado['paginas'] = -(-estado['procesados'] // por_pagina)
+        estado['resultados'] = resultados
+        return estado
@@ -0,0 +1,336 @@
+"""
+Benchmarks del Pipeline
+Mide tiempo y memoria de las funciones más usadas de la preparación de datos
+y de la API sobre datos sintéticos, de 1 fila a millones, y compara contra
+la línea base versionada (benchmarks/linea_base.json) para detectar
+regresiones en corridas locales.
+
+Cada función se mide varias veces por tamaño (mediana del tiempo de pared) y
+una vez más bajo tracemalloc para la memoria pico asignada. Si por el tiempo
+del tamaño anterior una llamada excedería PRESUPUESTO_LLAMADA_S, ese tamaño y
+los siguientes se omiten.
+
+Uso:
+    python benchmarks/benchmark_pipeline.py                         # mide y compara
+    python benchmarks/benchmark_pipeline.py --solo limpiar_datos --tamanos 1000 100000
+    python benchmarks/benchmark_pipeline.py --guardar-linea-base    # mide y reemplaza la línea base
+    python benchmarks/benchmark_pipeline.py --comparar resultados.json
+
+Los tiempos dependen de la máquina: la línea base se regenera al cambiar de equipo.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_LINEA_BASE = os.path.join(BASE_DIR, 'benchmarks', 'linea_base.json')
+RUTA_RESULTADOS = os.path.join(BASE_DIR, 'benchmarks', 'resultados.json')
+MODULOS = {
+    'preparacion': os.path.join(BASE_DIR, '03_preparacion_datos', 'preparacion.py'),
+    # Módulos sin efectos al importar: app.py levantaría hilos, cargaría el
+    # modelo y reanudaría trabajos durante la medición
+    'features_modelo': os.path.join(BASE_DIR, '06_despliegue', 'features_modelo.py'),
+    'modelo_mapeado': os.path.join(BASE_DIR, '06_despliegue', 'modelo_mapeado.py'),
+}
+
+TAMANOS = [1, 1_000, 100_000, 1_000_000, 5_000_000]
+PRESUPUESTO_LLAMADA_S = 20.0   # una llamada estimada más lenta que esto se omite
+TIEMPO_MINIMO_S = 0.5          # se repite hasta acumular este tiempo...
+REPETICIONES_MAX = 7           # ...o este número de llamadas
+SEMILLA = 42
+
+UMBRAL_REGRESION = 0.25        # 25% más lento / más memoria se marca como regresión
+# Diferencias absolutas por debajo de estos mínimos se consideran ruido
+MINIMOS_RUIDO = {'tiempo_s': 0.002, 'memoria_pico_mb': 1.0}
+
+
+def cargar_modulo(nombre):
+    """Importa una fase por ruta (las carpetas empiezan con dígitos y no son paquetes)"""
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    directorio = os.path.dirname(MODULOS[nombre])
+    if directorio not in sys.path:
+        sys.path.insert(0, directorio)  # los módulos importan a sus vecinos
+    spec = importlib.util.spec_from_file_location(nombre, MODULOS[nombre])
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre] = modulo
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(modulo)
+    return modulo
+
+
+_cache = {}
+
+
+def esquema():
+    """Esquema de features de la preparación (el mismo que carga la API)"""
+    if 'esquema' not in _cache:
+        _cache['esquema'] = cargar_modulo('features_modelo').cargar_esquema()
+    return _cache['esquema']
+
+
+def modelo_api():
+    """El modelo que serviría la API (mapeado o .pkl), cargado una sola vez"""
+    if 'modelo' not in _cache:
+        _cache['modelo'] = cargar_modulo('modelo_mapeado').cargar_modelo()
+    return _cache['modelo']
+
+
+# --- Datos sintéticos -------------------------------------------------------
+
+def datos_crudos(n, rng):
+    """Como el CSV de Mineduc: promedios con ~0,1% de nulos y ~0,1% fuera de rango"""
+    promedios = np.clip(np.round(rng.normal(5.5, 0.7, n), 1), 1.0, 7.0)
+    promedios[rng.random(n) < 0.001] = np.nan
+    promedios[rng.random(n) < 0.001] = 0.0
+    return pd.DataFrame({
+        'AGNO': rng.choice([2022, 2023, 2024], n),
+        'MRUN': rng.permutation(n) + 1_000_000,
+        'RBD': rng.integers(1, 12_000, n),
+        'COD_GRADO': rng.integers(1, 5, n),
+        'PROM_NOTAS_ALU': promedios,
+        'MARCA_EGRESO': (promedios >= 4.0).astype(int),
+    })
+
+
+def datos_con_riesgo(n, rng):
+    df = datos_crudos(n, rng)
+    df['PROM_NOTAS_ALU'] = df['PROM_NOTAS_ALU'].clip(1.0, 7.0).fillna(5.5)
+    df['RIESGO'] = np.select([df['PROM_NOTAS_ALU'] < 3.5, df['PROM_NOTAS_ALU'] < 4.0], ['alto', 'medio'], 'bajo')
+    return df
+
+
+def notas_simuladas(n, rng):
+    """Salida de crear_features_simuladas: 1, 2 o 3 notas por fila"""
+    notas = np.round(rng.uniform(1.0, 7.0, (n, 3)), 2)
+    cantidad = np.arange(n) % 3 + 1
+    notas[cantidad < 2, 1] = np.nan
+    notas[cantidad < 3, 2] = np.nan
+    promedio = np.nanmean(notas, axis=1)
+    return pd.DataFrame({
+        'nota_1': notas[:, 0], 'nota_2': notas[:, 1], 'nota_3': notas[:, 2],
+        'promedio': promedio,
+        'riesgo': np.select([promedio < 3.5, promedio < 4.0], ['alto', 'medio'], 'bajo'),
+    })
+
+
+def listas_notas(n, rng):
+    notas = np.round(rng.uniform(1.0, 7.0, (n, 3)), 1).tolist()
+    return [fila[:i % 3 + 1] for i, fila in enumerate(notas)]
+
+
+def features_modelo(n, rng):
+    X, _ = cargar_modulo('features_modelo').calcular_features_lote(listas_notas(n, rng), esquema())
+    return X
+
+
+# --- Funciones medidas ------------------------------------------------------
+
+def _calcular_features_filas(lista):
+    calcular_features = cargar_modulo('features_modelo').calcular_features
+    return [calcular_features(list(notas)) for notas in lista]
+
+
+def _calcular_features_lote(lista):
+    return cargar_modulo('features_modelo').calcular_features_lote(lista, esquema())
+
+
+def _predict_proba(X):
+    return modelo_api().predict_proba(X)
+
+
+# nombre: (función o (módulo, atributo), generador de la entrada, la función modifica su entrada, máx. filas)
+BENCHMARKS = {
+    'limpiar_datos': (('preparacion', 'limpiar_datos'), datos_crudos, False, None),
+    'crear_variable_objetivo': (('preparacion', 'crear_variable_objetivo'), datos_con_riesgo, True, None),
+    'crear_features_simuladas': (('preparacion', 'crear_features_simuladas'), datos_con_riesgo, False, None),
+    'crear_features_derivadas': (('preparacion', 'crear_features_derivadas'), notas_simuladas, True, None),
+    'calcular_features': (_calcular_features_filas, listas_notas, False, None),
+    'calcular_features_lote': (_calcular_features_lote, listas_notas, False, None),
+    # apply() del modelo mapeado crea temporales de (árboles x filas): se limita a 1M
+    'predict_proba': (_predict_proba, features_modelo, False, 1_000_000),
+}
+
+
+def _funcion(especificacion):
+    if callable(especificacion):
+        return especificacion
+    modulo, atributo = especificacion
+    return getattr(cargar_modulo(modulo), atributo)
+
+
+def _llamar(funcion, entrada, muta):
+    argumento = entrada.copy() if muta else entrada
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        funcion(argumento)
+        return time.perf_counter() - inicio
+
+
+def medir(nombre, tamanos=TAMANOS, presupuesto=PRESUPUESTO_LLAMADA_S):
+    """Mide una función en cada tamaño; retorna una lista de registros"""
+    especificacion, generador, muta, max_filas = BENCHMARKS[nombre]
+    funcion = _funcion(especificacion)
+    registros = []
+    anterior = None
+    for n in tamanos:
+        if max_filas is not None and n > max_filas:
+            registros.append({'funcion': nombre, 'filas': n, 'omitido': f'límite de {max_filas:,} filas'})
+            continue
+        if anterior is not None and anterior[1] * n / anterior[0] > presupuesto:
+            estimado = anterior[1] * n / anterior[0]
+            registros.append({'funcion': nombre, 'filas': n, 'omitido': f'estimado {estimado:.0f} s'})
+            continue
+
+        entrada = generador(n, np.random.default_rng(SEMILLA))
+        tiempos = [_llamar(funcion, entrada, muta)]
+        while len(tiempos) < REPETICIONES_MAX and sum(tiempos) < TIEMPO_MINIMO_S:
+            tiempos.append(_llamar(funcion, entrada, muta))
+        tiempo = statistics.median(tiempos)
+
+        argumento = entrada.copy() if muta else entrada
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            funcion(argumento)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del argumento, entrada
+
+        registros.append({
+            'funcion': nombre,
+            'filas': n,
+            'tiempo_s': round(tiempo, 6),
+            'por_fila_us': round(tiempo / n * 1e6, 3),
+            'repeticiones': len(tiempos),
+            'memoria_pico_mb': round(pico / 2**20, 2),
+        })
+        anterior = (n, tiempo)
+    return registros
+
+
+def correr(nombres, tamanos, presupuesto):
+    resultados = []
+    for nombre in nombres:
+        print(f"Midiendo {nombre}...", flush=True)
+        for registro in medir(nombre, tamanos, presupuesto):
+            resultados.append(registro)
+            if 'omitido' in registro:
+                print(f"  {registro['filas']:>10,} filas  omitido ({registro['omitido']})")
+            else:
+                print(f"  {registro['filas']:>10,} filas  {registro['tiempo_s']:>10.4f} s  "
+                      f"{registro['por_fila_us']:>10.3f} µs/fila  {registro['memoria_pico_mb']:>9.1f} MB")
+    return {
+        'version': 1,
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'entorno': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'resultados': resultados,
+    }
+
+
+def _indexar(reporte):
+    return {f"{r['funcion']}:{r['filas']}": r for r in reporte['resultados']}
+
+
+def comparar(base, actual, umbral=UMBRAL_REGRESION):
+    """
+    Compara dos reportes función a función y tamaño a tamaño.
+    Retorna filas (clave, métrica, base, actual, variación, es_regresion).
+    """
+    anteriores = _indexar(base)
+    filas = []
+    for clave, registro in _indexar(actual).items():
+        previo = anteriores.get(clave)
+        if previo is None or 'omitido' in registro or 'omitido' in previo:
+            continue
+        for metrica, minimo in MINIMOS_RUIDO.items():
+            antes, despues = previo[metrica], registro[metrica]
+            variacion = (despues - antes) / antes if antes > 0 else 0.0
+            es_regresion = variacion > umbral and (despues - antes) > minimo
+            filas.append((clave, metrica, antes, despues, variacion, es_regresion))
+    return filas
+
+
+def imprimir_comparacion(filas):
+    """Imprime la comparación y retorna la cantidad de regresiones"""
+    print(f"\n{'Función:filas':<36} {'Métrica':<16} {'Base':>11} {'Actual':>11} {'Var.':>8}")
+    regresiones = 0
+    for clave, metrica, antes, despues, variacion, es_regresion in filas:
+        regresiones += es_regresion
+        marca = '  <-- REGRESIÓN' if es_regresion else ''
+        print(f"{clave:<36} {metrica:<16} {antes:>11.4f} {despues:>11.4f} {variacion:>+8.1%}{marca}")
+    print(f"\nRegresiones detectadas: {regresiones}")
+    return regresiones
+
+
+def combinar_linea_base(reporte, ruta=RUTA_LINEA_BASE):
+    """Reemplaza en la línea base solo las funciones medidas (p. ej. con --solo)"""
+    if not os.path.exists(ruta):
+        return reporte
+    with open(ruta, encoding='utf-8') as f:
+        base = json.load(f)
+    medidas = {r['funcion'] for r in reporte['resultados']}
+    conservados = [r for r in base['resultados'] if r['funcion'] not in medidas]
+    return dict(reporte, resultados=conservados + reporte['resultados'])
+
+
+def guardar(reporte, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+    print(f"OK Resultados guardados en {ruta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de las funciones del pipeline')
+    parser.add_argument('--solo', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--tamanos', nargs='+', type=int, default=TAMANOS)
+    parser.add_argument('--presupuesto', type=float, default=PRESUPUESTO_LLAMADA_S,
+                        help='Segundos máximos estimados por llamada')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION,
+                        help='Variación relativa sobre la cual se marca regresión (0.25 = 25%%)')
+    parser.add_argument('--guardar-linea-base', action='store_true')
+    parser.add_argument('--comparar', metavar='RESULTADOS', help='Compara un reporte existente sin medir')
+    args = parser.parse_args()
+
+    print("="*70)
+    print("BENCHMARKS DEL PIPELINE")
+    print("="*70)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            reporte = json.load(f)
+    else:
+        reporte = correr(args.solo, sorted(args.tamanos), args.presupuesto)
+        if args.guardar_linea_base:
+            guardar(combinar_linea_base(reporte), RUTA_LINEA_BASE)
+            return
+        guardar(reporte, RUTA_RESULTADOS)
+
+    if not os.path.exists(RUTA_LINEA_BASE):
+        print(f"⚠ Sin línea base en {RUTA_LINEA_BASE}; créala con --guardar-linea-base")
+        return
+    with open(RUTA_LINEA_BASE, encoding='utf-8') as f:
+        base = json.load(f)
+    print(f"\nLínea base: {base['fecha']} ({base['entorno']['plataforma']}, {base['entorno']['cpus']} CPU)")
+    regresiones = imprimir_comparacion(comparar(base, reporte, args.umbral))
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()